@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'gestion_precios.middleware.MetricasMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -122,3 +123,57 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# API REST
+# Listados paginados por cursor sobre la clave primaria (ver gestion_precios/listados.py)
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'gestion_precios.listados.PaginacionCursor',
+    'PAGE_SIZE': 100,
+}
+
+
+# Motor de precios
+# Aritmética del bucle de reglas: 'decimal' (por defecto), 'centimos' (enteros) o 'sql'
+# (las exportaciones calculan el precio final en la base de datos).
+
+PRECIOS_MOTOR = 'decimal'
+
+# Cantidades estándar por las que `reprice_catalog` materializa el precio final de
+# cada artículo en cada lista (tabla PrecioFinalMaterializado).
+
+PRECIOS_CANTIDADES_MATERIALIZADAS = [1, 6, 12]
+
+
+# Cachés
+# 'precios_l1': memoria del proceso (LRU acotado por MAX_ENTRIES).
+# 'precios_l2': compartido entre workers del mismo servidor; en varios servidores,
+# apuntarlo a Redis o Memcached.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'precios_l1': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'precios-l1',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 20000, 'CULL_FREQUENCY': 4},
+    },
+    'precios_l2': {
+        # FileBasedCache que no lista el directorio en cada escritura
+        'BACKEND': 'gestion_precios.cache_archivos.CacheArchivos',
+        'LOCATION': BASE_DIR / '.cache' / 'precios',
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 200000, 'CULL_FREQUENCY': 10, 'REVISAR_CADA': 1000},
+    },
+}
+
+# Memoización de calcular-precio (ver gestion_precios/cache_precios.py).
+# Alias de CACHES para cada nivel; None desactiva el nivel (ambos None, la memoización).
+
+PRECIOS_CACHE_RESULTADOS = {
+    'L1': 'precios_l1',
+    'L2': 'precios_l2',
+}
@@ -9,6 +9,8 @@ from .models import (
     PrecioArticulo,
     ReglaPrecio,
     CombinacionProducto,
+    CambioPrecio,
+    PrecioFinalMaterializado,
 )
 
 @admin.register(Articulo)
@@ -35,6 +37,17 @@ class ReglaPrecioAdmin(admin.ModelAdmin):
     list_filter = ('lista_precio', 'tipo_regla', 'condicion')
     search_fields = ('nombre_regla',)
 
+@admin.register(CambioPrecio)
+class CambioPrecioAdmin(admin.ModelAdmin):
+    list_display = ('id', 'entidad', 'objeto_id', 'operacion', 'lista_id', 'fecha')
+    list_filter = ('entidad', 'operacion')
+
+@admin.register(PrecioFinalMaterializado)
+class PrecioFinalMaterializadoAdmin(admin.ModelAdmin):
+    list_display = ('articulo', 'lista_precio', 'cantidad', 'precio_base', 'precio_final', 'corrida')
+    list_filter = ('lista_precio', 'cantidad')
+    search_fields = ('articulo__sku',)
+
 
 # Registramos los modelos que no necesitan una personalización especial
 admin.site.register(Empresa)
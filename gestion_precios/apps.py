@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class GestionPreciosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion_precios'
+
+    def ready(self):
+        # Conecta los receptores que invalidan los cachés del motor de precios
+        from . import signals  # noqa: F401
+
+        # Cuenta las consultas SQL de cada petición en todas las conexiones (también las
+        # que abre el ORM asíncrono en su hilo)
+        from django.db.backends.signals import connection_created
+        from . import metricas
+        connection_created.connect(metricas.instalar_contador_sql, dispatch_uid='precios_contador_sql')
@@ -0,0 +1,29 @@
+"""
+Backend de caché en archivos para el nivel compartido (L2) de `cache_precios`.
+"""
+import itertools
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class CacheArchivos(FileBasedCache):
+    """
+    `FileBasedCache` que cuenta los archivos del directorio una vez cada `REVISAR_CADA`
+    escrituras (opción de OPTIONS, 1000 por defecto) en lugar de en cada `set`.
+
+    El backend de Django lista el directorio completo antes de cada escritura para
+    respetar MAX_ENTRIES: con miles de resultados memoizados cada `set` costaba
+    milisegundos. A cambio, cada instancia (una por hilo) puede pasarse del límite en
+    hasta REVISAR_CADA entradas antes de descartar una fracción al azar.
+    """
+
+    def __init__(self, dir, params):
+        opciones = dict(params.get('OPTIONS') or {})
+        self._revisar_cada = max(1, int(opciones.pop('REVISAR_CADA', 1000)))
+        super().__init__(dir, dict(params, OPTIONS=opciones))
+        self._escrituras = itertools.count(1)
+
+    def _cull(self):
+        if next(self._escrituras) % self._revisar_cada:
+            return
+        super()._cull()
@@ -0,0 +1,148 @@
+"""
+Caché en memoria (por proceso) de la resolución de listas vigentes.
+
+Para cada contexto (empresa, sucursal, canal) se guarda un índice de intervalos
+(`IndiceVigencias`) con la lista elegida en cada tramo de fechas, construido a
+partir de todas las listas activas candidatas del contexto (pasadas, vigentes y
+futuras). Resolver cualquier fecha es una búsqueda binaria sobre los límites,
+sin tocar la base de datos; las escrituras en `ListaPrecio` invalidan la empresa.
+
+Como en `cache_reglas`, cada índice guarda las generaciones de la empresa y del motor
+leídas antes de construirlo y se descarta cuando ya no coinciden con las compartidas
+(una escritura en otro worker). Un índice construido mientras llegaba una
+invalidación local tampoco se guarda: pudo leer las listas antes de la escritura.
+"""
+import heapq
+import threading
+from bisect import bisect_right
+from datetime import timedelta
+
+from . import generaciones
+
+_lock = threading.Lock()
+_indices = {}  # (empresa, sucursal, canal) -> (marca de generaciones, IndiceVigencias)
+_epoca = 0  # Cambia con cada invalidación local
+_estadisticas = {
+    'aciertos': 0,
+    'fallos': 0,
+    'invalidaciones': 0,
+}
+
+
+class IndiceVigencias:
+    """
+    Función escalonada fecha -> lista. `listas[i]` rige en [limites[i], limites[i + 1])
+    (el último tramo no tiene fin) y antes de `limites[0]` no hay lista.
+    """
+    __slots__ = ('limites', 'listas')
+
+    def __init__(self, limites, listas):
+        self.limites = limites
+        self.listas = listas
+
+    @classmethod
+    def construir(cls, candidatas):
+        """
+        Barre los límites de vigencia de las candidatas, que llegan ordenadas por
+        especificidad (la primera vigente en una fecha es la elegida). Un montículo
+        por rango de especificidad da la elegida en cada límite: O(k log k).
+        """
+        eventos = {}
+        for rango, lista in enumerate(candidatas):
+            fin = None
+            if lista.fecha_fin_vigencia is not None:
+                fin = lista.fecha_fin_vigencia + timedelta(days=1)
+                if fin <= lista.fecha_inicio_vigencia:
+                    continue  # Vigencia vacía
+                eventos.setdefault(fin, [])
+            eventos.setdefault(lista.fecha_inicio_vigencia, []).append((rango, fin, lista))
+
+        limites, listas = [], []
+        vigentes = []  # (rango, fin, lista); las que ya terminaron se descartan al llegar a la cima
+        for fecha in sorted(eventos):
+            for entrada in eventos[fecha]:
+                heapq.heappush(vigentes, entrada)
+            while vigentes and vigentes[0][1] is not None and vigentes[0][1] <= fecha:
+                heapq.heappop(vigentes)
+            elegida = vigentes[0][2] if vigentes else None
+            if listas and listas[-1] is elegida:
+                continue
+            limites.append(fecha)
+            listas.append(elegida)
+        return cls(limites, listas)
+
+    def resolver(self, fecha):
+        posicion = bisect_right(self.limites, fecha) - 1
+        return self.listas[posicion] if posicion >= 0 else None
+
+
+def obtener(empresa_id: int, sucursal_id, canal_venta: str, fecha):
+    """
+    Devuelve `(True, lista, None)` si el contexto está indexado (la lista puede ser
+    None), o `(False, None, ficha)` si hay que construir el índice; `ficha` se pasa
+    a `guardar`.
+    """
+    marca = None
+    if generaciones.alias_cache() is not None:
+        marca = generaciones.leer(generaciones.clave_empresa(empresa_id), generaciones.CLAVE_MOTOR)
+    return _buscar((empresa_id, sucursal_id, canal_venta), marca, fecha)
+
+
+async def aobtener(empresa_id: int, sucursal_id, canal_venta: str, fecha):
+    """
+    Igual que `obtener`, leyendo las generaciones con la API asíncrona del caché.
+    """
+    marca = None
+    if generaciones.alias_cache() is not None:
+        marca = await generaciones.aleer(generaciones.clave_empresa(empresa_id), generaciones.CLAVE_MOTOR)
+    return _buscar((empresa_id, sucursal_id, canal_venta), marca, fecha)
+
+
+def _buscar(clave, marca, fecha):
+    entrada = _indices.get(clave)
+    with _lock:
+        if entrada is not None:
+            if entrada[0] == marca:
+                _estadisticas['aciertos'] += 1
+                return True, entrada[1].resolver(fecha), None
+            # Otro worker cambió las listas de la empresa o vació los cachés del motor
+            _estadisticas['invalidaciones'] += 1
+        _estadisticas['fallos'] += 1
+        return False, None, (marca, _epoca)
+
+
+def guardar(empresa_id: int, sucursal_id, canal_venta: str, indice: IndiceVigencias, ficha):
+    marca, epoca = ficha
+    with _lock:
+        if epoca == _epoca:
+            _indices[(empresa_id, sucursal_id, canal_venta)] = (marca, indice)
+
+
+def invalidar_empresa(empresa_id: int):
+    """
+    Descarta todos los índices de una empresa.
+    """
+    global _epoca
+    with _lock:
+        _epoca += 1
+        claves = [clave for clave in _indices if clave[0] == empresa_id]
+        for clave in claves:
+            del _indices[clave]
+        _estadisticas['invalidaciones'] += len(claves)
+
+
+def invalidar_todo():
+    global _epoca
+    with _lock:
+        _epoca += 1
+        _estadisticas['invalidaciones'] += len(_indices)
+        _indices.clear()
+
+
+def estadisticas() -> dict:
+    with _lock:
+        return dict(
+            _estadisticas,
+            contextos_en_cache=len(_indices),
+            tramos_en_cache=sum(len(indice.limites) for _, indice in _indices.values()),
+        )
@@ -0,0 +1,155 @@
+"""
+Memoización de los resultados de `PrecioService.calcular_precio_final`.
+
+La clave resume todo lo que decide el precio unitario de un artículo en una lista:
+- la lista y sus generaciones (`generaciones.py`): cualquier escritura en sus precios,
+  reglas o combinaciones la cambia, y una del catálogo cambia la global;
+- el artículo y el motor;
+- la `firma` de `ConjuntoReglas`: el tramo de cantidad y de monto entre los umbrales
+  de la lista y las combinaciones con reglas que el carrito completa.
+
+Se guarda el resultado unitario (sin `cantidad` ni `total`, que se recalculan). Hay
+dos niveles configurables con `settings.PRECIOS_CACHE_RESULTADOS`: L1 en la memoria
+del proceso (LRU acotado) y L2 compartido entre workers; un acierto en L2 se copia a L1.
+Los errores (lista o precio base inexistente) no se memoizan.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import generaciones
+
+_CAMPOS = ('lista_precio_aplicada', 'precio_base', 'precio_final', 'reglas_aplicadas', 'autorizado_bajo_costo')
+
+_lock = threading.Lock()
+_estadisticas = {
+    'aciertos_l1': 0,
+    'aciertos_l2': 0,
+    'fallos': 0,
+    'escrituras': 0,
+}
+
+
+def _niveles():
+    configuracion = getattr(settings, 'PRECIOS_CACHE_RESULTADOS', None) or {}
+    return configuracion.get('L1'), configuracion.get('L2')
+
+
+def _contar(clave):
+    with _lock:
+        _estadisticas[clave] += 1
+
+
+def _clave(lista_id, generacion_lista, generacion_global, articulo_id, firma, motor):
+    tramo_cantidad, tramo_monto, combinaciones = firma
+    texto_combinaciones = '.'.join(map(str, combinaciones))
+    if len(texto_combinaciones) > 64:
+        # Memcached no admite claves de más de 250 caracteres
+        texto_combinaciones = hashlib.blake2b(texto_combinaciones.encode(), digest_size=16).hexdigest()
+    return (
+        f'precios:resultado:{lista_id}:{generacion_lista}:{generacion_global}:'
+        f'{articulo_id}:{tramo_cantidad}:{tramo_monto}:{texto_combinaciones}:{motor}'
+    )
+
+
+def _resultado(memo, cantidad):
+    return dict(memo, cantidad=cantidad, total=memo['precio_final'] * cantidad)
+
+
+def obtener(lista_id, articulo_id, firma, motor, cantidad, generacion=None):
+    """
+    Devuelve `(clave, resultado)`; `resultado` es None en un fallo y `clave` se pasa
+    a `guardar`. Sin niveles configurados devuelve `(None, None)`.
+
+    `generacion` son las generaciones con las que se validó el conjunto de reglas
+    (`generaciones.actuales_con_motor`); sin ellas se leen aquí.
+    """
+    alias_l1, alias_l2 = _niveles()
+    if not (alias_l1 or alias_l2):
+        return None, None
+
+    generacion_lista, generacion_global = (generacion or generaciones.actuales(lista_id))[:2]
+    clave = _clave(lista_id, generacion_lista, generacion_global, articulo_id, firma, motor)
+    if alias_l1:
+        memo = caches[alias_l1].get(clave)
+        if memo is not None:
+            _contar('aciertos_l1')
+            return clave, _resultado(memo, cantidad)
+    if alias_l2:
+        memo = caches[alias_l2].get(clave)
+        if memo is not None:
+            _contar('aciertos_l2')
+            if alias_l1:
+                caches[alias_l1].set(clave, memo)
+            return clave, _resultado(memo, cantidad)
+    _contar('fallos')
+    return clave, None
+
+
+async def aobtener(lista_id, articulo_id, firma, motor, cantidad, generacion=None):
+    """
+    Igual que `obtener`; L1 está en memoria y se lee directamente, L2 con la API asíncrona.
+    """
+    alias_l1, alias_l2 = _niveles()
+    if not (alias_l1 or alias_l2):
+        return None, None
+
+    generacion_lista, generacion_global = (generacion or await generaciones.aactuales(lista_id))[:2]
+    clave = _clave(lista_id, generacion_lista, generacion_global, articulo_id, firma, motor)
+    if alias_l1:
+        memo = caches[alias_l1].get(clave)
+        if memo is not None:
+            _contar('aciertos_l1')
+            return clave, _resultado(memo, cantidad)
+    if alias_l2:
+        memo = await caches[alias_l2].aget(clave)
+        if memo is not None:
+            _contar('aciertos_l2')
+            if alias_l1:
+                caches[alias_l1].set(clave, memo)
+            return clave, _resultado(memo, cantidad)
+    _contar('fallos')
+    return clave, None
+
+
+def guardar(clave, resultado):
+    if clave is None:
+        return
+    memo = {campo: resultado[campo] for campo in _CAMPOS}
+    for alias in _niveles():
+        if alias:
+            caches[alias].set(clave, memo)
+    _contar('escrituras')
+
+
+async def aguardar(clave, resultado):
+    if clave is None:
+        return
+    alias_l1, alias_l2 = _niveles()
+    memo = {campo: resultado[campo] for campo in _CAMPOS}
+    if alias_l1:
+        caches[alias_l1].set(clave, memo)
+    if alias_l2:
+        await caches[alias_l2].aset(clave, memo)
+    _contar('escrituras')
+
+
+def invalidar_todo():
+    """
+    Vacía ambos niveles (pruebas, o tras cargas que no pasan por las señales).
+    """
+    for alias in _niveles():
+        if alias:
+            caches[alias].clear()
+
+
+def estadisticas() -> dict:
+    with _lock:
+        consultas = _estadisticas['aciertos_l1'] + _estadisticas['aciertos_l2'] + _estadisticas['fallos']
+        return dict(
+            _estadisticas,
+            tasa_aciertos_l1=_estadisticas['aciertos_l1'] / consultas if consultas else 0.0,
+            tasa_aciertos=(_estadisticas['aciertos_l1'] + _estadisticas['aciertos_l2']) / consultas if consultas else 0.0,
+        )
@@ -0,0 +1,202 @@
+"""
+Caché en memoria (por proceso) de los conjuntos de reglas compilados.
+
+Cada `ListaPrecio` se compila una sola vez a un `ConjuntoReglas` y se reutiliza
+en todas las peticiones del worker hasta que las señales de `signals.py`
+invalidan la entrada porque cambió una regla, una combinación o la lista.
+
+Las señales solo alcanzan al proceso que escribe. Por eso cada entrada guarda las
+generaciones de la lista y del motor (`generaciones.py`) leídas antes de compilarla,
+y se recompila cuando ya no coinciden con las compartidas: una escritura en otro
+worker también invalida esta copia. Un conjunto compilado mientras llegaba una
+invalidación local tampoco se guarda: pudo leer las reglas antes de la escritura.
+"""
+import threading
+
+from . import generaciones
+from .models import ReglaPrecio, CombinacionProducto
+from .motor import ReglaCompilada, ConjuntoReglas
+
+_CAMPOS_REGLA = (
+    'id', 'nombre_regla', 'tipo_regla', 'valor_regla', 'condicion', 'condicion_valor',
+    'aplica_articulo_id', 'aplica_grupo_id', 'aplica_linea_id', 'aplica_combinacion_id',
+    'prioridad', 'permite_venta_bajo_costo',
+)
+
+_lock = threading.Lock()
+_conjuntos = {}  # lista_id -> (marca de generaciones, ConjuntoReglas)
+_invalidadas = set()
+_epoca = 0  # Cambia con cada invalidación local
+_estadisticas = {
+    'aciertos': 0,
+    'fallos': 0,
+    'reconstrucciones': 0,
+    'invalidaciones': 0,
+}
+
+
+def compilar_reglas(lista_id: int) -> ConjuntoReglas:
+    """
+    Lee de la base de datos las reglas y combinaciones de la lista (dos consultas)
+    y las convierte en un `ConjuntoReglas` inmutable.
+    """
+    reglas = [ReglaCompilada(**fila) for fila in consulta_reglas(lista_id)]
+    combinaciones = _agrupar_miembros(consulta_combinaciones(lista_id))
+
+    # Una regla puede apuntar a una combinación definida en otra lista
+    externas = _combinaciones_externas(reglas, combinaciones)
+    if externas:
+        _agrupar_miembros(consulta_miembros(externas), combinaciones)
+
+    return ConjuntoReglas(lista_id, reglas, combinaciones)
+
+
+async def acompilar_reglas(lista_id: int) -> ConjuntoReglas:
+    """
+    Igual que `compilar_reglas`, leyendo con iteración asíncrona del ORM.
+    """
+    reglas = [ReglaCompilada(**fila) async for fila in consulta_reglas(lista_id)]
+    combinaciones = _agrupar_miembros([par async for par in consulta_combinaciones(lista_id)])
+
+    externas = _combinaciones_externas(reglas, combinaciones)
+    if externas:
+        _agrupar_miembros([par async for par in consulta_miembros(externas)], combinaciones)
+
+    return ConjuntoReglas(lista_id, reglas, combinaciones)
+
+
+def _agrupar_miembros(pares, combinaciones=None):
+    """
+    Agrupa pares (combinación, artículo) en {combinación: set(artículos)}.
+    """
+    combinaciones = {} if combinaciones is None else combinaciones
+    for combinacion_id, articulo_id in pares:
+        articulos = combinaciones.setdefault(combinacion_id, set())
+        if articulo_id is not None:
+            articulos.add(articulo_id)
+    return combinaciones
+
+
+def _combinaciones_externas(reglas, combinaciones):
+    return {regla.aplica_combinacion_id for regla in reglas} - combinaciones.keys() - {None}
+
+
+def consulta_reglas(lista_id: int):
+    """
+    QuerySet con los campos de las reglas de la lista, en orden de prioridad.
+    """
+    return ReglaPrecio.objects.filter(lista_precio_id=lista_id).order_by('prioridad', 'id').values(*_CAMPOS_REGLA)
+
+
+def consulta_combinaciones(lista_id: int):
+    """
+    QuerySet de pares (combinación, artículo) de la lista. Es un LEFT JOIN, así que
+    las combinaciones sin artículos aparecen con articulo_id nulo.
+    """
+    return CombinacionProducto.objects.filter(lista_precio_id=lista_id).values_list('id', 'articulos')
+
+
+def consulta_miembros(combinaciones_ids):
+    """
+    QuerySet de pares (combinación, artículo) de combinaciones concretas (de cualquier lista).
+    """
+    return CombinacionProducto.objects.filter(pk__in=combinaciones_ids).values_list('id', 'articulos')
+
+
+def obtener_conjunto_reglas(lista_id: int, generacion=None) -> ConjuntoReglas:
+    """
+    Devuelve el conjunto compilado de la lista, compilándolo si no está en caché o si
+    se compiló con otras generaciones.
+
+    `generacion` es lo devuelto por `generaciones.actuales_con_motor` cuando quien llama
+    ya lo leyó (para usar la misma lectura en la clave de `cache_precios`).
+    """
+    if generacion is None and generaciones.alias_cache() is not None:
+        generacion = generaciones.actuales_con_motor(lista_id)
+    marca = _marca(generacion)
+    conjunto, epoca = _en_cache(lista_id, marca)
+    if conjunto is not None:
+        return conjunto
+    return _guardar(lista_id, compilar_reglas(lista_id), marca, epoca)
+
+
+async def aobtener_conjunto_reglas(lista_id: int, generacion=None) -> ConjuntoReglas:
+    """
+    Versión asíncrona de `obtener_conjunto_reglas`; comparte el mismo caché.
+    """
+    if generacion is None and generaciones.alias_cache() is not None:
+        generacion = await generaciones.aactuales_con_motor(lista_id)
+    marca = _marca(generacion)
+    conjunto, epoca = _en_cache(lista_id, marca)
+    if conjunto is not None:
+        return conjunto
+    return _guardar(lista_id, await acompilar_reglas(lista_id), marca, epoca)
+
+
+def _marca(generacion):
+    """
+    Generaciones de la lista y del motor; la global (catálogo) no cambia las reglas.
+    """
+    if generacion is None:
+        return None
+    generacion_lista, _, generacion_motor = generacion
+    return generacion_lista, generacion_motor
+
+
+def _en_cache(lista_id, marca):
+    """
+    Devuelve `(conjunto, None)` en un acierto, o `(None, época)` para pasar a `_guardar`.
+    """
+    entrada = _conjuntos.get(lista_id)
+    with _lock:
+        if entrada is not None:
+            if entrada[0] == marca:
+                _estadisticas['aciertos'] += 1
+                return entrada[1], None
+            # Otro worker cambió la lista o vació los cachés del motor
+            _invalidadas.add(lista_id)
+            _estadisticas['invalidaciones'] += 1
+        return None, _epoca
+
+
+def _guardar(lista_id, conjunto, marca, epoca):
+    with _lock:
+        _estadisticas['fallos'] += 1
+        if lista_id in _invalidadas:
+            _invalidadas.discard(lista_id)
+            _estadisticas['reconstrucciones'] += 1
+        if epoca == _epoca:
+            _conjuntos[lista_id] = (marca, conjunto)
+    return conjunto
+
+
+def invalidar_lista(lista_id: int):
+    """
+    Descarta el conjunto compilado de una lista. La siguiente consulta lo reconstruye.
+    """
+    global _epoca
+    with _lock:
+        _epoca += 1
+        if _conjuntos.pop(lista_id, None) is not None:
+            _invalidadas.add(lista_id)
+            _estadisticas['invalidaciones'] += 1
+
+
+def invalidar_todo():
+    """
+    Descarta todos los conjuntos compilados del proceso.
+    """
+    global _epoca
+    with _lock:
+        _epoca += 1
+        _invalidadas.update(_conjuntos)
+        _estadisticas['invalidaciones'] += len(_conjuntos)
+        _conjuntos.clear()
+
+
+def estadisticas() -> dict:
+    """
+    Contadores de aciertos, fallos, reconstrucciones e invalidaciones del caché.
+    """
+    with _lock:
+        return dict(_estadisticas, listas_en_cache=len(_conjuntos))
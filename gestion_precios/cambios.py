@@ -0,0 +1,174 @@
+"""
+Registro de cambios (outbox) para la sincronización incremental de los terminales.
+
+Cada alta, modificación o baja de un precio, regla, combinación, lista o costo de
+artículo escribe una fila en `CambioPrecio` dentro de la misma transacción que el
+cambio (receptores de `signals.py` y cargas masivas). El `id` autoincremental es la
+secuencia: un cliente guarda el último `hasta` que recibió y pide solo lo posterior.
+
+Cada registro lleva el estado completo del objeto, así que para reconstruir el estado
+basta el último registro de cada objeto y lista: el feed pliega los repetidos de cada
+lote y `compactar` borra los anteriores a un corte, sin perder nada para ningún `desde`.
+"""
+from django.db.models import Max, Q
+
+from .models import Articulo, CambioPrecio, CombinacionProducto, ListaPrecio, PrecioArticulo, ReglaPrecio
+
+ACTUALIZADO = 'ACTUALIZADO'
+ELIMINADO = 'ELIMINADO'
+
+LIMITE_POR_DEFECTO = 1000
+LIMITE_MAXIMO = 10000
+
+ENTIDADES = {
+    PrecioArticulo: 'PRECIO',
+    ReglaPrecio: 'REGLA',
+    CombinacionProducto: 'COMBINACION',
+    ListaPrecio: 'LISTA',
+    Articulo: 'ARTICULO',
+}
+
+CAMPOS = {
+    'PRECIO': ('lista_precio', 'articulo', 'precio_base'),
+    'REGLA': (
+        'lista_precio', 'nombre_regla', 'tipo_regla', 'valor_regla', 'condicion', 'condicion_valor',
+        'aplica_articulo', 'aplica_grupo', 'aplica_linea', 'aplica_combinacion',
+        'prioridad', 'permite_venta_bajo_costo',
+    ),
+    'COMBINACION': ('lista_precio', 'nombre'),
+    'LISTA': (
+        'empresa', 'sucursal', 'nombre', 'canal_venta',
+        'fecha_inicio_vigencia', 'fecha_fin_vigencia', 'activa',
+    ),
+    # Del catálogo solo interesa al precio el costo mínimo
+    'ARTICULO': ('sku', 'ultimo_costo'),
+}
+
+
+def _datos(entidad, instancia, articulos=None):
+    opciones = instancia._meta
+    datos = {campo: getattr(instancia, opciones.get_field(campo).attname) for campo in CAMPOS[entidad]}
+    if entidad == 'COMBINACION':
+        if articulos is None:
+            articulos = instancia.articulos.values_list('pk', flat=True)
+        datos['articulos'] = sorted(articulos)
+    return datos
+
+
+def _lista_de(instancia):
+    if isinstance(instancia, ListaPrecio):
+        return instancia.pk
+    return getattr(instancia, 'lista_precio_id', None)
+
+
+def cambio(instancia, operacion=ACTUALIZADO, lista_id=None, articulos=None):
+    """
+    `CambioPrecio` sin guardar para `instancia`. `lista_id` sobrescribe la lista del
+    registro (la de origen, al mover un objeto a otra lista); `articulos` evita la
+    consulta de los miembros de una combinación si ya se conocen.
+    """
+    entidad = ENTIDADES[type(instancia)]
+    return CambioPrecio(
+        entidad=entidad,
+        objeto_id=instancia.pk,
+        operacion=operacion,
+        lista_id=lista_id if lista_id is not None else _lista_de(instancia),
+        datos=_datos(entidad, instancia, articulos) if operacion == ACTUALIZADO else None,
+    )
+
+
+def registrar(instancia, operacion=ACTUALIZADO, lista_id=None):
+    return cambio(instancia, operacion, lista_id).save()
+
+
+def registrar_varios(cambios):
+    """
+    Inserta `cambios` con un solo `bulk_create` (cargas masivas, objetos afectados en cascada).
+    """
+    if cambios:
+        CambioPrecio.objects.bulk_create(cambios)
+
+
+def registrar_combinaciones(combinaciones_ids):
+    """
+    Registra el estado actual de las combinaciones `combinaciones_ids`, con sus
+    artículos leídos en una consulta (cambios del M2M, bajas de artículos).
+    """
+    if not combinaciones_ids:
+        return
+    Miembro = CombinacionProducto.articulos.through
+    articulos = {}
+    for combinacion_id, articulo_id in Miembro.objects.filter(
+        combinacionproducto_id__in=combinaciones_ids
+    ).values_list('combinacionproducto_id', 'articulo_id'):
+        articulos.setdefault(combinacion_id, []).append(articulo_id)
+    registrar_varios([
+        cambio(combinacion, articulos=articulos.get(combinacion.pk, []))
+        for combinacion in CombinacionProducto.objects.filter(pk__in=combinaciones_ids)
+    ])
+
+
+def registrar_reglas(reglas_ids):
+    """
+    Registra el estado actual de las reglas `reglas_ids` (tras un SET_NULL en cascada).
+    """
+    if reglas_ids:
+        registrar_varios([cambio(regla) for regla in ReglaPrecio.objects.filter(pk__in=reglas_ids)])
+
+
+def ultima_secuencia() -> int:
+    return CambioPrecio.objects.aggregate(secuencia=Max('pk'))['secuencia'] or 0
+
+
+def leer(desde: int = 0, limite: int = LIMITE_POR_DEFECTO, lista_id=None) -> dict:
+    """
+    Cambios con secuencia mayor que `desde`, en lotes de hasta `limite` registros.
+
+    Dentro del lote queda solo el último registro de cada objeto (y lista), en el orden
+    de su secuencia. Con `lista_id` se devuelven los de esa lista y los de los costos de
+    artículos, que afectan a todas. El cliente continúa con `desde=hasta` mientras
+    `hay_mas` sea True.
+    """
+    consulta = CambioPrecio.objects.filter(pk__gt=desde).order_by('pk')
+    if lista_id is not None:
+        consulta = consulta.filter(Q(lista_id=lista_id) | Q(lista_id__isnull=True))
+    filas = list(
+        consulta.values_list('pk', 'entidad', 'objeto_id', 'operacion', 'lista_id', 'datos')[:limite + 1]
+    )
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    ultimos = {}
+    for fila in filas:
+        clave = (fila[1], fila[2], fila[4])
+        ultimos.pop(clave, None)  # reinsertar lo deja en el orden de su última secuencia
+        ultimos[clave] = fila
+
+    return {
+        'desde': desde,
+        'hasta': filas[-1][0] if filas else desde,
+        'hay_mas': hay_mas,
+        'cambios': [
+            {
+                'seq': seq, 'entidad': entidad, 'id': objeto_id,
+                'operacion': operacion, 'lista_precio': lista, 'datos': datos,
+            }
+            for seq, entidad, objeto_id, operacion, lista, datos in ultimos.values()
+        ],
+    }
+
+
+def compactar(hasta: int) -> int:
+    """
+    Borra los registros con secuencia `<= hasta` que no son el último de su objeto y
+    lista. El último (estado completo o baja) se conserva, así que un cliente con
+    cualquier `desde` sigue recibiendo el estado final de todo lo que cambió después.
+    Devuelve la cantidad de registros borrados.
+    """
+    ultimos = (
+        CambioPrecio.objects.values('entidad', 'objeto_id', 'lista_id')
+        .annotate(ultimo=Max('pk'))
+        .values('ultimo')
+    )
+    borrados, _ = CambioPrecio.objects.filter(pk__lte=hasta).exclude(pk__in=ultimos).delete()
+    return borrados
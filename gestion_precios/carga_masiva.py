@@ -0,0 +1,457 @@
+"""
+Altas masivas de listas de precios, reglas y combinaciones con validación por conjuntos.
+
+En lugar de una consulta de validación por fila (`ListaPrecioSerializer.validate`,
+`ReglaPrecioSerializer.validate`, un `PrimaryKeyRelatedField` por clave foránea),
+cada carga lee una sola vez lo que necesita: las vigencias activas de los grupos que
+compiten (empresa, sucursal, canal), que se cruzan con un barrido sobre los intervalos
+ordenados, o las firmas de las reglas de las listas destino, que se cruzan con un
+conjunto hash. Las cargas son todo o nada: si alguna fila tiene errores, no se crea
+ninguna y se informan todos, por índice.
+"""
+import heapq
+import time
+from datetime import date
+
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+
+from . import cambios
+
+from .models import (
+    Empresa, Sucursal, Articulo, GrupoArticulo, LineaArticulo,
+    ListaPrecio, ReglaPrecio, CombinacionProducto
+)
+from .serializers import ListaPrecioSerializer, ReglaPrecioSerializer, CombinacionProductoSerializer
+from .signals import invalidar_empresa_del_motor, invalidar_lista_del_motor
+
+ORIGEN_EXISTENTE = 'existente'
+ORIGEN_NUEVA = 'nueva'
+
+
+class ListaPrecioCargaSerializer(ListaPrecioSerializer):
+    """
+    Validación de campos de una lista de la carga, sin consultas: las claves foráneas
+    se comprueban por lotes y los solapamientos con el barrido de `CargaListasService`.
+    """
+    empresa = serializers.IntegerField()
+    sucursal = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta(ListaPrecioSerializer.Meta):
+        fields = [
+            'nombre', 'empresa', 'sucursal', 'canal_venta',
+            'fecha_inicio_vigencia', 'fecha_fin_vigencia', 'activa',
+        ]
+
+    def validate(self, data):
+        fin = data.get('fecha_fin_vigencia')
+        if fin is not None and fin < data['fecha_inicio_vigencia']:
+            raise serializers.ValidationError(
+                "'fecha_fin_vigencia' no puede ser anterior a 'fecha_inicio_vigencia'."
+            )
+        return data
+
+
+class ReglaPrecioCargaSerializer(ReglaPrecioSerializer):
+    """
+    Validación de campos de una regla de la carga, sin consultas: las claves foráneas
+    se comprueban por lotes y los duplicados con el conjunto de firmas de `CargaReglasService`.
+    """
+    lista_precio = serializers.IntegerField()
+    aplica_articulo = serializers.IntegerField(allow_null=True, required=False)
+    aplica_grupo = serializers.IntegerField(allow_null=True, required=False)
+    aplica_linea = serializers.IntegerField(allow_null=True, required=False)
+    aplica_combinacion = serializers.IntegerField(allow_null=True, required=False)
+
+    class Meta(ReglaPrecioSerializer.Meta):
+        fields = [campo for campo in ReglaPrecioSerializer.Meta.fields if campo not in ('id', 'fecha_actualizacion')]
+
+    def validate(self, data):
+        return data
+
+
+class CombinacionProductoCargaSerializer(CombinacionProductoSerializer):
+    """
+    Validación de campos de una combinación de la carga, sin consultas.
+    """
+    lista_precio = serializers.IntegerField()
+    articulos = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    class Meta(CombinacionProductoSerializer.Meta):
+        fields = ['nombre', 'lista_precio', 'articulos']
+
+
+def _validar_claves(validas, errores, claves):
+    """
+    Comprueba con una consulta por modelo que existan las claves foráneas de las filas
+    válidas. `claves` mapea campo -> modelo; el campo puede ser un ID o una lista de IDs.
+    Las filas con claves inexistentes pasan de `validas` a `errores`, con el mensaje de DRF.
+    """
+    mensaje = PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+
+    def valores(data, campo):
+        valor = data.get(campo)
+        if valor is None:
+            return []
+        return valor if isinstance(valor, list) else [valor]
+
+    existentes = {}
+    for campo, modelo in claves.items():
+        buscados = {valor for data in validas.values() for valor in valores(data, campo)}
+        existentes[campo] = set(
+            modelo.objects.filter(pk__in=buscados).values_list('pk', flat=True)
+        ) if buscados else set()
+
+    for indice, data in list(validas.items()):
+        errores_item = {}
+        for campo in claves:
+            faltantes = [valor for valor in valores(data, campo) if valor not in existentes[campo]]
+            if faltantes:
+                errores_item[campo] = [mensaje.format(pk_value=valor) for valor in faltantes]
+        if errores_item:
+            errores[indice] = errores_item
+            del validas[indice]
+
+
+def _validar_filas(datos, serializer_class):
+    """
+    Valida los campos de cada fila. Devuelve `(validas, errores)`, ambos por índice.
+    Un solo serializador para todas las filas, como hace `ListSerializer`: construir
+    los campos de un `ModelSerializer` por fila costaría más que validarla.
+    """
+    validas, errores = {}, {}
+    serializer = serializer_class()
+    for indice, item in enumerate(datos):
+        try:
+            validas[indice] = serializer.run_validation(item)
+        except serializers.ValidationError as error:
+            errores[indice] = dict(serializers.as_serializer_error(error))
+    return validas, errores
+
+
+def _lista_errores(errores):
+    return [{'indice': indice, 'errores': errores[indice]} for indice in sorted(errores)]
+
+
+def _solapamientos(intervalos):
+    """
+    Barrido sobre intervalos cerrados `(inicio, fin, clave)` (fin None = sin fin):
+    genera cada par de claves cuyas vigencias comparten al menos un día, en O(n log n + pares).
+    """
+    abiertos = []  # montículo de (fin, orden, clave) de los intervalos aún vigentes
+    for orden, (inicio, fin, clave) in enumerate(sorted(intervalos, key=lambda intervalo: intervalo[0])):
+        while abiertos and abiertos[0][0] < inicio:
+            heapq.heappop(abiertos)
+        for _, _, otra in abiertos:
+            yield otra, clave
+        heapq.heappush(abiertos, (fin or date.max, orden, clave))
+
+
+class CargaListasService:
+    """
+    Alta masiva de `ListaPrecio` con las mismas reglas de rechazo que el alta individual.
+    """
+
+    @staticmethod
+    def crear_listas(datos: list):
+        """
+        Valida y crea las listas de `datos` (diccionarios con los campos de `ListaPrecioSerializer`).
+
+        Devuelve un resumen con las listas recibidas, creadas, sus IDs y los errores por
+        índice (en el formato de errores de DRF). Si hay errores, no se crea ninguna.
+        """
+        inicio = time.perf_counter()
+        resumen = {'listas_recibidas': len(datos), 'listas_creadas': 0, 'ids': [], 'errores': []}
+
+        # 1. Campos de cada lista, sin consultas
+        validas, errores = _validar_filas(datos, ListaPrecioCargaSerializer)
+
+        # 2. Empresas y sucursales con una consulta cada una
+        _validar_claves(validas, errores, {'empresa': Empresa, 'sucursal': Sucursal})
+
+        with transaction.atomic():
+            # 3. Solapamientos con las listas existentes y entre las de la carga
+            CargaListasService._validar_solapamientos(validas, errores)
+
+            if errores:
+                resumen['errores'] = _lista_errores(errores)
+            else:
+                creadas = ListaPrecio.objects.bulk_create([
+                    ListaPrecio(
+                        nombre=data['nombre'],
+                        empresa_id=data['empresa'],
+                        sucursal_id=data.get('sucursal'),
+                        canal_venta=data.get('canal_venta', 'TODOS'),
+                        fecha_inicio_vigencia=data['fecha_inicio_vigencia'],
+                        fecha_fin_vigencia=data.get('fecha_fin_vigencia'),
+                        activa=data.get('activa', True),
+                    )
+                    for _, data in sorted(validas.items())
+                ])
+                # bulk_create no emite post_save: el registro de cambios se escribe aquí
+                cambios.registrar_varios([cambios.cambio(lista) for lista in creadas])
+                resumen['listas_creadas'] = len(creadas)
+                resumen['ids'] = [lista.pk for lista in creadas]
+
+        # bulk_create no emite post_save: se invalidan los índices de vigencias a mano
+        if resumen['listas_creadas']:
+            for empresa_id in {data['empresa'] for data in validas.values()}:
+                invalidar_empresa_del_motor(empresa_id)
+
+        resumen['segundos'] = round(time.perf_counter() - inicio, 3)
+        return resumen
+
+    @staticmethod
+    def _validar_solapamientos(validas, errores):
+        """
+        Reproduce, para cada lista de la carga en orden, la validación del alta individual
+        como si las anteriores ya se hubieran creado:
+
+        - compite con las listas activas del mismo (empresa, sucursal, canal), existentes
+          o anteriores en la carga;
+        - con fecha de fin, se rechaza si alguna vigencia se solapa con la suya;
+        - sin fecha de fin, se rechaza si existe cualquier lista que compita, aunque su
+          vigencia haya terminado antes (así se comporta `ListaPrecioSerializer.validate`).
+        """
+        if not validas:
+            return
+
+        def grupo(data):
+            return data['empresa'], data.get('sucursal'), data.get('canal_venta', 'TODOS')
+
+        grupos = {}
+        for indice, data in validas.items():
+            grupos.setdefault(grupo(data), []).append(indice)
+
+        # Vigencias activas de todos los grupos en una sola consulta (índice de vigencia)
+        existentes = {}
+        for lista_id, nombre, empresa_id, sucursal_id, canal, inicio, fin in ListaPrecio.objects.filter(
+            empresa_id__in={clave[0] for clave in grupos},
+            canal_venta__in={clave[2] for clave in grupos},
+            activa=True,
+        ).values_list(
+            'id', 'nombre', 'empresa_id', 'sucursal_id', 'canal_venta',
+            'fecha_inicio_vigencia', 'fecha_fin_vigencia'
+        ):
+            if (empresa_id, sucursal_id, canal) in grupos:
+                existentes.setdefault((empresa_id, sucursal_id, canal), []).append((lista_id, nombre, inicio, fin))
+
+        def conflicto(indice, origen, referencia):
+            if origen == ORIGEN_EXISTENTE:
+                lista_id, nombre = referencia
+                mensaje = f"Las fechas se solapan con una lista de precios existente: '{nombre}' (ID: {lista_id})"
+            else:
+                mensaje = (
+                    f"Las fechas se solapan con la lista '{validas[referencia]['nombre']}' "
+                    f"(índice {referencia}) de la misma carga."
+                )
+            mensajes = errores.setdefault(indice, {}).setdefault('non_field_errors', [])
+            if mensaje not in mensajes:
+                mensajes.append(mensaje)
+
+        for clave, indices in grupos.items():
+            existentes_grupo = existentes.get(clave, [])
+            intervalos = [
+                (inicio, fin, (ORIGEN_EXISTENTE, (lista_id, nombre)))
+                for lista_id, nombre, inicio, fin in existentes_grupo
+            ] + [
+                (validas[indice]['fecha_inicio_vigencia'], validas[indice].get('fecha_fin_vigencia'), (ORIGEN_NUEVA, indice))
+                for indice in indices
+            ]
+
+            for (origen_a, referencia_a), (origen_b, referencia_b) in _solapamientos(intervalos):
+                if origen_a == ORIGEN_EXISTENTE and origen_b == ORIGEN_EXISTENTE:
+                    continue
+                if origen_a == ORIGEN_EXISTENTE:
+                    conflicto(referencia_b, origen_a, referencia_a)
+                elif origen_b == ORIGEN_EXISTENTE:
+                    conflicto(referencia_a, origen_b, referencia_b)
+                else:
+                    # Entre listas de la carga, la posterior se valida contra la anterior si está activa
+                    anterior, posterior = sorted((referencia_a, referencia_b))
+                    if validas[anterior].get('activa', True):
+                        conflicto(posterior, ORIGEN_NUEVA, anterior)
+
+            # Listas sin fin: compiten con todas las activas anteriores del grupo
+            for posicion, indice in enumerate(indices):
+                if validas[indice].get('fecha_fin_vigencia') is not None:
+                    continue
+                for lista_id, nombre, _, _ in existentes_grupo:
+                    conflicto(indice, ORIGEN_EXISTENTE, (lista_id, nombre))
+                for anterior in indices[:posicion]:
+                    if validas[anterior].get('activa', True):
+                        conflicto(indice, ORIGEN_NUEVA, anterior)
+
+
+class CargaReglasService:
+    """
+    Alta masiva de `ReglaPrecio` con el mismo criterio de duplicados que el alta individual.
+    """
+    # Criterios que siempre están en una regla válida; el resto solo se compara si viene en la fila
+    CAMPOS_BASE = ('lista_precio', 'tipo_regla', 'condicion', 'condicion_valor')
+    CAMPOS_OPCIONALES = ('aplica_articulo', 'aplica_grupo', 'aplica_linea', 'aplica_combinacion')
+
+    @staticmethod
+    def crear_reglas(datos: list):
+        """
+        Valida y crea las reglas de `datos` con un solo `bulk_create`, en una transacción.
+
+        Devuelve un resumen con las reglas recibidas, creadas, sus IDs y los errores por
+        índice. Si hay errores, no se crea ninguna.
+        """
+        inicio = time.perf_counter()
+        resumen = {'reglas_recibidas': len(datos), 'reglas_creadas': 0, 'ids': [], 'errores': []}
+
+        # 1. Campos y claves foráneas: una consulta por modelo para toda la carga
+        validas, errores = _validar_filas(datos, ReglaPrecioCargaSerializer)
+        _validar_claves(validas, errores, {
+            'lista_precio': ListaPrecio,
+            'aplica_articulo': Articulo,
+            'aplica_grupo': GrupoArticulo,
+            'aplica_linea': LineaArticulo,
+            'aplica_combinacion': CombinacionProducto,
+        })
+
+        with transaction.atomic():
+            # 2. Duplicados contra las reglas existentes y dentro de la carga
+            CargaReglasService._validar_duplicados(validas, errores)
+
+            if errores:
+                resumen['errores'] = _lista_errores(errores)
+            else:
+                creadas = ReglaPrecio.objects.bulk_create([
+                    ReglaPrecio(
+                        lista_precio_id=data['lista_precio'],
+                        aplica_articulo_id=data.get('aplica_articulo'),
+                        aplica_grupo_id=data.get('aplica_grupo'),
+                        aplica_linea_id=data.get('aplica_linea'),
+                        aplica_combinacion_id=data.get('aplica_combinacion'),
+                        **{
+                            campo: valor for campo, valor in data.items()
+                            if campo != 'lista_precio' and campo not in CargaReglasService.CAMPOS_OPCIONALES
+                        }
+                    )
+                    for _, data in sorted(validas.items())
+                ])
+                cambios.registrar_varios([cambios.cambio(regla) for regla in creadas])
+                resumen['reglas_creadas'] = len(creadas)
+                resumen['ids'] = [regla.pk for regla in creadas]
+
+        # bulk_create no emite post_save: se invalidan las reglas compiladas a mano
+        if resumen['reglas_creadas']:
+            for lista_id in {data['lista_precio'] for data in validas.values()}:
+                invalidar_lista_del_motor(lista_id)
+
+        resumen['segundos'] = round(time.perf_counter() - inicio, 3)
+        return resumen
+
+    @staticmethod
+    def _validar_duplicados(validas, errores):
+        """
+        Reproduce `ReglaPrecioSerializer.validate` para cada regla de la carga, en orden,
+        como si las anteriores ya se hubieran creado: es duplicada si otra regla coincide
+        en los criterios de `CAMPOS_UNICOS` presentes en la fila (los ausentes no se comparan).
+
+        Las firmas existentes de las listas destino se leen con una consulta. Por cada
+        combinación de criterios presentes (a lo sumo 16) se arma, cuando hace falta, un
+        diccionario de la firma reducida a esos criterios: cada fila es una búsqueda O(1).
+        """
+        if not validas:
+            return
+        opcionales = CargaReglasService.CAMPOS_OPCIONALES
+
+        registradas = []  # (firma completa, referencia) en orden
+        tablas = {}       # criterios presentes -> {firma reducida: primera referencia}
+
+        def reducir(firma, presentes):
+            return firma[:4] + tuple(firma[4 + posicion] for posicion in presentes)
+
+        def tabla(presentes):
+            if presentes not in tablas:
+                tablas[presentes] = {}
+                for firma, referencia in registradas:
+                    tablas[presentes].setdefault(reducir(firma, presentes), referencia)
+            return tablas[presentes]
+
+        def registrar(firma, referencia):
+            registradas.append((firma, referencia))
+            for presentes, filas in tablas.items():
+                filas.setdefault(reducir(firma, presentes), referencia)
+
+        for fila in ReglaPrecio.objects.filter(
+            lista_precio_id__in={data['lista_precio'] for data in validas.values()}
+        ).order_by('prioridad', 'pk').values_list(
+            'pk', 'nombre_regla', 'lista_precio_id', 'tipo_regla', 'condicion', 'condicion_valor',
+            *(f'{campo}_id' for campo in opcionales)
+        ):
+            registrar(tuple(fila[2:]), (ORIGEN_EXISTENTE, fila[0], fila[1]))
+
+        for indice, data in sorted(validas.items()):
+            firma = tuple(data[campo] for campo in CargaReglasService.CAMPOS_BASE) + \
+                tuple(data.get(campo) for campo in opcionales)
+            presentes = tuple(posicion for posicion, campo in enumerate(opcionales) if campo in data)
+            referencia = tabla(presentes).get(reducir(firma, presentes))
+
+            if referencia is None:
+                registrar(firma, (ORIGEN_NUEVA, indice, data['nombre_regla']))
+                continue
+
+            origen, clave, nombre = referencia
+            if origen == ORIGEN_EXISTENTE:
+                mensaje = f"Ya existe una regla idéntica con estos criterios: '{nombre}' (ID: {clave})"
+            else:
+                mensaje = f"Repite los criterios de la regla '{nombre}' (índice {clave}) de la misma carga."
+            errores[indice] = {'non_field_errors': [mensaje]}
+
+
+class CargaCombinacionesService:
+    """
+    Alta masiva de `CombinacionProducto` y de sus artículos (tabla intermedia del M2M).
+    """
+
+    @staticmethod
+    def crear_combinaciones(datos: list):
+        """
+        Valida y crea las combinaciones de `datos` (`nombre`, `lista_precio`, `articulos`)
+        con un `bulk_create` para las combinaciones y otro para sus artículos, en una
+        transacción. Si hay errores, no se crea ninguna.
+        """
+        inicio = time.perf_counter()
+        resumen = {
+            'combinaciones_recibidas': len(datos), 'combinaciones_creadas': 0,
+            'articulos_asignados': 0, 'ids': [], 'errores': [],
+        }
+
+        validas, errores = _validar_filas(datos, CombinacionProductoCargaSerializer)
+        _validar_claves(validas, errores, {'lista_precio': ListaPrecio, 'articulos': Articulo})
+
+        if errores:
+            resumen['errores'] = _lista_errores(errores)
+        else:
+            filas = [data for _, data in sorted(validas.items())]
+            Miembro = CombinacionProducto.articulos.through
+            with transaction.atomic():
+                creadas = CombinacionProducto.objects.bulk_create([
+                    CombinacionProducto(nombre=data['nombre'], lista_precio_id=data['lista_precio'])
+                    for data in filas
+                ])
+                miembros = Miembro.objects.bulk_create([
+                    Miembro(combinacionproducto_id=combinacion.pk, articulo_id=articulo_id)
+                    for combinacion, data in zip(creadas, filas)
+                    for articulo_id in dict.fromkeys(data['articulos'])  # sin repetidos, en orden
+                ])
+                cambios.registrar_varios([
+                    cambios.cambio(combinacion, articulos=set(data['articulos']))
+                    for combinacion, data in zip(creadas, filas)
+                ])
+            resumen['combinaciones_creadas'] = len(creadas)
+            resumen['articulos_asignados'] = len(miembros)
+            resumen['ids'] = [combinacion.pk for combinacion in creadas]
+
+            # bulk_create no emite post_save ni m2m_changed
+            for lista_id in {data['lista_precio'] for data in filas}:
+                invalidar_lista_del_motor(lista_id)
+
+        resumen['segundos'] = round(time.perf_counter() - inicio, 3)
+        return resumen
@@ -0,0 +1,258 @@
+"""
+Evaluador de precios sin conexión para los terminales de tienda.
+
+Carga el paquete de una lista de precios (`GET /api/listas-precio/{id}/bundle/`,
+generado por `paquete_offline.py`) y calcula precios con la misma semántica que
+`PrecioService.calcular_precio_final` con el motor 'decimal', sin base de datos ni red.
+
+Solo depende de la biblioteca estándar y de `motor.py`: en el terminal basta copiar
+estos dos archivos (dentro de un paquete `gestion_precios` sin Django).
+
+Formato del paquete (JSON por líneas, `VERSION_FORMATO`):
+- una cabecera `{"tipo": "cabecera", "version_formato", "lista", "secuencia", ...}`;
+  `secuencia` es la del feed de cambios (`/api/cambios/?desde=`) al generar el paquete;
+- una línea `{"tipo": "regla", ...}` por regla y `{"tipo": "combinacion", "id", "articulos"}`
+  por combinación (incluidas las de otras listas que usan sus reglas);
+- una línea por artículo con precio, como arreglo en el orden de `COLUMNAS_ARTICULO`;
+- un cierre `{"tipo": "fin", "articulos": n}`: sin él, el paquete está incompleto.
+Los importes viajan como texto para conservar los decimales exactos.
+"""
+import json
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from .motor import ConjuntoReglas, ReglaCompilada
+
+VERSION_FORMATO = 1
+COLUMNAS_ARTICULO = ('id', 'sku', 'grupo_id', 'linea_id', 'precio_base', 'ultimo_costo')
+CAMPOS_REGLA = (
+    'id', 'nombre_regla', 'tipo_regla', 'valor_regla', 'condicion', 'condicion_valor',
+    'aplica_articulo_id', 'aplica_grupo_id', 'aplica_linea_id', 'aplica_combinacion_id',
+    'prioridad', 'permite_venta_bajo_costo',
+)
+AJUSTE_COSTO_MINIMO = "Ajuste a costo mínimo (no autorizado bajo costo)"
+CENTIMO = Decimal('0.01')
+
+ArticuloOffline = namedtuple('ArticuloOffline', COLUMNAS_ARTICULO)
+
+
+class PaqueteInvalido(ValueError):
+    pass
+
+
+def conjunto_desde(lista_id, reglas, combinaciones) -> ConjuntoReglas:
+    """
+    `ConjuntoReglas` a partir de reglas como diccionarios con `CAMPOS_REGLA` y de
+    {combinación: artículos}, tal como viajan en el paquete.
+    """
+    return ConjuntoReglas(
+        lista_id, [ReglaCompilada(**{campo: regla[campo] for campo in CAMPOS_REGLA}) for regla in reglas], combinaciones
+    )
+
+
+def datos_conjunto(conjunto: ConjuntoReglas):
+    """
+    Inverso de `conjunto_desde`: reglas como diccionarios y combinaciones como listas ordenadas.
+    """
+    reglas = [{campo: getattr(regla, campo) for campo in CAMPOS_REGLA} for regla in conjunto.reglas]
+    combinaciones = {
+        combinacion_id: sorted(articulos) for combinacion_id, articulos in sorted(conjunto.combinaciones.items())
+    }
+    return reglas, combinaciones
+
+
+class EvaluadorOffline:
+    """
+    Precios de una lista ya resuelta, cargados desde su paquete.
+    """
+
+    def __init__(self, cabecera: dict, conjunto: ConjuntoReglas, articulos: dict):
+        self.cabecera = cabecera
+        self.lista = cabecera['lista']
+        self.secuencia = cabecera['secuencia']
+        self.conjunto = conjunto
+        self.articulos = articulos
+
+    @classmethod
+    def cargar(cls, lineas):
+        """
+        Construye el evaluador a partir de las líneas del paquete (un archivo abierto o
+        cualquier iterable de `str`/`bytes`). Lanza `PaqueteInvalido` si el paquete está
+        incompleto o es de otra versión de formato.
+        """
+        cabecera, fin = None, None
+        reglas, combinaciones, articulos = [], {}, {}
+        for numero, linea in enumerate(lineas, start=1):
+            if not linea.strip():
+                continue
+            if fin is not None:
+                raise PaqueteInvalido(f"Línea {numero}: contenido después del cierre del paquete.")
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                raise PaqueteInvalido(f"Línea {numero}: JSON inválido.")
+
+            if isinstance(registro, list):
+                articulo = ArticuloOffline(*registro)
+                articulos[articulo.id] = articulo._replace(
+                    precio_base=Decimal(articulo.precio_base), ultimo_costo=Decimal(articulo.ultimo_costo)
+                )
+                continue
+
+            tipo = registro.get('tipo')
+            if cabecera is None:
+                if tipo != 'cabecera':
+                    raise PaqueteInvalido("El paquete debe empezar con la cabecera.")
+                if registro.get('version_formato') != VERSION_FORMATO:
+                    raise PaqueteInvalido(
+                        f"Versión de formato {registro.get('version_formato')} no soportada (se espera {VERSION_FORMATO})."
+                    )
+                cabecera = registro
+            elif tipo == 'regla':
+                reglas.append(registro)
+            elif tipo == 'combinacion':
+                combinaciones[registro['id']] = registro['articulos']
+            elif tipo == 'fin':
+                fin = registro
+            else:
+                raise PaqueteInvalido(f"Línea {numero}: registro desconocido '{tipo}'.")
+
+        if cabecera is None or fin is None:
+            raise PaqueteInvalido("Paquete incompleto: falta la cabecera o el cierre.")
+        if fin['articulos'] != len(articulos):
+            raise PaqueteInvalido(f"Paquete incompleto: {len(articulos)} artículos de {fin['articulos']}.")
+        return cls(cabecera, conjunto_desde(cabecera['lista']['id'], reglas, combinaciones), articulos)
+
+    def calcular_precio_final(
+        self,
+        articulo_id: int,
+        cantidad: int,
+        monto_pedido: Decimal = Decimal('0.00'),
+        cart_items_ids: list[int] = None,
+    ):
+        """
+        Mismo resultado que `PrecioService.calcular_precio_final` para la lista del paquete.
+        """
+        articulo = self.articulos.get(articulo_id)
+        if articulo is None:
+            return {
+                "error": f"El artículo ID {articulo_id} no tiene un precio base definido en la lista '{self.lista['nombre']}'.",
+                "precio_final": None,
+            }
+
+        carrito = set(cart_items_ids or ())
+        carrito.add(articulo_id)
+        precio_final, reglas_aplicadas, autorizado_bajo_costo = aplicar_reglas(
+            self.conjunto, articulo, cantidad, monto_pedido, self.conjunto.combinaciones_satisfechas(carrito)
+        )
+        return {
+            "lista_precio_aplicada": self.lista['nombre'],
+            "precio_base": articulo.precio_base,
+            "precio_final": precio_final,
+            "cantidad": cantidad,
+            "total": precio_final * cantidad,
+            "reglas_aplicadas": reglas_aplicadas,
+            "autorizado_bajo_costo": autorizado_bajo_costo,
+        }
+
+
+def aplicar_reglas(conjunto, articulo, cantidad, monto_pedido, combinaciones_satisfechas, candidatas=None):
+    """
+    Bucle de reglas y validación de costo de `PrecioService._aplicar_reglas`, sin
+    métricas. `candidatas` son las `conjunto.reglas_para` del artículo, si ya se tienen.
+    Devuelve (precio_final, reglas_aplicadas, autorizado_bajo_costo).
+    """
+    if candidatas is None:
+        candidatas = conjunto.reglas_para(articulo.id, articulo.grupo_id, articulo.linea_id)
+    precio_final, reglas_aplicadas, permiso_venta_bajo_costo = ejecutar_reglas(
+        conjunto, articulo.id, articulo.precio_base, candidatas, cantidad, monto_pedido, combinaciones_satisfechas
+    )
+    precio_final, autorizado_bajo_costo = ajustar_a_costo(
+        precio_final, articulo.ultimo_costo, permiso_venta_bajo_costo, reglas_aplicadas
+    )
+    return precio_final, reglas_aplicadas, autorizado_bajo_costo
+
+
+def ejecutar_reglas(conjunto, articulo_id, precio_base, candidatas, cantidad, monto_pedido, combinaciones_satisfechas):
+    """
+    Aplica en orden las `candidatas` (de `conjunto.reglas_para`) cuya condición se cumple.
+    Es el bucle del motor 'decimal', compartido con `PrecioService._aplicar_reglas`.
+    Devuelve (precio, reglas_aplicadas, permiso_venta_bajo_costo).
+    """
+    precio_final = precio_base
+    reglas_aplicadas = []
+    permiso_venta_bajo_costo = False
+
+    for regla in candidatas:
+        if regla.aplica_combinacion_id:
+            # El artículo debe ser parte de la combinación y el carrito completarla
+            if articulo_id not in conjunto.combinaciones[regla.aplica_combinacion_id]:
+                continue
+            if regla.aplica_combinacion_id not in combinaciones_satisfechas:
+                continue
+        elif regla.condicion == 'CANTIDAD_MINIMA':
+            if not cantidad >= regla.condicion_valor:
+                continue
+        elif regla.condicion == 'MONTO_MINIMO':
+            if not monto_pedido >= regla.condicion_valor:
+                continue
+        else:
+            continue
+
+        if regla.tipo_regla == 'PORCENTAJE':
+            precio_final -= precio_final * regla.factor_porcentaje
+        elif regla.tipo_regla == 'MONTO_FIJO':
+            precio_final -= regla.valor_regla
+
+        reglas_aplicadas.append(regla.nombre_regla)
+        if regla.permite_venta_bajo_costo:
+            permiso_venta_bajo_costo = True
+        if precio_final < Decimal('0.00'):
+            precio_final = Decimal('0.00')
+
+    return precio_final, reglas_aplicadas, permiso_venta_bajo_costo
+
+
+def ajustar_a_costo(precio_final, ultimo_costo, permiso_venta_bajo_costo, reglas_aplicadas):
+    """
+    Validación de costo: un precio bajo el costo sin una regla que lo autorice sube al
+    costo y añade `AJUSTE_COSTO_MINIMO` a `reglas_aplicadas`.
+    Devuelve (precio_final, autorizado_bajo_costo).
+    """
+    if precio_final < ultimo_costo:
+        if permiso_venta_bajo_costo:
+            return precio_final, True
+        reglas_aplicadas.append(AJUSTE_COSTO_MINIMO)
+        return ultimo_costo, False
+    return precio_final, False
+
+
+def evaluar_lote(lista_id, reglas, combinaciones, articulos, cantidades):
+    """
+    Precios finales de `articulos` (tuplas en el orden de `COLUMNAS_ARTICULO`) para cada
+    una de `cantidades`, sin carrito y con monto de pedido 0. Es la tarea que
+    `reprice_catalog` reparte entre procesos: recibe y devuelve solo valores planos.
+
+    Devuelve tuplas `(articulo_id, cantidad, precio_base, precio_final, total,
+    reglas_aplicadas, autorizado_bajo_costo)` con `precio_final` y `total` redondeados a
+    céntimos como en la API (el total, a partir del precio sin redondear).
+    """
+    conjunto = conjunto_desde(lista_id, reglas, combinaciones)
+    monto_pedido = Decimal('0.00')
+    resultados = []
+    for fila in articulos:
+        articulo = ArticuloOffline(*fila)
+        combinaciones_satisfechas = conjunto.combinaciones_satisfechas((articulo.id,))
+        # Las reglas candidatas no dependen de la cantidad: se buscan una vez por artículo
+        candidatas = conjunto.reglas_para(articulo.id, articulo.grupo_id, articulo.linea_id)
+        for cantidad in cantidades:
+            precio_final, reglas_aplicadas, autorizado_bajo_costo = aplicar_reglas(
+                conjunto, articulo, cantidad, monto_pedido, combinaciones_satisfechas, candidatas
+            )
+            resultados.append((
+                articulo.id, cantidad, articulo.precio_base,
+                precio_final.quantize(CENTIMO, rounding=ROUND_HALF_EVEN),
+                (precio_final * cantidad).quantize(CENTIMO, rounding=ROUND_HALF_EVEN),
+                reglas_aplicadas, autorizado_bajo_costo,
+            ))
+    return resultados
@@ -0,0 +1,68 @@
+"""
+Exportación de una lista de precios completa (precio base y precio final) en CSV o NDJSON.
+
+Las filas vienen de `PrecioService.exportar_precios` y se serializan una a una para
+`StreamingHttpResponse`, sin acumular el archivo en memoria.
+"""
+import csv
+import json
+from decimal import Decimal, ROUND_HALF_EVEN
+
+FORMATOS = ('csv', 'ndjson')
+TIPOS_CONTENIDO = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+COLUMNAS = (
+    'articulo_id', 'sku', 'nombre', 'precio_base', 'precio_final',
+    'cantidad', 'total', 'reglas_aplicadas', 'autorizado_bajo_costo',
+)
+CENTIMO = Decimal('0.01')
+
+
+class _Eco:
+    """
+    Objeto tipo archivo cuyo `write` devuelve el texto en vez de guardarlo,
+    para que `csv.writer` produzca una línea por llamada.
+    """
+    def write(self, valor):
+        return valor
+
+
+def _redondear(valor):
+    # Mismo redondeo que los DecimalField de los serializadores de resultado
+    return str(valor.quantize(CENTIMO, rounding=ROUND_HALF_EVEN))
+
+
+def _fila_plana(fila):
+    return dict(
+        fila,
+        precio_base=_redondear(fila['precio_base']),
+        precio_final=_redondear(fila['precio_final']),
+        total=_redondear(fila['total']),
+    )
+
+
+def lineas_csv(filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(COLUMNAS)
+    for fila in filas:
+        plana = _fila_plana(fila)
+        plana['reglas_aplicadas'] = ' | '.join(plana['reglas_aplicadas'])
+        yield escritor.writerow([plana[columna] for columna in COLUMNAS])
+
+
+def lineas_ndjson(filas):
+    for fila in filas:
+        yield json.dumps(_fila_plana(fila), ensure_ascii=False) + '\n'
+
+
+def serializar(filas, formato: str):
+    """
+    Devuelve un generador de líneas de texto en el `formato` pedido.
+    """
+    if formato == 'csv':
+        return lineas_csv(filas)
+    if formato == 'ndjson':
+        return lineas_ndjson(filas)
+    raise ValueError(f"Formato desconocido: '{formato}'. Opciones: {', '.join(FORMATOS)}.")
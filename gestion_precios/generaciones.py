@@ -0,0 +1,144 @@
+"""
+Contadores de generación del caché de resultados de precios (`cache_precios`) y de
+los ETag de los listados (`versiones.py`).
+
+Hay uno por lista de precios (sus precios, reglas y combinaciones), uno por empresa
+(sus listas) y uno global (catálogo de artículos y cargas masivas). Forman parte de
+la clave de cada resultado memoizado, así que invalidar una lista es cambiar su
+contador: las entradas viejas dejan de leerse y caducan solas. Viven en el nivel
+compartido (L2), de modo que una escritura en un worker invalida a todos.
+
+Los cachés en memoria de cada proceso (`cache_reglas`, `cache_listas`) guardan con
+cada entrada los contadores leídos antes de construirla y la reconstruyen cuando ya
+no coinciden. Para ellos hay además un contador del motor, que cambia con las
+escrituras que los vacían enteros (cargas masivas, bajas del catálogo) pero no con
+cada artículo modificado.
+
+Un contador nuevo (o desalojado del caché) toma el instante actual en nanosegundos
+en lugar de 0: nunca vuelve a un valor ya usado por entradas antiguas.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CLAVE_GLOBAL = 'precios:generacion:global'
+CLAVE_MOTOR = 'precios:generacion:motor'
+
+
+def clave_lista(lista_id: int) -> str:
+    return f'precios:generacion:lista:{lista_id}'
+
+
+def clave_empresa(empresa_id: int) -> str:
+    return f'precios:generacion:empresa:{empresa_id}'
+
+
+def alias_cache():
+    """
+    Alias de CACHES donde guardar los contadores: el L2 si está configurado, si no el L1
+    (en ese caso la invalidación solo llega a los workers del proceso que escribe).
+    """
+    configuracion = getattr(settings, 'PRECIOS_CACHE_RESULTADOS', None) or {}
+    return configuracion.get('L2') or configuracion.get('L1')
+
+
+def actuales(lista_id: int):
+    """
+    Devuelve `(generacion_lista, generacion_global)`, inicializando las que falten.
+    """
+    return leer(clave_lista(lista_id), CLAVE_GLOBAL)
+
+
+def actuales_empresa(empresa_id: int):
+    """
+    Devuelve `(generacion_empresa, generacion_global)`.
+    """
+    return leer(clave_empresa(empresa_id), CLAVE_GLOBAL)
+
+
+def actuales_con_motor(lista_id: int):
+    """
+    Devuelve `(generacion_lista, generacion_global, generacion_motor)` en una lectura:
+    las dos primeras para `cache_precios`, la primera y la última para `cache_reglas`.
+    """
+    return leer(clave_lista(lista_id), CLAVE_GLOBAL, CLAVE_MOTOR)
+
+
+async def aactuales_con_motor(lista_id: int):
+    return await aleer(clave_lista(lista_id), CLAVE_GLOBAL, CLAVE_MOTOR)
+
+
+def leer(*claves):
+    """
+    Valores de los contadores `claves`, en el mismo orden, inicializando los que falten.
+    """
+    cache = caches[alias_cache()]
+    valores = cache.get_many(claves)
+    if len(valores) < len(claves):
+        for clave in claves:
+            if clave not in valores:
+                # `add` no pisa el valor de otro worker que se adelantó
+                cache.add(clave, time.time_ns(), timeout=None)
+        valores = cache.get_many(claves)
+    return tuple(valores.get(clave, 0) for clave in claves)
+
+
+async def aactuales(lista_id: int):
+    """
+    Igual que `actuales`, con la API asíncrona del caché.
+    """
+    return await aleer(clave_lista(lista_id), CLAVE_GLOBAL)
+
+
+async def aactuales_empresa(empresa_id: int):
+    """
+    Igual que `actuales_empresa`, con la API asíncrona del caché.
+    """
+    return await aleer(clave_empresa(empresa_id), CLAVE_GLOBAL)
+
+
+async def aleer(*claves):
+    """
+    Igual que `leer`, con la API asíncrona del caché.
+    """
+    cache = caches[alias_cache()]
+    valores = await cache.aget_many(claves)
+    if len(valores) < len(claves):
+        for clave in claves:
+            if clave not in valores:
+                await cache.aadd(clave, time.time_ns(), timeout=None)
+        valores = await cache.aget_many(claves)
+    return tuple(valores.get(clave, 0) for clave in claves)
+
+
+def _renovar(clave):
+    if alias_cache() is None:
+        return
+    caches[alias_cache()].set(clave, time.time_ns(), timeout=None)
+
+
+def _incrementar(clave):
+    """
+    Cambia el contador ahora y otra vez al confirmar la transacción: un worker que lea
+    los datos viejos entre la escritura y el COMMIT los guardaría con la generación nueva.
+    """
+    _renovar(clave)
+    transaction.on_commit(lambda: _renovar(clave))
+
+
+def incrementar_lista(lista_id: int):
+    _incrementar(clave_lista(lista_id))
+
+
+def incrementar_empresa(empresa_id: int):
+    _incrementar(clave_empresa(empresa_id))
+
+
+def incrementar_global():
+    _incrementar(CLAVE_GLOBAL)
+
+
+def incrementar_motor():
+    _incrementar(CLAVE_MOTOR)
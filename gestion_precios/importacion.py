@@ -0,0 +1,182 @@
+"""
+Importación masiva de precios base (PrecioArticulo) desde CSV o NDJSON.
+
+Las filas se leen de forma incremental, se resuelven a artículos por lotes y se
+insertan o actualizan con `bulk_create(update_conflicts=True)` sobre
+(lista_precio, articulo). La memoria usada depende del tamaño del lote, no del
+archivo, y los errores de cada fila se informan sin abortar la carga.
+"""
+import codecs
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import cambios, generaciones
+from .models import Articulo, PrecioArticulo, ListaPrecio
+
+FORMATOS = ('csv', 'ndjson')
+PRECIO_MINIMO = Decimal('0.01')
+PRECIO_MAXIMO = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+
+
+def decodificar_lineas(lineas_binarias, encoding='utf-8-sig'):
+    """
+    Convierte un iterable de líneas en bytes (archivo subido, cuerpo de la petición)
+    en líneas de texto, sin leer todo el contenido en memoria.
+    """
+    return codecs.iterdecode(lineas_binarias, encoding)
+
+
+def leer_filas(lineas, formato: str):
+    """
+    Genera `(numero_fila, sku, precio_texto, error)` a partir de líneas de texto.
+    Acepta CSV con encabezado `sku,precio_base` (en cualquier orden) o sin él,
+    y NDJSON con un objeto `{"sku": ..., "precio_base": ...}` por línea.
+    """
+    if formato == 'csv':
+        yield from _leer_csv(lineas)
+    elif formato == 'ndjson':
+        yield from _leer_ndjson(lineas)
+    else:
+        raise ValueError(f"Formato desconocido: '{formato}'. Opciones: {', '.join(FORMATOS)}.")
+
+
+def _leer_csv(lineas):
+    columna_sku, columna_precio = 0, 1
+    for numero, fila in enumerate(csv.reader(lineas), start=1):
+        if not fila or not any(celda.strip() for celda in fila):
+            continue
+        if numero == 1:
+            encabezado = [celda.strip().lower() for celda in fila]
+            if 'sku' in encabezado:
+                if 'precio_base' not in encabezado:
+                    yield numero, None, None, "El encabezado debe incluir las columnas 'sku' y 'precio_base'."
+                    return
+                columna_sku, columna_precio = encabezado.index('sku'), encabezado.index('precio_base')
+                continue
+        if len(fila) <= max(columna_sku, columna_precio):
+            yield numero, None, None, 'Faltan columnas.'
+            continue
+        yield numero, fila[columna_sku].strip(), fila[columna_precio].strip(), None
+
+
+def _leer_ndjson(lineas):
+    for numero, linea in enumerate(lineas, start=1):
+        if not linea.strip():
+            continue
+        try:
+            objeto = json.loads(linea)
+        except ValueError:
+            yield numero, None, None, 'JSON inválido.'
+            continue
+        if not isinstance(objeto, dict) or 'sku' not in objeto or 'precio_base' not in objeto:
+            yield numero, None, None, "Se esperaba un objeto con 'sku' y 'precio_base'."
+            continue
+        yield numero, str(objeto['sku']).strip(), str(objeto['precio_base']).strip(), None
+
+
+class ImportacionPreciosService:
+    """
+    Carga por lotes de precios base en una lista de precios.
+    """
+
+    @staticmethod
+    def importar(lista: ListaPrecio, filas, lote: int = 5000, max_errores: int = 1000):
+        """
+        Inserta o actualiza los precios de `filas` (ver `leer_filas`) en `lista`.
+
+        Devuelve un resumen con filas procesadas, importadas, con error, hasta
+        `max_errores` errores detallados y el tiempo total.
+        """
+        inicio = time.perf_counter()
+        resumen = {
+            'lista_precio': lista.id,
+            'filas_procesadas': 0,
+            'filas_importadas': 0,
+            'filas_con_error': 0,
+            'errores': [],
+        }
+
+        def registrar_error(numero, sku, mensaje):
+            resumen['filas_con_error'] += 1
+            if len(resumen['errores']) < max_errores:
+                resumen['errores'].append({'fila': numero, 'sku': sku, 'error': mensaje})
+
+        pendientes = []
+        for numero, sku, precio_texto, error in filas:
+            resumen['filas_procesadas'] += 1
+            if error:
+                registrar_error(numero, sku, error)
+                continue
+            precio, error = ImportacionPreciosService._validar_precio(precio_texto)
+            if error:
+                registrar_error(numero, sku, error)
+                continue
+            pendientes.append((numero, sku, precio))
+            if len(pendientes) >= lote:
+                ImportacionPreciosService._guardar_lote(lista, pendientes, resumen, registrar_error)
+                pendientes = []
+
+        if pendientes:
+            ImportacionPreciosService._guardar_lote(lista, pendientes, resumen, registrar_error)
+
+        resumen['segundos'] = round(time.perf_counter() - inicio, 3)
+        return resumen
+
+    @staticmethod
+    def _validar_precio(texto):
+        """
+        Devuelve `(precio, None)` o `(None, mensaje_de_error)`, con las mismas reglas
+        que el campo `PrecioArticulo.precio_base`.
+        """
+        if not texto:
+            return None, "Falta 'precio_base'."
+        try:
+            precio = Decimal(texto)
+        except InvalidOperation:
+            return None, f"'precio_base' no es un número válido: '{texto}'."
+        if not precio.is_finite():
+            return None, f"'precio_base' no es un número válido: '{texto}'."
+        if precio.as_tuple().exponent < -2:
+            return None, "'precio_base' admite como máximo 2 decimales."
+        if precio < PRECIO_MINIMO or precio > PRECIO_MAXIMO:
+            return None, f"'precio_base' debe estar entre {PRECIO_MINIMO} y {PRECIO_MAXIMO}."
+        return precio, None
+
+    @staticmethod
+    def _guardar_lote(lista, pendientes, resumen, registrar_error):
+        """
+        Resuelve los SKU del lote con una consulta y hace el upsert con un solo `bulk_create`.
+        Si un SKU se repite dentro del lote, gana la última fila.
+        """
+        skus = {sku for _, sku, _ in pendientes}
+        articulos = dict(Articulo.objects.filter(sku__in=skus).values_list('sku', 'id'))
+
+        precios = {}
+        for numero, sku, precio in pendientes:
+            articulo_id = articulos.get(sku)
+            if articulo_id is None:
+                registrar_error(numero, sku, f"No existe un artículo con SKU '{sku}'.")
+                continue
+            precios[articulo_id] = PrecioArticulo(
+                lista_precio_id=lista.id, articulo_id=articulo_id, precio_base=precio
+            )
+
+        with transaction.atomic():
+            PrecioArticulo.objects.bulk_create(
+                precios.values(),
+                update_conflicts=True,
+                unique_fields=['lista_precio', 'articulo'],
+                # bulk_create no pasa por save(): se actualiza la marca de tiempo explícitamente
+                update_fields=['precio_base', 'fecha_actualizacion'],
+            )
+            # Con update_conflicts, bulk_create devuelve el id de cada fila insertada o actualizada
+            cambios.registrar_varios([cambios.cambio(precio) for precio in precios.values()])
+
+        # bulk_create no emite post_save: se invalidan a mano los precios memoizados de la lista
+        generaciones.incrementar_lista(lista.id)
+        # Las filas repetidas dentro del lote cuentan como importadas (la última sobrescribe)
+        resumen['filas_importadas'] += sum(1 for _, sku, _ in pendientes if sku in articulos)
@@ -0,0 +1,183 @@
+"""
+Paginación, filtros y selección de campos para los listados de los ModelViewSet.
+
+- `PaginacionCursor` pagina por `id` (clave primaria), así que el costo de cada página
+  no crece con la posición dentro de la tabla, a diferencia de LIMIT/OFFSET. Con
+  `updated_since` pagina por `fecha_actualizacion`, que es la columna indexada del filtro.
+- `ListadoMixin` aplica los filtros declarados en `filtros` (columnas indexadas),
+  `updated_since` sobre `fecha_actualizacion` y `fields=`, que reduce tanto el JSON
+  como el SELECT (`.only()`). Los listados acotados por un filtro de `versionado`
+  llevan ETag y responden 304 a `If-None-Match` (ver `versiones.py`).
+"""
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+from . import versiones
+
+
+class PaginacionCursor(CursorPagination):
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get('updated_since'):
+            return ('fecha_actualizacion', 'id')
+        return (self.ordering,)
+
+
+def _entero(valor):
+    return int(valor)
+
+
+def _booleano(valor):
+    valores = {'true': True, '1': True, 'false': False, '0': False}
+    if valor.lower() not in valores:
+        raise ValueError(valor)
+    return valores[valor.lower()]
+
+
+def _texto(valor):
+    return valor
+
+
+def _fecha_hora(valor):
+    """
+    Acepta fecha-hora ISO 8601 o solo fecha (medianoche). Sin zona horaria se asume la del proyecto.
+    """
+    fecha_hora = parse_datetime(valor)
+    if fecha_hora is None:
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise ValueError(valor)
+        fecha_hora = timezone.datetime(fecha.year, fecha.month, fecha.day)
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora
+
+
+TIPOS_FILTRO = {'entero': _entero, 'booleano': _booleano, 'texto': _texto}
+
+
+class ListadoMixin:
+    """
+    Mixin para ModelViewSet.
+
+    `filtros` mapea parámetro de consulta -> (lookup del ORM, tipo). Si el modelo tiene
+    `fecha_actualizacion`, se acepta además `updated_since` (fecha_actualizacion >= valor).
+
+    `versionado` mapea un parámetro de filtro -> contador de generaciones ('empresa' o
+    'lista') que cambia con cada escritura en las filas que ese filtro selecciona.
+    """
+    filtros = {}
+    versionado = {}
+
+    def list(self, request, *args, **kwargs):
+        etiqueta = self.etag_listado()
+        if versiones.coincide(request, etiqueta):
+            return versiones.no_modificado(etiqueta)
+        respuesta = super().list(request, *args, **kwargs)
+        if etiqueta is not None and respuesta.status_code == 200:
+            respuesta['ETag'] = etiqueta
+        return respuesta
+
+    def etag_listado(self):
+        """
+        ETag del listado si está acotado por un filtro de `versionado`; None si no.
+        """
+        etag_de = {'empresa': versiones.etag_empresa, 'lista': versiones.etag_lista}
+        for parametro, contador in self.versionado.items():
+            try:
+                valor = int(self.request.query_params.get(parametro, ''))
+            except ValueError:
+                continue
+            return etag_de[contador](
+                self.basename, valor, self.request.META.get('QUERY_STRING', ''),
+                self.request.accepted_renderer.format
+            )
+        return None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        parametros = self.request.query_params
+
+        # 1. Filtros declarados
+        condiciones = {}
+        for parametro, (lookup, tipo) in self.filtros.items():
+            valor = parametros.get(parametro)
+            if valor in (None, ''):
+                continue
+            try:
+                condiciones[lookup] = TIPOS_FILTRO[tipo](valor)
+            except ValueError:
+                raise ValidationError({parametro: f"Valor inválido: '{valor}'."})
+
+        # 2. Cambios desde una fecha
+        desde = parametros.get('updated_since')
+        if desde:
+            if not self._tiene_campo('fecha_actualizacion'):
+                raise ValidationError({'updated_since': 'Este recurso no registra fecha de actualización.'})
+            try:
+                condiciones['fecha_actualizacion__gte'] = _fecha_hora(desde)
+            except ValueError:
+                raise ValidationError({'updated_since': f"Fecha inválida: '{desde}'."})
+
+        if condiciones:
+            queryset = queryset.filter(**condiciones)
+
+        # 3. Columnas del SELECT según `fields=` (solo lectura; las escrituras necesitan la fila completa)
+        campos = self.campos_solicitados()
+        if campos is not None and self.request.method == 'GET':
+            columnas = self._columnas_de(campos)
+            if desde:
+                # El cursor se posiciona por esta columna
+                columnas.add('fecha_actualizacion')
+            queryset = queryset.only(*columnas)
+
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        campos = self.campos_solicitados()
+        if campos is not None and self.request.method == 'GET':
+            kwargs['campos'] = campos
+        return super().get_serializer(*args, **kwargs)
+
+    def campos_solicitados(self):
+        """
+        Lista de campos pedidos con `fields=a,b,c`, validados contra el serializador; None si no se pidió.
+        """
+        if not hasattr(self, '_campos_solicitados'):
+            valor = self.request.query_params.get('fields') if self.request else None
+            campos = None
+            if valor:
+                campos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+                disponibles = self.get_serializer_class()().fields
+                desconocidos = [campo for campo in campos if campo not in disponibles]
+                if desconocidos:
+                    raise ValidationError({'fields': f"Campos desconocidos: {', '.join(desconocidos)}."})
+            self._campos_solicitados = campos
+        return self._campos_solicitados
+
+    def incluye_campo(self, nombre):
+        campos = self.campos_solicitados()
+        return campos is None or nombre in campos
+
+    def _tiene_campo(self, nombre):
+        return any(campo.name == nombre for campo in self.queryset.model._meta.concrete_fields)
+
+    def _columnas_de(self, campos):
+        """
+        Columnas concretas del modelo que respaldan los campos del serializador (sin M2M).
+        """
+        modelo = self.queryset.model
+        concretos = {campo.name for campo in modelo._meta.concrete_fields}
+        serializador = self.get_serializer_class()()
+        columnas = {modelo._meta.pk.name}
+        for campo in campos:
+            fuente = serializador.fields[campo].source.split('.')[0]
+            if fuente in concretos:
+                columnas.add(fuente)
+        return columnas
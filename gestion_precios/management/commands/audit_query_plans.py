@@ -0,0 +1,107 @@
+# EN: gestion_precios/management/commands/audit_query_plans.py
+
+import re
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from gestion_precios.cache_reglas import consulta_reglas, consulta_combinaciones
+from gestion_precios.models import Empresa, Sucursal, ListaPrecio, Articulo, PrecioArticulo
+from gestion_precios.serializers import ListaPrecioSerializer, ReglaPrecioSerializer
+from gestion_precios.services import PrecioService
+
+# "SCAN tabla" indica que SQLite recorre la tabla (o un índice) completo.
+# "SEARCH tabla USING INDEX ..." es una búsqueda acotada y es lo esperado.
+PATRON_SCAN = re.compile(r'\bSCAN (?!CONSTANT ROW)(\S+)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta EXPLAIN QUERY PLAN sobre las consultas que generan PrecioService y los '
+        'validadores de los serializadores, y falla si alguna recorre una tabla completa.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('audit_query_plans solo interpreta planes de SQLite (EXPLAIN QUERY PLAN).')
+
+        consultas = self.consultas_auditadas()
+        fallidas = []
+
+        for nombre, queryset in consultas:
+            plan = queryset.explain()
+            recorridos = PATRON_SCAN.findall(plan)
+            if recorridos:
+                fallidas.append(nombre)
+                self.stdout.write(self.style.ERROR(f'[SCAN] {nombre}: {", ".join(recorridos)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'[OK]   {nombre}'))
+            if options['verbosity'] > 1:
+                for linea in plan.splitlines():
+                    self.stdout.write(f'         {linea}')
+
+        if fallidas:
+            raise CommandError(
+                f'{len(fallidas)} de {len(consultas)} consultas recorren una tabla completa: '
+                + ', '.join(fallidas)
+            )
+        self.stdout.write(self.style.SUCCESS(f'Las {len(consultas)} consultas usan índices.'))
+
+    def consultas_auditadas(self):
+        """
+        Construye las mismas consultas que ejecuta el código en producción, con IDs
+        reales si existen datos (el plan no depende de los valores concretos).
+        """
+        empresa_id = Empresa.objects.values_list('id', flat=True).first() or 1
+        sucursal_id = Sucursal.objects.values_list('id', flat=True).first() or 1
+        lista_id = ListaPrecio.objects.values_list('id', flat=True).first() or 1
+        articulo_id = Articulo.objects.values_list('id', flat=True).first() or 1
+        hoy = date.today()
+
+        datos_lista = {
+            'empresa': Empresa(pk=empresa_id),
+            'sucursal': Sucursal(pk=sucursal_id),
+            'canal_venta': 'ECOMMERCE',
+            'fecha_inicio_vigencia': hoy,
+            'fecha_fin_vigencia': None,
+        }
+        datos_regla = {
+            'lista_precio': ListaPrecio(pk=lista_id),
+            'tipo_regla': 'PORCENTAJE',
+            'condicion': 'CANTIDAD_MINIMA',
+            'condicion_valor': Decimal('3'),
+            'aplica_articulo': Articulo(pk=articulo_id),
+        }
+
+        return [
+            ('PrecioService: índice de vigencias (sucursal)', PrecioService._candidatas_lista_vigente(
+                empresa_id=empresa_id, canal_venta='ECOMMERCE', sucursal_id=sucursal_id
+            )),
+            ('PrecioService: índice de vigencias (empresa)', PrecioService._candidatas_lista_vigente(
+                empresa_id=empresa_id, canal_venta='ECOMMERCE', sucursal_id=None
+            )),
+            ('PrecioService: precio base', PrecioArticulo.objects.select_related('articulo').filter(
+                lista_precio_id=lista_id, articulo_id=articulo_id
+            )),
+            ('PrecioService: precios del carrito', PrecioArticulo.objects.select_related('articulo').filter(
+                lista_precio_id=lista_id, articulo_id__in=[articulo_id, articulo_id + 1]
+            )),
+            ('PrecioService: reglas de la lista', consulta_reglas(lista_id)),
+            ('PrecioService: combinaciones de la lista', consulta_combinaciones(lista_id)),
+            ('ListaPrecioSerializer: solapamiento (con fin)', ListaPrecioSerializer().consulta_solapamiento(
+                dict(datos_lista, fecha_fin_vigencia=hoy)
+            )),
+            ('ListaPrecioSerializer: solapamiento (sin fin)', ListaPrecioSerializer().consulta_solapamiento(
+                dict(datos_lista, sucursal=None)
+            )),
+            ('ReglaPrecioSerializer: duplicados', ReglaPrecioSerializer().consulta_duplicados(datos_regla)),
+            ('Listado: precios de una lista (cursor)', PrecioArticulo.objects.filter(
+                lista_precio_id=lista_id, id__gt=0
+            ).order_by('id')[:100]),
+            ('Listado: precios actualizados desde', PrecioArticulo.objects.filter(
+                fecha_actualizacion__gte=timezone.now()
+            ).order_by('fecha_actualizacion', 'id')[:100]),
+        ]
@@ -0,0 +1,254 @@
+# EN: gestion_precios/management/commands/bench_async.py
+
+import asyncio
+import json
+import platform
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from urllib.parse import urlencode
+
+import django
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+
+from gestion_precios.models import Empresa, Sucursal, PrecioArticulo
+from gestion_precios.services import PrecioService
+from .generate_load_data import CANALES
+
+# (nombre, ruta síncrona, ruta asíncrona)
+ENDPOINTS = [
+    ('lista-vigente', '/api/lista-vigente/', '/api/async/lista-vigente/'),
+    ('calcular-precio', '/api/calcular-precio/', '/api/async/calcular-precio/'),
+]
+HOST = 'localhost'
+
+
+def resumir(nombre, modo, concurrencia, latencias, duracion, errores):
+    latencias.sort()
+
+    def percentil(p):
+        return latencias[min(len(latencias) - 1, int(round(p / 100 * (len(latencias) - 1))))] * 1000
+
+    return {
+        'endpoint': nombre,
+        'modo': modo,
+        'concurrencia': concurrencia,
+        'peticiones': len(latencias),
+        'errores': errores,
+        'p50_ms': round(percentil(50), 3),
+        'p99_ms': round(percentil(99), 3),
+        'peticiones_por_segundo': round(len(latencias) / duracion, 1) if duracion else None,
+    }
+
+
+class ClienteWSGI:
+    """
+    Llama a la aplicación WSGI directamente desde un pool de hilos (como un servidor con
+    hilos, p. ej. gunicorn --threads), sin red de por medio.
+    """
+    def __init__(self):
+        self.aplicacion = get_wsgi_application()
+
+    def get(self, ruta, query):
+        estado = []
+        entorno = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': ruta,
+            'QUERY_STRING': query,
+            'SERVER_NAME': HOST,
+            'SERVER_PORT': '80',
+            'HTTP_HOST': HOST,
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(b''),
+            'wsgi.errors': BytesIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        respuesta = self.aplicacion(entorno, lambda status, headers, exc_info=None: estado.append(status))
+        try:
+            for _ in respuesta:
+                pass
+        finally:
+            respuesta.close()
+        return int(estado[0].split(' ', 1)[0])
+
+
+class ClienteASGI:
+    """
+    Llama a la aplicación ASGI directamente con tareas de asyncio (como uvicorn), sin red.
+    """
+    def __init__(self):
+        self.aplicacion = get_asgi_application()
+
+    async def get(self, ruta, query):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': ruta,
+            'raw_path': ruta.encode(),
+            'query_string': query.encode(),
+            'headers': [(b'host', HOST.encode())],
+            'server': (HOST, 80),
+            'client': ('127.0.0.1', 0),
+        }
+        cuerpo_enviado = False
+        desconexion = asyncio.Event()
+        estado = []
+
+        async def receive():
+            nonlocal cuerpo_enviado
+            if not cuerpo_enviado:
+                cuerpo_enviado = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Django escucha la desconexión mientras atiende; el cliente nunca se va
+            await desconexion.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                estado.append(mensaje['status'])
+
+        await self.aplicacion(scope, receive, send)
+        return estado[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el throughput de los endpoints de cálculo síncronos bajo WSGI (pool de hilos) '
+        'con sus versiones asíncronas bajo ASGI (tareas de asyncio), a varias concurrencias. '
+        'Usa los datos existentes (ver generate_load_data). Resultado en JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencias', default='1,16,64,256', help='Niveles de concurrencia separados por coma.')
+        parser.add_argument('--peticiones', type=int, default=2000, help='Peticiones por endpoint, modo y concurrencia.')
+        parser.add_argument(
+            '--asgi-sincrono', action='store_true',
+            help='Mide también las vistas síncronas servidas bajo ASGI (cada una pasa por un hilo).'
+        )
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--salida', help='Archivo donde escribir el JSON (por defecto, stdout).')
+
+    def handle(self, *args, **options):
+        try:
+            concurrencias = [int(valor) for valor in options['concurrencias'].split(',') if valor.strip()]
+        except ValueError:
+            raise CommandError('--concurrencias debe ser una lista de enteros separados por coma.')
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            raise CommandError('La base de datos en memoria no se comparte entre hilos; use una base en disco.')
+
+        consultas = self.construir_consultas(options['peticiones'], options['semilla'])
+        # Las conexiones del hilo principal no se usan durante la medición
+        connections.close_all()
+
+        cliente_wsgi, cliente_asgi = ClienteWSGI(), ClienteASGI()
+        resultados = []
+        for nombre, ruta_sincrona, ruta_asincrona in ENDPOINTS:
+            for concurrencia in concurrencias:
+                self.stderr.write(f'{nombre}: concurrencia {concurrencia}...')
+                resultados.append(self.medir_wsgi(cliente_wsgi, nombre, ruta_sincrona, consultas[nombre], concurrencia))
+                resultados.append(asyncio.run(
+                    self.medir_asgi(cliente_asgi, nombre, 'asgi_async', ruta_asincrona, consultas[nombre], concurrencia)
+                ))
+                if options['asgi_sincrono']:
+                    resultados.append(asyncio.run(
+                        self.medir_asgi(cliente_asgi, nombre, 'asgi_sync', ruta_sincrona, consultas[nombre], concurrencia)
+                    ))
+
+        informe = {
+            'fecha': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base_de_datos': connection.vendor,
+            'parametros': {clave: options[clave] for clave in ('concurrencias', 'peticiones', 'semilla')},
+            'resultados': resultados,
+        }
+        salida = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(salida)
+            self.stderr.write(f"Resultados escritos en {options['salida']}")
+        else:
+            self.stdout.write(salida)
+
+    def construir_consultas(self, cantidad, semilla):
+        """
+        Query strings de contextos de venta que resuelven una lista con precios.
+        """
+        azar = random.Random(semilla)
+        contextos = []
+        for empresa_id in Empresa.objects.values_list('id', flat=True):
+            sucursales = [None] + list(Sucursal.objects.filter(empresa_id=empresa_id).values_list('id', flat=True))
+            for sucursal_id in sucursales:
+                for canal in CANALES:
+                    lista = PrecioService.obtener_lista_vigente(empresa_id, canal, sucursal_id)
+                    if not lista:
+                        continue
+                    articulos = list(
+                        PrecioArticulo.objects.filter(lista_precio=lista).values_list('articulo_id', flat=True)[:1000]
+                    )
+                    if articulos:
+                        contextos.append((empresa_id, sucursal_id, canal, articulos))
+        if not contextos:
+            raise CommandError('Ningún contexto de venta resuelve una lista con precios. Ejecute generate_load_data.')
+
+        consultas = {'lista-vigente': [], 'calcular-precio': []}
+        for _ in range(cantidad):
+            empresa_id, sucursal_id, canal, articulos = azar.choice(contextos)
+            base = {'empresa_id': empresa_id, 'canal_venta': canal}
+            if sucursal_id is not None:
+                base['sucursal_id'] = sucursal_id
+            consultas['lista-vigente'].append(urlencode(base))
+            consultas['calcular-precio'].append(urlencode({
+                **base,
+                'articulo_id': azar.choice(articulos),
+                'cantidad': azar.randint(1, 12),
+                'monto_pedido': azar.randint(0, 10000),
+            }))
+        return consultas
+
+    def medir_wsgi(self, cliente, nombre, ruta, consultas, concurrencia):
+        def peticion(query):
+            inicio = time.perf_counter()
+            estado = cliente.get(ruta, query)
+            return time.perf_counter() - inicio, estado
+
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            # Calentamiento: cachés del motor y conexiones de cada hilo
+            list(pool.map(peticion, consultas[:concurrencia]))
+            inicio = time.perf_counter()
+            respuestas = list(pool.map(peticion, consultas))
+            duracion = time.perf_counter() - inicio
+
+        latencias = [segundos for segundos, _ in respuestas]
+        errores = sum(1 for _, estado in respuestas if estado != 200)
+        return resumir(nombre, 'wsgi', concurrencia, latencias, duracion, errores)
+
+    async def medir_asgi(self, cliente, nombre, modo, ruta, consultas, concurrencia):
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def peticion(query):
+            async with semaforo:
+                inicio = time.perf_counter()
+                estado = await cliente.get(ruta, query)
+                return time.perf_counter() - inicio, estado
+
+        await asyncio.gather(*(peticion(query) for query in consultas[:concurrencia]))
+        inicio = time.perf_counter()
+        respuestas = await asyncio.gather(*(peticion(query) for query in consultas))
+        duracion = time.perf_counter() - inicio
+
+        latencias = [segundos for segundos, _ in respuestas]
+        errores = sum(1 for _, estado in respuestas if estado != 200)
+        return resumir(nombre, modo, concurrencia, latencias, duracion, errores)
@@ -0,0 +1,277 @@
+# EN: gestion_precios/management/commands/bench_pricing.py
+
+import json
+import platform
+import random
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from gestion_precios import cache_listas
+from gestion_precios.models import Empresa, Sucursal, ListaPrecio, Articulo, PrecioArticulo
+from gestion_precios.serializers import ListaPrecioSerializer, ReglaPrecioSerializer
+from gestion_precios.services import PrecioService
+from gestion_precios.signals import invalidar_caches_del_motor
+from .generate_load_data import generar_datos_carga, CANALES
+
+RECURSOS_CRUD = [
+    'empresas', 'sucursales', 'articulos', 'lineas-articulo', 'grupos-articulo',
+    'listas-precio', 'precios-articulo', 'reglas-precio', 'combinaciones',
+]
+
+
+class _Rollback(Exception):
+    """Se lanza para deshacer los datos generados para un tamaño."""
+
+
+class ContadorConsultas:
+    """
+    `execute_wrapper` que cuenta consultas SQL sin el costo de CaptureQueriesContext.
+    """
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+def medir(nombre, operacion, iteraciones, calentamiento=1):
+    """
+    Ejecuta `operacion(i)` `iteraciones` veces y devuelve latencias p50/p99/media (ms),
+    throughput (ops/s) y consultas SQL por operación.
+    """
+    for i in range(calentamiento):
+        operacion(i)
+
+    contador = ContadorConsultas()
+    latencias = []
+    with connection.execute_wrapper(contador):
+        inicio_total = time.perf_counter()
+        for i in range(iteraciones):
+            inicio = time.perf_counter()
+            operacion(i)
+            latencias.append(time.perf_counter() - inicio)
+        duracion = time.perf_counter() - inicio_total
+
+    latencias.sort()
+
+    def percentil(p):
+        return latencias[min(len(latencias) - 1, int(round(p / 100 * (len(latencias) - 1))))] * 1000
+
+    return {
+        'nombre': nombre,
+        'iteraciones': iteraciones,
+        'p50_ms': round(percentil(50), 4),
+        'p99_ms': round(percentil(99), 4),
+        'media_ms': round(sum(latencias) / len(latencias) * 1000, 4),
+        'ops_por_segundo': round(iteraciones / duracion, 2) if duracion else None,
+        'consultas_por_op': round(contador.total / iteraciones, 3),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia (p50/p99), throughput y consultas SQL del motor de precios, los '
+        'endpoints CRUD y los validadores, para varios tamaños de catálogo. Resultado en JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanos', default='1000,10000',
+            help='Cantidades de artículos separadas por coma. Cada tamaño se genera y se deshace al terminar.'
+        )
+        parser.add_argument('--actual', action='store_true', help='Mide los datos existentes sin generar nada.')
+        parser.add_argument('--empresas', type=int, default=1)
+        parser.add_argument('--sucursales', type=int, default=2)
+        parser.add_argument('--listas', type=int, default=4)
+        parser.add_argument('--reglas-por-lista', type=int, default=50)
+        parser.add_argument('--combinaciones', type=int, default=10)
+        parser.add_argument('--iteraciones', type=int, default=500)
+        parser.add_argument('--iteraciones-crud', type=int, default=3)
+        parser.add_argument('--lineas-carrito', type=int, default=40)
+        parser.add_argument('--omitir-crud', action='store_true', help='No medir los endpoints de listado.')
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--salida', help='Archivo donde escribir el JSON (por defecto, stdout).')
+
+    def handle(self, *args, **options):
+        resultados = []
+        if options['actual']:
+            resultados.append(self.medir_tamano(self.contexto_actual(), options))
+        else:
+            try:
+                tamanos = [int(valor) for valor in options['tamanos'].split(',') if valor.strip()]
+            except ValueError:
+                raise CommandError('--tamanos debe ser una lista de enteros separados por coma.')
+            for tamano in tamanos:
+                self.stderr.write(f'Generando {tamano} artículos...')
+                try:
+                    with transaction.atomic():
+                        resumen = generar_datos_carga(
+                            empresas=options['empresas'],
+                            sucursales=options['sucursales'],
+                            articulos=tamano,
+                            listas=options['listas'],
+                            reglas_por_lista=options['reglas_por_lista'],
+                            combinaciones=options['combinaciones'],
+                            semilla=options['semilla'],
+                            prefijo=f'BENCH{tamano}',
+                        )
+                        resultados.append(self.medir_tamano(resumen, options))
+                        raise _Rollback()
+                except _Rollback:
+                    pass
+                finally:
+                    invalidar_caches_del_motor()
+
+        informe = {
+            'fecha': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'base_de_datos': connection.vendor,
+            'parametros': {
+                clave: options[clave] for clave in (
+                    'empresas', 'sucursales', 'listas', 'reglas_por_lista', 'combinaciones',
+                    'iteraciones', 'iteraciones_crud', 'lineas_carrito', 'semilla',
+                )
+            },
+            'resultados': resultados,
+        }
+        salida = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(salida)
+            self.stderr.write(f"Resultados escritos en {options['salida']}")
+        else:
+            self.stdout.write(salida)
+
+    def contexto_actual(self):
+        return {
+            'empresas': list(Empresa.objects.values_list('id', flat=True)),
+            'sucursales': list(Sucursal.objects.values_list('empresa_id', 'id')),
+            'listas': list(ListaPrecio.objects.values_list('id', flat=True)),
+            'articulos': Articulo.objects.count(),
+            'articulos_ids': list(Articulo.objects.values_list('id', flat=True)),
+            'precios': PrecioArticulo.objects.count(),
+        }
+
+    def medir_tamano(self, contexto, options):
+        azar = random.Random(options['semilla'])
+        iteraciones = options['iteraciones']
+        if not contexto['empresas'] or not contexto['articulos_ids']:
+            raise CommandError('No hay datos que medir.')
+
+        # Contextos de venta (empresa, sucursal, canal) que sí resuelven una lista
+        contextos = []
+        for empresa_id in contexto['empresas']:
+            sucursales = [None] + [s_id for e_id, s_id in contexto['sucursales'] if e_id == empresa_id]
+            for sucursal_id in sucursales:
+                for canal in CANALES:
+                    lista = PrecioService.obtener_lista_vigente(empresa_id, canal, sucursal_id)
+                    if lista:
+                        contextos.append((empresa_id, sucursal_id, canal, lista.id))
+        if not contextos:
+            raise CommandError('Ningún contexto de venta resuelve una lista vigente.')
+
+        precios_por_lista = {}
+        for _, _, _, lista_id in contextos:
+            if lista_id not in precios_por_lista:
+                precios_por_lista[lista_id] = list(
+                    PrecioArticulo.objects.filter(lista_precio_id=lista_id).values_list('articulo_id', flat=True)[:5000]
+                )
+        contextos = [c for c in contextos if precios_por_lista[c[3]]]
+
+        peticiones = []
+        for _ in range(iteraciones):
+            empresa_id, sucursal_id, canal, lista_id = azar.choice(contextos)
+            articulos = precios_por_lista[lista_id]
+            peticiones.append({
+                'empresa_id': empresa_id,
+                'sucursal_id': sucursal_id,
+                'canal_venta': canal,
+                'articulo_id': azar.choice(articulos),
+                'cantidad': azar.randint(1, 12),
+                'monto_pedido': Decimal(azar.randint(0, 10000)),
+                'carrito': azar.sample(articulos, min(len(articulos), options['lineas_carrito'])),
+            })
+
+        def peticion(i):
+            return peticiones[i % len(peticiones)]
+
+        def calcular(i, motor=None):
+            return PrecioService.calcular_precio_final(
+                empresa_id=peticion(i)['empresa_id'], canal_venta=peticion(i)['canal_venta'],
+                sucursal_id=peticion(i)['sucursal_id'], articulo_id=peticion(i)['articulo_id'],
+                cantidad=peticion(i)['cantidad'], monto_pedido=peticion(i)['monto_pedido'],
+                cart_items_ids=peticion(i)['carrito'][:5], motor=motor
+            )
+
+        # Los motores se comparan sin la memoización de resultados (que saltaría el bucle de reglas)
+        with override_settings(PRECIOS_CACHE_RESULTADOS=None):
+            sin_memo = [
+                medir('calcular_precio_final_sin_memo', calcular, iteraciones),
+                medir('calcular_precio_final_centimos', lambda i: calcular(i, motor='centimos'), iteraciones),
+            ]
+
+        mediciones = [
+            medir('obtener_lista_vigente', lambda i: PrecioService.obtener_lista_vigente(
+                peticion(i)['empresa_id'], peticion(i)['canal_venta'], peticion(i)['sucursal_id']
+            ), iteraciones),
+            medir('obtener_lista_vigente_sin_cache', lambda i: (
+                cache_listas.invalidar_todo(),
+                PrecioService.obtener_lista_vigente(
+                    peticion(i)['empresa_id'], peticion(i)['canal_venta'], peticion(i)['sucursal_id']
+                ),
+            ), iteraciones),
+            # Primera pasada: casi todo fallos que escriben en el memo; segunda: aciertos
+            medir('calcular_precio_final', calcular, iteraciones),
+            medir('calcular_precio_final_memo_caliente', calcular, iteraciones),
+            *sin_memo,
+            medir('calcular_carrito', lambda i: PrecioService.calcular_carrito(
+                empresa_id=peticion(i)['empresa_id'], canal_venta=peticion(i)['canal_venta'],
+                sucursal_id=peticion(i)['sucursal_id'],
+                items=[{'articulo_id': a, 'cantidad': 1 + a % 5} for a in peticion(i)['carrito']]
+            ), max(1, iteraciones // 10)),
+            self.medir_validadores(contexto, iteraciones),
+        ]
+
+        if not options['omitir_crud']:
+            cliente = APIClient(HTTP_HOST='localhost')
+            for recurso in RECURSOS_CRUD:
+                def listar(i, recurso=recurso):
+                    respuesta = cliente.get(f'/api/{recurso}/')
+                    if respuesta.status_code != 200:
+                        raise CommandError(f'/api/{recurso}/ respondió {respuesta.status_code}')
+                mediciones.append(medir(f'GET /api/{recurso}/', listar, options['iteraciones_crud'], calentamiento=0))
+
+        return {
+            'articulos': contexto['articulos'],
+            'precios': contexto['precios'],
+            'listas': len(contexto['listas']),
+            'generacion_segundos': contexto.get('segundos'),
+            'mediciones': mediciones,
+        }
+
+    def medir_validadores(self, contexto, iteraciones):
+        lista = ListaPrecio.objects.filter(pk__in=contexto['listas']).first()
+        articulo_id = contexto['articulos_ids'][0]
+        hoy = date.today()
+
+        def validar(i):
+            ListaPrecioSerializer(data={
+                'nombre': 'Bench', 'empresa': lista.empresa_id, 'sucursal': lista.sucursal_id,
+                'canal_venta': lista.canal_venta, 'fecha_inicio_vigencia': hoy, 'activa': True,
+            }).is_valid()
+            ReglaPrecioSerializer(data={
+                'lista_precio': lista.id, 'nombre_regla': 'Bench', 'tipo_regla': 'PORCENTAJE',
+                'valor_regla': '5.00', 'condicion': 'CANTIDAD_MINIMA', 'condicion_valor': str(1 + i % 10),
+                'aplica_articulo': articulo_id,
+            }).is_valid()
+
+        return medir('validadores_serializadores', validar, max(1, iteraciones // 5))
@@ -0,0 +1,39 @@
+# EN: gestion_precios/management/commands/compact_changes.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from gestion_precios import cambios
+from gestion_precios.models import CambioPrecio
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta el registro de cambios: de los registros anteriores al corte conserva solo '
+        'el último de cada objeto y lista (su estado completo o su baja).'
+    )
+
+    def add_arguments(self, parser):
+        corte = parser.add_mutually_exclusive_group()
+        corte.add_argument('--dias', type=int, default=7, help='Compacta los registros con más de DIAS días.')
+        corte.add_argument('--hasta', type=int, help='Compacta los registros con secuencia menor o igual a HASTA.')
+
+    def handle(self, *args, **options):
+        hasta = options['hasta']
+        if hasta is None:
+            if options['dias'] < 0:
+                raise CommandError("'--dias' no puede ser negativo.")
+            limite = timezone.now() - timedelta(days=options['dias'])
+            hasta = CambioPrecio.objects.filter(fecha__lt=limite).aggregate(hasta=Max('pk'))['hasta']
+            if hasta is None:
+                self.stdout.write('No hay registros anteriores al corte.')
+                return
+
+        borrados = cambios.compactar(hasta)
+        self.stdout.write(self.style.SUCCESS(
+            f'{borrados} registros compactados hasta la secuencia {hasta}; '
+            f'quedan {CambioPrecio.objects.count()}.'
+        ))
@@ -0,0 +1,228 @@
+# EN: gestion_precios/management/commands/generate_load_data.py
+
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestion_precios import cambios
+from gestion_precios.models import (
+    Empresa, Sucursal, LineaArticulo, GrupoArticulo, Articulo,
+    ListaPrecio, PrecioArticulo, ReglaPrecio, CombinacionProducto
+)
+from gestion_precios.signals import invalidar_caches_del_motor
+
+CANALES = ['TODOS', 'ECOMMERCE', 'TIENDA']
+
+
+def generar_datos_carga(
+    empresas=1,
+    sucursales=2,
+    articulos=1000,
+    listas=2,
+    reglas_por_lista=10,
+    combinaciones=2,
+    lineas=5,
+    grupos=20,
+    lote=5000,
+    semilla=0,
+    prefijo='CARGA',
+    log=None,
+):
+    """
+    Genera un catálogo sintético con `bulk_create` por lotes.
+
+    - `sucursales` y `listas` son por empresa; `combinaciones` y `reglas_por_lista` por lista.
+    - Cada lista tiene precio para todos los artículos (listas x articulos filas de PrecioArticulo),
+      que se insertan por lotes de `lote` para mantener la memoria acotada.
+    - Las listas de una misma cadena (sucursal, canal) tienen vigencias consecutivas y la
+      última sigue vigente hoy.
+
+    Devuelve un resumen con las cantidades creadas, los IDs útiles para pruebas y el tiempo.
+    """
+    azar = random.Random(semilla)
+    inicio = time.perf_counter()
+    hoy = date.today()
+    log = log or (lambda mensaje: None)
+
+    # --- 1. Organización y catálogo ---
+    empresas_objs = Empresa.objects.bulk_create(
+        [Empresa(nombre=f'{prefijo} Empresa {i}') for i in range(empresas)], batch_size=lote
+    )
+    sucursales_objs = Sucursal.objects.bulk_create([
+        Sucursal(empresa=empresa, nombre=f'{prefijo} Sucursal {i}')
+        for empresa in empresas_objs for i in range(sucursales)
+    ], batch_size=lote)
+    lineas_objs = LineaArticulo.objects.bulk_create(
+        [LineaArticulo(nombre=f'{prefijo} Línea {i}') for i in range(lineas)], batch_size=lote
+    )
+    grupos_objs = GrupoArticulo.objects.bulk_create(
+        [GrupoArticulo(nombre=f'{prefijo} Grupo {i}') for i in range(grupos)], batch_size=lote
+    )
+    log(f'{len(empresas_objs)} empresas, {len(sucursales_objs)} sucursales, {lineas} líneas, {grupos} grupos.')
+
+    articulos_ids = []
+    costos = {}
+    for desde in range(0, articulos, lote):
+        nuevos = Articulo.objects.bulk_create([
+            Articulo(
+                linea=azar.choice(lineas_objs),
+                grupo=azar.choice(grupos_objs),
+                sku=f'{prefijo}-{i:08d}',
+                nombre=f'Artículo {i}',
+                ultimo_costo=Decimal(azar.randint(100, 100000)) / 100,
+            )
+            for i in range(desde, min(desde + lote, articulos))
+        ])
+        for articulo in nuevos:
+            articulos_ids.append(articulo.id)
+            costos[articulo.id] = articulo.ultimo_costo
+    log(f'{len(articulos_ids)} artículos.')
+
+    # --- 2. Listas con vigencias consecutivas por cadena (sucursal, canal) ---
+    listas_objs = []
+    for empresa in empresas_objs:
+        sucursales_empresa = [None] + [s for s in sucursales_objs if s.empresa_id == empresa.id]
+        cadenas = {}
+        for i in range(listas):
+            clave = (sucursales_empresa[i % len(sucursales_empresa)], CANALES[(i // len(sucursales_empresa)) % len(CANALES)])
+            cadenas.setdefault(clave, []).append(i)
+        for (sucursal, canal), indices in cadenas.items():
+            for posicion, i in enumerate(indices):
+                # La última de la cadena está vigente hoy; las anteriores cubren meses previos
+                meses_atras = len(indices) - posicion
+                inicio_vigencia = hoy - timedelta(days=30 * meses_atras)
+                es_ultima = posicion == len(indices) - 1
+                listas_objs.append(ListaPrecio(
+                    empresa=empresa,
+                    sucursal=sucursal,
+                    nombre=f'{prefijo} Lista {empresa.id}-{i}',
+                    canal_venta=canal,
+                    fecha_inicio_vigencia=inicio_vigencia,
+                    fecha_fin_vigencia=None if es_ultima else inicio_vigencia + timedelta(days=29),
+                ))
+    listas_objs = ListaPrecio.objects.bulk_create(listas_objs, batch_size=lote)
+    log(f'{len(listas_objs)} listas de precio.')
+
+    # --- 3. Precios base por lotes ---
+    total_precios = 0
+    for lista in listas_objs:
+        for desde in range(0, len(articulos_ids), lote):
+            precios = []
+            for articulo_id in articulos_ids[desde:desde + lote]:
+                margen = Decimal(azar.randint(105, 180)) / 100
+                precios.append(PrecioArticulo(
+                    lista_precio_id=lista.id,
+                    articulo_id=articulo_id,
+                    precio_base=max((costos[articulo_id] * margen).quantize(Decimal('0.01')), Decimal('0.01')),
+                ))
+            PrecioArticulo.objects.bulk_create(precios)
+            total_precios += len(precios)
+        log(f'  {total_precios} precios base...')
+
+    # --- 4. Combinaciones y reglas por lista ---
+    Miembro = CombinacionProducto.articulos.through
+    combinaciones_por_lista = {}
+    for lista in listas_objs:
+        combos = CombinacionProducto.objects.bulk_create([
+            CombinacionProducto(lista_precio_id=lista.id, nombre=f'{prefijo} Combo {lista.id}-{i}')
+            for i in range(combinaciones)
+        ])
+        miembros = []
+        for combo in combos:
+            for articulo_id in azar.sample(articulos_ids, min(len(articulos_ids), azar.randint(2, 4))):
+                miembros.append(Miembro(combinacionproducto_id=combo.id, articulo_id=articulo_id))
+        Miembro.objects.bulk_create(miembros, batch_size=lote)
+        combinaciones_por_lista[lista.id] = [combo.id for combo in combos]
+
+    reglas = []
+    for lista in listas_objs:
+        for i in range(reglas_por_lista):
+            ambito = {}
+            tipo_ambito = azar.random()
+            if tipo_ambito < 0.4 and articulos_ids:
+                ambito['aplica_articulo_id'] = azar.choice(articulos_ids)
+            elif tipo_ambito < 0.6:
+                ambito['aplica_grupo_id'] = azar.choice(grupos_objs).id
+            elif tipo_ambito < 0.75:
+                ambito['aplica_linea_id'] = azar.choice(lineas_objs).id
+            elif tipo_ambito < 0.85 and combinaciones_por_lista[lista.id]:
+                ambito['aplica_combinacion_id'] = azar.choice(combinaciones_por_lista[lista.id])
+
+            tipo_regla = azar.choice(['PORCENTAJE', 'MONTO_FIJO'])
+            condicion = azar.choice(['CANTIDAD_MINIMA', 'MONTO_MINIMO'])
+            reglas.append(ReglaPrecio(
+                lista_precio_id=lista.id,
+                nombre_regla=f'{prefijo} Regla {lista.id}-{i}',
+                tipo_regla=tipo_regla,
+                valor_regla=Decimal(azar.randint(1, 30)) if tipo_regla == 'PORCENTAJE' else Decimal(azar.randint(1, 20)),
+                condicion=condicion,
+                condicion_valor=Decimal(azar.randint(1, 10)) if condicion == 'CANTIDAD_MINIMA' else Decimal(azar.randint(1, 50) * 100),
+                prioridad=azar.randint(1, 100),
+                permite_venta_bajo_costo=azar.random() < 0.1,
+                **ambito
+            ))
+            if len(reglas) >= lote:
+                ReglaPrecio.objects.bulk_create(reglas)
+                reglas = []
+    ReglaPrecio.objects.bulk_create(reglas)
+    log(f'{len(listas_objs) * combinaciones} combinaciones y {len(listas_objs) * reglas_por_lista} reglas.')
+
+    # bulk_create no emite señales: un registro LISTA por lista basta para que
+    # `reprice_catalog --incremental` las recalcule completas
+    cambios.registrar_varios([cambios.cambio(lista) for lista in listas_objs])
+    invalidar_caches_del_motor()
+
+    return {
+        'empresas': [empresa.id for empresa in empresas_objs],
+        'sucursales': [(sucursal.empresa_id, sucursal.id) for sucursal in sucursales_objs],
+        'listas': [lista.id for lista in listas_objs],
+        'articulos': len(articulos_ids),
+        'articulos_ids': articulos_ids,
+        'precios': total_precios,
+        'reglas': len(listas_objs) * reglas_por_lista,
+        'combinaciones': len(listas_objs) * combinaciones,
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Genera un catálogo sintético grande (bulk_create por lotes) para pruebas de carga del motor de precios.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresas', type=int, default=1)
+        parser.add_argument('--sucursales', type=int, default=2, help='Sucursales por empresa.')
+        parser.add_argument('--articulos', type=int, default=1000)
+        parser.add_argument('--listas', type=int, default=2, help='Listas de precio por empresa.')
+        parser.add_argument('--reglas-por-lista', type=int, default=10)
+        parser.add_argument('--combinaciones', type=int, default=2, help='Combinaciones por lista.')
+        parser.add_argument('--lineas', type=int, default=5)
+        parser.add_argument('--grupos', type=int, default=20)
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create.')
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--prefijo', default='CARGA', help='Prefijo de nombres y SKUs (deben ser únicos).')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Generando datos de carga...'))
+        resumen = generar_datos_carga(
+            empresas=options['empresas'],
+            sucursales=options['sucursales'],
+            articulos=options['articulos'],
+            listas=options['listas'],
+            reglas_por_lista=options['reglas_por_lista'],
+            combinaciones=options['combinaciones'],
+            lineas=options['lineas'],
+            grupos=options['grupos'],
+            lote=options['lote'],
+            semilla=options['semilla'],
+            prefijo=options['prefijo'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"¡Listo! {resumen['precios']} precios base en {len(resumen['listas'])} listas "
+            f"({resumen['segundos']} s)."
+        ))
@@ -0,0 +1,51 @@
+# EN: gestion_precios/management/commands/import_prices.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion_precios.importacion import ImportacionPreciosService, FORMATOS, leer_filas
+from gestion_precios.models import ListaPrecio
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa precios base a una lista desde un archivo CSV (sku,precio_base) o NDJSON, '
+        'insertando o actualizando por SKU. Lee el archivo por lotes sin cargarlo entero.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('lista_id', type=int)
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto se deduce de la extensión.')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por consulta de SKUs y bulk_create.')
+        parser.add_argument('--max-errores', type=int, default=1000, help='Errores detallados a mostrar.')
+
+    def handle(self, *args, **options):
+        try:
+            lista = ListaPrecio.objects.get(pk=options['lista_id'])
+        except ListaPrecio.DoesNotExist:
+            raise CommandError(f"No existe la lista de precios {options['lista_id']}.")
+
+        formato = options['formato']
+        if not formato:
+            formato = 'ndjson' if options['archivo'].lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+                resumen = ImportacionPreciosService.importar(
+                    lista, leer_filas(archivo, formato),
+                    lote=options['lote'], max_errores=options['max_errores']
+                )
+        except OSError as error:
+            raise CommandError(f'No se pudo leer el archivo: {error}')
+
+        for error in resumen['errores']:
+            self.stderr.write(f"Fila {error['fila']} ({error['sku']}): {error['error']}")
+        filas_por_segundo = resumen['filas_procesadas'] / resumen['segundos'] if resumen['segundos'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen['filas_importadas']} precios importados, {resumen['filas_con_error']} filas con error "
+            f"({resumen['segundos']} s, {filas_por_segundo:.0f} filas/s)."
+        ))
+        if options['verbosity'] > 1:
+            self.stdout.write(json.dumps(resumen, indent=2, ensure_ascii=False))
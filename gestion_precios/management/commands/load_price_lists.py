@@ -0,0 +1,51 @@
+# EN: gestion_precios/management/commands/load_price_lists.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion_precios.carga_masiva import CargaListasService
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea listas de precios en bloque desde un archivo JSON (arreglo de listas) o NDJSON, '
+        'validando los solapamientos de vigencia por conjuntos. Si alguna lista tiene errores '
+        'no se crea ninguna.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=('json', 'ndjson'), help='Por defecto se deduce de la extensión.')
+
+    def handle(self, *args, **options):
+        formato = options['formato']
+        if not formato:
+            formato = 'ndjson' if options['archivo'].lower().endswith(('.ndjson', '.jsonl')) else 'json'
+
+        try:
+            with open(options['archivo'], encoding='utf-8-sig') as archivo:
+                if formato == 'json':
+                    datos = json.load(archivo)
+                else:
+                    datos = [json.loads(linea) for linea in archivo if linea.strip()]
+        except OSError as error:
+            raise CommandError(f'No se pudo leer el archivo: {error}')
+        except ValueError as error:
+            raise CommandError(f'JSON inválido: {error}')
+        if not isinstance(datos, list):
+            raise CommandError('El archivo debe contener un arreglo de listas de precios.')
+
+        resumen = CargaListasService.crear_listas(datos)
+        if resumen['errores']:
+            for error in resumen['errores']:
+                self.stderr.write(f"Lista {error['indice']}: {json.dumps(error['errores'], ensure_ascii=False)}")
+            raise CommandError(
+                f"{len(resumen['errores'])} de {resumen['listas_recibidas']} listas con errores; no se creó ninguna."
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen['listas_creadas']} listas creadas ({resumen['segundos']} s)."
+        ))
+        if options['verbosity'] > 1:
+            self.stdout.write(json.dumps(resumen, indent=2, ensure_ascii=False))
@@ -0,0 +1,56 @@
+# EN: gestion_precios/management/commands/reprice_catalog.py
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion_precios.repreciado import RepreciadoService
+
+
+def _enteros(texto):
+    return [int(valor) for valor in texto.split(',') if valor.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula el precio final de cada artículo en cada lista activa para cantidades estándar y lo '
+        'guarda en PrecioFinalMaterializado, repartiendo los lotes entre procesos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cantidades', type=_enteros,
+            help='Cantidades separadas por comas (por defecto, settings.PRECIOS_CANTIDADES_MATERIALIZADAS).'
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Recalcula solo lo modificado desde la última corrida terminada sobre todas las listas con las mismas cantidades.'
+        )
+        parser.add_argument('--procesos', type=int, help='Procesos de evaluación (por defecto, uno por CPU).')
+        parser.add_argument('--lote', type=int, default=2000, help='Artículos por tarea.')
+        parser.add_argument('--listas', type=_enteros, help='IDs de listas separados por comas.')
+
+    def handle(self, *args, **options):
+        cantidades = options['cantidades'] or settings.PRECIOS_CANTIDADES_MATERIALIZADAS
+        if not cantidades or min(cantidades) < 1:
+            raise CommandError("'--cantidades' debe tener enteros positivos.")
+        if options['lote'] < 1 or (options['procesos'] is not None and options['procesos'] < 1):
+            raise CommandError("'--lote' y '--procesos' deben ser enteros positivos.")
+
+        resumen = RepreciadoService.ejecutar(
+            cantidades,
+            incremental=options['incremental'],
+            procesos=options['procesos'],
+            lote=options['lote'],
+            listas_ids=options['listas'],
+        )
+
+        precios_por_segundo = resumen['precios_calculados'] / resumen['segundos'] if resumen['segundos'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Corrida {resumen['corrida']} ({resumen['modo']}): {resumen['precios_calculados']} precios en "
+            f"{resumen['listas']} listas, {resumen['filas_borradas']} filas borradas "
+            f"({resumen['segundos']} s, {precios_por_segundo:.0f} precios/s)."
+        ))
+        if options['verbosity'] > 1:
+            self.stdout.write(json.dumps(resumen, indent=2, ensure_ascii=False))
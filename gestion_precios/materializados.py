@@ -0,0 +1,106 @@
+"""
+Lectura de `PrecioFinalMaterializado` (escrito por `reprice_catalog`) desde calcular-precio.
+
+Al empezar, antes de tomar su secuencia, la corrida lee las generaciones de cada
+lista que cubre y la global (`generaciones.py`); al terminar las deja como marca de
+las listas que recalculó (las demás conservan la suya). Mientras la marca
+coincida con las generaciones actuales, ninguna escritura tocó los precios, reglas o
+combinaciones de la lista ni el catálogo desde antes de leer los datos, y sus filas
+valen. Cualquier escritura cambia un contador y la lista deja de servirse desde la
+tabla hasta la próxima corrida. Sin caché configurado no hay generaciones y las filas
+nunca se usan.
+"""
+from django.core.cache import caches
+
+from . import generaciones
+from .models import PrecioFinalMaterializado
+
+CAMPOS = ('precio_base', 'precio_final', 'total', 'reglas_aplicadas', 'autorizado_bajo_costo')
+
+
+def clave_marca(lista_id: int) -> str:
+    return f'precios:materializado:lista:{lista_id}'
+
+
+def generaciones_al_empezar(listas_ids) -> dict:
+    """
+    {lista_id: (generacion_lista, generacion_global)} para las listas de una corrida.
+    """
+    if generaciones.alias_cache() is None or not listas_ids:
+        return {}
+    generacion_global, *por_lista = generaciones.leer(
+        generaciones.CLAVE_GLOBAL, *(generaciones.clave_lista(lista_id) for lista_id in listas_ids)
+    )
+    return {lista_id: (generacion, generacion_global) for lista_id, generacion in zip(listas_ids, por_lista)}
+
+
+def marcar_vigentes(marcas: dict):
+    """
+    Guarda las marcas de `generaciones_al_empezar` al terminar la corrida.
+    """
+    if marcas:
+        caches[generaciones.alias_cache()].set_many(
+            {clave_marca(lista_id): marca for lista_id, marca in marcas.items()}, timeout=None
+        )
+
+
+def _claves(lista_id):
+    return generaciones.clave_lista(lista_id), generaciones.CLAVE_GLOBAL, clave_marca(lista_id)
+
+
+def _coincide(valores, claves):
+    marca = valores.get(claves[2])
+    return marca is not None and tuple(marca) == (valores.get(claves[0]), valores.get(claves[1]))
+
+
+def vigente(lista_id: int) -> bool:
+    """
+    True si las filas de la lista son las de sus datos actuales (una lectura del caché).
+    """
+    if generaciones.alias_cache() is None:
+        return False
+    claves = _claves(lista_id)
+    return _coincide(caches[generaciones.alias_cache()].get_many(claves), claves)
+
+
+async def avigente(lista_id: int) -> bool:
+    if generaciones.alias_cache() is None:
+        return False
+    claves = _claves(lista_id)
+    return _coincide(await caches[generaciones.alias_cache()].aget_many(claves), claves)
+
+
+def _resultado(lista, fila, cantidad):
+    if fila is None:
+        return None
+    precio_base, precio_final, total, reglas_aplicadas, autorizado_bajo_costo = fila
+    return {
+        "lista_precio_aplicada": lista.nombre,
+        "precio_base": precio_base,
+        "precio_final": precio_final,
+        "cantidad": cantidad,
+        "total": total,
+        "reglas_aplicadas": reglas_aplicadas,
+        "autorizado_bajo_costo": autorizado_bajo_costo,
+    }
+
+
+def _consulta(lista, articulo_id, cantidad):
+    # Búsqueda exacta por el índice único (lista_precio, articulo, cantidad)
+    return PrecioFinalMaterializado.objects.filter(
+        lista_precio=lista, articulo_id=articulo_id, cantidad=cantidad
+    ).values_list(*CAMPOS)
+
+
+def obtener(lista, articulo_id: int, cantidad: int):
+    """
+    Resultado de calcular-precio guardado para la consulta, o None si no hay fila.
+    No comprueba la vigencia (ver `vigente`).
+    """
+    filas = list(_consulta(lista, articulo_id, cantidad))
+    return _resultado(lista, filas[0] if filas else None, cantidad)
+
+
+async def aobtener(lista, articulo_id: int, cantidad: int):
+    filas = [fila async for fila in _consulta(lista, articulo_id, cantidad)]
+    return _resultado(lista, filas[0] if filas else None, cantidad)
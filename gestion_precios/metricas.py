@@ -0,0 +1,285 @@
+"""
+Métricas en memoria del proceso: histogramas de latencia por endpoint, consultas SQL
+por petición y tramos de tiempo dentro de `PrecioService`, exportables en formato
+de texto de Prometheus (`/api/metrics/`).
+
+Diseño para dejarlo activo en producción:
+- Cada observación es un `bisect` sobre límites fijos y unas sumas, bajo un `Lock`.
+- Los tramos de una petición se acumulan en un diccionario propio de la petición
+  (`ContextVar`, válido en hilos y en asyncio) y se vuelcan una sola vez al final.
+  Fuera de una petición medida, los tramos no hacen nada.
+- Las consultas SQL se cuentan con un único `execute_wrapper` instalado en cada conexión
+  al abrirse (`connection_created`). El contador de la petición se busca en un `ContextVar`,
+  que `sync_to_async` propaga al hilo donde el ORM asíncrono ejecuta las consultas.
+- Las etiquetas son de cardinalidad acotada: la ruta de URL (patrón, no la URL
+  concreta), el método y el código de estado.
+
+Los valores son por proceso: con varios workers, Prometheus debe consultar cada uno
+(o sumarlos en la consulta).
+"""
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from . import cache_listas, cache_precios, cache_reglas
+
+LIMITES_SEGUNDOS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 250, 1000)
+
+_AYUDA = {
+    'precios_http_peticion_segundos': ('histogram', 'Duración de la petición en la vista (sin el envío de respuestas en streaming).'),
+    'precios_http_peticiones_total': ('counter', 'Peticiones atendidas por endpoint, método y estado.'),
+    'precios_sql_consultas_por_peticion': ('histogram', 'Consultas SQL ejecutadas por petición.'),
+    'precios_sql_segundos_por_peticion': ('histogram', 'Tiempo total en consultas SQL por petición.'),
+    'precios_tramo_segundos': ('histogram', 'Tiempo por tramo del cálculo de precios, acumulado por petición.'),
+    'precios_calculo_origen_total': ('counter', 'Resultados de calcular-precio por camino: memo, materializado o motor.'),
+}
+
+
+class Histograma:
+    """
+    Histograma de límites fijos. `cubetas[i]` cuenta observaciones <= limites[i]
+    (no acumulado; se acumula al exportar) y la última es +Inf.
+    """
+    __slots__ = ('limites', 'cubetas', 'suma', 'cuenta')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, valor):
+        self.cubetas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.cuenta += 1
+
+
+_lock = threading.Lock()
+_histogramas = {}  # (nombre, etiquetas) -> Histograma
+_contadores = {}   # (nombre, etiquetas) -> int
+
+# Tramos de la petición en curso: nombre -> segundos acumulados
+_tramos_peticion = ContextVar('precios_tramos_peticion', default=None)
+# Contador SQL de la petición en curso
+_sql_peticion = ContextVar('precios_sql_peticion', default=None)
+
+
+def _histograma(nombre, etiquetas, limites):
+    # Se llama con `_lock` tomado
+    clave = (nombre, etiquetas)
+    histograma = _histogramas.get(clave)
+    if histograma is None:
+        histograma = _histogramas[clave] = Histograma(limites)
+    return histograma
+
+
+# --- Tramos dentro del servicio ---
+
+class tramo:
+    """
+    Context manager que suma la duración del bloque al tramo `nombre` de la petición en curso.
+    """
+    __slots__ = ('nombre', 'tramos', 'inicio')
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.tramos = _tramos_peticion.get()
+        if self.tramos is not None:
+            self.inicio = perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        if self.tramos is not None:
+            self.tramos[self.nombre] = self.tramos.get(self.nombre, 0.0) + perf_counter() - self.inicio
+        return False
+
+
+def marca():
+    """
+    Instante actual si hay una petición medida, o None. Para bucles calientes donde un
+    `with` por fase cambiaría demasiado el código; se combina con `acumular`.
+    """
+    if _tramos_peticion.get() is None:
+        return None
+    return perf_counter()
+
+
+def acumular(nombre, desde):
+    """
+    Suma al tramo `nombre` el tiempo transcurrido desde `desde` (una `marca`) y devuelve
+    una nueva marca para encadenar fases. Si `desde` es None no hace nada.
+    """
+    if desde is None:
+        return None
+    ahora = perf_counter()
+    tramos = _tramos_peticion.get()
+    if tramos is not None:
+        tramos[nombre] = tramos.get(nombre, 0.0) + ahora - desde
+    return ahora
+
+
+def iniciar_peticion():
+    """
+    Activa la medición de tramos y consultas SQL para la petición actual.
+    Devuelve los tokens para `terminar_peticion`.
+    """
+    return _tramos_peticion.set({}), _sql_peticion.set(ContadorSQL())
+
+
+def terminar_peticion(tokens):
+    """
+    Desactiva la medición y devuelve `(tramos, contador_sql)` de la petición.
+    """
+    tramos, sql = _tramos_peticion.get(), _sql_peticion.get()
+    token_tramos, token_sql = tokens
+    _tramos_peticion.reset(token_tramos)
+    _sql_peticion.reset(token_sql)
+    return tramos or {}, sql or ContadorSQL()
+
+
+class ContadorSQL:
+    """
+    `execute_wrapper` que cuenta las consultas SQL y suma su duración.
+    """
+    __slots__ = ('consultas', 'segundos')
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.segundos += perf_counter() - inicio
+
+
+def contar_sql(execute, sql, params, many, context):
+    """
+    `execute_wrapper` permanente: delega en el contador de la petición en curso, si la hay.
+    """
+    contador = _sql_peticion.get()
+    if contador is None:
+        return execute(sql, params, many, context)
+    return contador(execute, sql, params, many, context)
+
+
+def instalar_contador_sql(sender, connection, **kwargs):
+    """
+    Receptor de `connection_created`: añade `contar_sql` a la conexión una sola vez.
+    """
+    if contar_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(contar_sql)
+
+
+def registrar_peticion(endpoint, metodo, estado, segundos, sql, tramos):
+    """
+    Vuelca las mediciones de una petición en los histogramas y contadores.
+    """
+    etiquetas = (('endpoint', endpoint), ('metodo', metodo))
+    with _lock:
+        for nombre, valor, limites in (
+            ('precios_http_peticion_segundos', segundos, LIMITES_SEGUNDOS),
+            ('precios_sql_consultas_por_peticion', sql.consultas, LIMITES_CONSULTAS),
+            ('precios_sql_segundos_por_peticion', sql.segundos, LIMITES_SEGUNDOS),
+        ):
+            _histograma(nombre, etiquetas, limites).observar(valor)
+
+        for nombre_tramo, valor in tramos.items():
+            etiquetas_tramo = (('endpoint', endpoint), ('tramo', nombre_tramo))
+            _histograma('precios_tramo_segundos', etiquetas_tramo, LIMITES_SEGUNDOS).observar(valor)
+
+        clave = ('precios_http_peticiones_total', etiquetas + (('estado', str(estado)),))
+        _contadores[clave] = _contadores.get(clave, 0) + 1
+
+
+def contar_origen(origen):
+    """
+    Cuenta un resultado de calcular-precio según el camino que lo resolvió.
+    """
+    clave = ('precios_calculo_origen_total', (('origen', origen),))
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + 1
+
+
+def reiniciar():
+    """
+    Borra todas las métricas (pruebas).
+    """
+    with _lock:
+        _histogramas.clear()
+        _contadores.clear()
+
+
+# --- Exportación en formato de texto de Prometheus ---
+
+def _etiquetas_texto(etiquetas):
+    if not etiquetas:
+        return ''
+    partes = []
+    for clave, valor in etiquetas:
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{clave}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exportar_prometheus():
+    """
+    Texto en formato de exposición de Prometheus (versión 0.0.4).
+    """
+    with _lock:
+        histogramas = [
+            (nombre, etiquetas, list(h.limites), list(h.cubetas), h.suma, h.cuenta)
+            for (nombre, etiquetas), h in _histogramas.items()
+        ]
+        contadores = list(_contadores.items())
+
+    lineas = []
+    declarados = set()
+
+    def declarar(nombre, tipo=None, ayuda=None):
+        if nombre in declarados:
+            return
+        declarados.add(nombre)
+        tipo_registrado, ayuda_registrada = _AYUDA.get(nombre, (tipo, ayuda))
+        lineas.append(f'# HELP {nombre} {ayuda_registrada}')
+        lineas.append(f'# TYPE {nombre} {tipo_registrado}')
+
+    for nombre, etiquetas, limites, cubetas, suma, cuenta in sorted(histogramas, key=lambda h: (h[0], h[1])):
+        declarar(nombre)
+        acumulado = 0
+        for limite, cantidad in zip(limites + ['+Inf'], cubetas):
+            acumulado += cantidad
+            le = limite if limite == '+Inf' else _numero(float(limite))
+            lineas.append(f'{nombre}_bucket{_etiquetas_texto(etiquetas + (("le", le),))} {acumulado}')
+        lineas.append(f'{nombre}_sum{_etiquetas_texto(etiquetas)} {_numero(float(suma))}')
+        lineas.append(f'{nombre}_count{_etiquetas_texto(etiquetas)} {cuenta}')
+
+    for (nombre, etiquetas), valor in sorted(contadores):
+        declarar(nombre)
+        lineas.append(f'{nombre}{_etiquetas_texto(etiquetas)} {valor}')
+
+    # Estado de los cachés del motor (ya llevan sus propios contadores)
+    for prefijo, estadisticas in (('precios_cache_reglas', cache_reglas.estadisticas()),
+                                  ('precios_cache_listas', cache_listas.estadisticas()),
+                                  ('precios_cache_precios', cache_precios.estadisticas())):
+        for clave, valor in sorted(estadisticas.items()):
+            if not isinstance(valor, (int, float)):
+                continue
+            nombre = f'{prefijo}_{clave}'
+            declarar(nombre, 'gauge', f'Estadística "{clave}" del caché {prefijo[len("precios_cache_"):]}.')
+            lineas.append(f'{nombre} {_numero(valor)}')
+
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,71 @@
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metricas
+
+
+class MetricasMiddleware:
+    """
+    Mide cada petición: duración, consultas SQL (cantidad y tiempo, vía el
+    `execute_wrapper` de `metricas.contar_sql`) y los tramos registrados por `PrecioService`.
+    Las mediciones se agregan por endpoint en `metricas` y se exponen en `/api/metrics/`.
+
+    Funciona en modo síncrono (WSGI) y asíncrono (ASGI), para no forzar a las
+    vistas asíncronas a pasar por un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        tokens = metricas.iniciar_peticion()
+        inicio = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            segundos = perf_counter() - inicio
+            tramos, sql = metricas.terminar_peticion(tokens)
+
+        self.registrar(request, response, segundos, sql, tramos)
+        return response
+
+    async def __acall__(self, request):
+        tokens = metricas.iniciar_peticion()
+        inicio = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            segundos = perf_counter() - inicio
+            tramos, sql = metricas.terminar_peticion(tokens)
+
+        self.registrar(request, response, segundos, sql, tramos)
+        return response
+
+    def registrar(self, request, response, segundos, sql, tramos):
+        metricas.registrar_peticion(
+            endpoint=self.endpoint(request),
+            metodo=request.method,
+            estado=response.status_code,
+            segundos=segundos,
+            sql=sql,
+            tramos=tramos,
+        )
+
+    @staticmethod
+    def endpoint(request):
+        """
+        Patrón de la ruta resuelta (p. ej. 'api/listas-precio/<pk>/export/'), no la URL concreta,
+        para que la cantidad de series sea acotada.
+        """
+        resolucion = getattr(request, 'resolver_match', None)
+        if resolucion is None:
+            return 'sin_ruta'
+        return resolucion.route or resolucion.view_name or 'sin_ruta'
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_precios', '0002_reglaprecio_aplica_articulo_reglaprecio_aplica_grupo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listaprecio',
+            index=models.Index(fields=['empresa', 'activa', 'canal_venta', 'sucursal', 'fecha_inicio_vigencia'], name='listaprecio_vigencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reglaprecio',
+            index=models.Index(fields=['lista_precio', 'prioridad'], name='regla_lista_prioridad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reglaprecio',
+            index=models.Index(fields=['lista_precio', 'tipo_regla', 'condicion', 'condicion_valor'], name='regla_lista_firma_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reglaprecio',
+            index=models.Index(fields=['lista_precio', 'aplica_articulo'], name='regla_lista_articulo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reglaprecio',
+            index=models.Index(fields=['lista_precio', 'aplica_grupo'], name='regla_lista_grupo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reglaprecio',
+            index=models.Index(fields=['lista_precio', 'aplica_linea'], name='regla_lista_linea_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:40
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_precios', '0004_fecha_actualizacion_listados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entidad', models.CharField(choices=[('PRECIO', 'Precio de Artículo'), ('REGLA', 'Regla de Precio'), ('COMBINACION', 'Combinación de Productos'), ('LISTA', 'Lista de Precios'), ('ARTICULO', 'Costo de Artículo')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('operacion', models.CharField(choices=[('ACTUALIZADO', 'Alta o Modificación'), ('ELIMINADO', 'Baja')], max_length=20)),
+                ('lista_id', models.BigIntegerField(blank=True, help_text='Lista afectada; nulo en los costos de artículos.', null=True)),
+                ('datos', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lista_id', 'id'], name='cambio_lista_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_precios', '0005_registro_cambios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorridaRepreciado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modo', models.CharField(choices=[('COMPLETO', 'Catálogo completo'), ('INCREMENTAL', 'Solo lo modificado desde la corrida anterior')], max_length=20)),
+                ('secuencia', models.BigIntegerField(default=0)),
+                ('cantidades', models.JSONField(default=list, help_text='Cantidades por las que se calculó cada precio.')),
+                ('inicio', models.DateTimeField(auto_now_add=True)),
+                ('fin', models.DateTimeField(blank=True, help_text='Nulo mientras la corrida no termina.', null=True)),
+                ('listas', models.PositiveIntegerField(default=0)),
+                ('precios_calculados', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PrecioFinalMaterializado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio_base', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_final', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('reglas_aplicadas', models.JSONField(default=list)),
+                ('autorizado_bajo_costo', models.BooleanField(default=False)),
+                ('articulo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='precios_materializados', to='gestion_precios.articulo')),
+                ('corrida', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='precios', to='gestion_precios.corridarepreciado')),
+                ('lista_precio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='precios_materializados', to='gestion_precios.listaprecio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lista_precio', 'corrida'], name='materializado_lista_corr_idx')],
+                'unique_together': {('lista_precio', 'articulo', 'cantidad')},
+            },
+        ),
+    ]
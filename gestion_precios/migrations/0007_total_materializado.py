@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+def vaciar_materializados(apps, schema_editor):
+    # Las filas existentes no tienen total: la próxima corrida de reprice_catalog
+    # (sin corrida anterior, completa) las vuelve a escribir todas.
+    apps.get_model('gestion_precios', 'PrecioFinalMaterializado').objects.all().delete()
+    apps.get_model('gestion_precios', 'CorridaRepreciado').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_precios', '0006_precios_materializados'),
+    ]
+
+    operations = [
+        migrations.RunPython(vaciar_materializados, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='preciofinalmaterializado',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_precios', '0007_total_materializado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='corridarepreciado',
+            name='completa',
+            field=models.BooleanField(default=True, help_text='Falso si la corrida se limitó a algunas listas.'),
+        ),
+    ]
@@ -1,7 +1,25 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+
+class ModeloConCambios(models.Model):
+    """
+    Base de los modelos que publican sus cambios en `CambioPrecio`: `save()` corre en
+    una transacción para que el receptor de `post_save` que escribe el registro entre
+    en el mismo COMMIT que la fila (`delete()` ya es atómico).
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
 # --- Modelos Base ---
 # Estos son los modelos fundamentales de los que dependen los demás.
 
@@ -35,14 +53,14 @@ class GrupoArticulo(models.Model):
     def __str__(self):
         return self.nombre
 
-class Articulo(models.Model):
+class Articulo(ModeloConCambios):
     linea = models.ForeignKey(LineaArticulo, on_delete=models.PROTECT)
     grupo = models.ForeignKey(GrupoArticulo, on_delete=models.PROTECT)
     sku = models.CharField(max_length=50, unique=True, help_text="Stock Keeping Unit o Código de Artículo único")
     nombre = models.CharField(max_length=200)
     ultimo_costo = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
-    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"{self.nombre} ({self.sku})"
@@ -51,7 +69,7 @@ class Articulo(models.Model):
 # --- Modelos Centrales (Gestión de Precios) ---
 # El corazón de la lógica de negocio.
 
-class ListaPrecio(models.Model):
+class ListaPrecio(ModeloConCambios):
     CANAL_VENTA_CHOICES = [
         ('TODOS', 'Todos los Canales'),
         ('ECOMMERCE', 'E-commerce'),
@@ -64,13 +82,23 @@ class ListaPrecio(models.Model):
     fecha_inicio_vigencia = models.DateField()
     fecha_fin_vigencia = models.DateField(null=True, blank=True, help_text="Si es nulo, no tiene fecha de fin.")
     activa = models.BooleanField(default=True, help_text="Desmarcar para desactivar esta lista de precios.")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Resolución de lista vigente y validación de solapamientos
+            models.Index(
+                fields=['empresa', 'activa', 'canal_venta', 'sucursal', 'fecha_inicio_vigencia'],
+                name='listaprecio_vigencia_idx'
+            ),
+        ]
 
     def __str__(self):
         if self.sucursal:
             return f"{self.nombre} ({self.sucursal.nombre})"
         return f"{self.nombre} ({self.empresa.nombre})"
     
-class CombinacionProducto(models.Model):
+class CombinacionProducto(ModeloConCambios):
     """
     Define una agrupación de productos para aplicar reglas de combinación.
     Ej: "Lleva Producto A + Producto B y obtén 10%".
@@ -78,6 +106,7 @@ class CombinacionProducto(models.Model):
     lista_precio = models.ForeignKey(ListaPrecio, on_delete=models.CASCADE, related_name='combinaciones')
     nombre = models.CharField(max_length=150)
     articulos = models.ManyToManyField(Articulo, related_name='combinaciones', help_text="Artículos que forman parte de esta combinación.")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.nombre} ({self.lista_precio.nombre})"
@@ -93,19 +122,24 @@ class CombinacionProducto(models.Model):
 
 
     
-class PrecioArticulo(models.Model):
+class PrecioArticulo(ModeloConCambios):
     lista_precio = models.ForeignKey(ListaPrecio, on_delete=models.CASCADE, related_name='precios')
     articulo = models.ForeignKey(Articulo, on_delete=models.CASCADE, related_name='precios')
     precio_base = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('lista_precio', 'articulo')
+        indexes = [
+            # Listado paginado por cursor (id) filtrado por lista
+            models.Index(fields=['lista_precio', 'id'], name='precio_lista_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.articulo.nombre} - {self.lista_precio.nombre}: S/ {self.precio_base}"
     
 
-class ReglaPrecio(models.Model):
+class ReglaPrecio(ModeloConCambios):
     TIPO_REGLA_CHOICES = [
         ('PORCENTAJE', 'Porcentaje de Descuento'),
         ('MONTO_FIJO', 'Monto Fijo de Descuento'),
@@ -147,11 +181,117 @@ class ReglaPrecio(models.Model):
     )
     prioridad = models.IntegerField(default=10, help_text="Menor número se aplica primero.")
     permite_venta_bajo_costo = models.BooleanField(default=False, help_text="Si se marca, esta regla puede hacer que el precio final sea inferior al costo del artículo.")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
 
 
     class Meta:
         ordering = ['prioridad']
+        indexes = [
+            # Carga de reglas de una lista en orden de prioridad
+            models.Index(fields=['lista_precio', 'prioridad'], name='regla_lista_prioridad_idx'),
+            # Validación de reglas duplicadas
+            models.Index(
+                fields=['lista_precio', 'tipo_regla', 'condicion', 'condicion_valor'],
+                name='regla_lista_firma_idx'
+            ),
+            # Reglas dirigidas a un artículo, grupo o línea dentro de una lista
+            models.Index(fields=['lista_precio', 'aplica_articulo'], name='regla_lista_articulo_idx'),
+            models.Index(fields=['lista_precio', 'aplica_grupo'], name='regla_lista_grupo_idx'),
+            models.Index(fields=['lista_precio', 'aplica_linea'], name='regla_lista_linea_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre_regla} ({self.lista_precio.nombre})"
 
+
+# --- Registro de cambios ---
+
+class CambioPrecio(models.Model):
+    """
+    Registro de solo inserción (outbox) de los cambios en precios, reglas, combinaciones,
+    listas y costos de artículos, para la sincronización incremental (`/api/cambios/`).
+    El `id` es la secuencia del feed; `datos` es el estado completo del objeto tras el
+    cambio (None en las bajas).
+    """
+    ENTIDAD_CHOICES = [
+        ('PRECIO', 'Precio de Artículo'),
+        ('REGLA', 'Regla de Precio'),
+        ('COMBINACION', 'Combinación de Productos'),
+        ('LISTA', 'Lista de Precios'),
+        ('ARTICULO', 'Costo de Artículo'),
+    ]
+    OPERACION_CHOICES = [
+        ('ACTUALIZADO', 'Alta o Modificación'),
+        ('ELIMINADO', 'Baja'),
+    ]
+
+    entidad = models.CharField(max_length=20, choices=ENTIDAD_CHOICES)
+    objeto_id = models.BigIntegerField()
+    operacion = models.CharField(max_length=20, choices=OPERACION_CHOICES)
+    # Sin clave foránea: el registro sobrevive a la baja de la lista
+    lista_id = models.BigIntegerField(null=True, blank=True, help_text="Lista afectada; nulo en los costos de artículos.")
+    datos = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Feed filtrado por lista a partir de una secuencia
+            models.Index(fields=['lista_id', 'id'], name='cambio_lista_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.entidad} {self.objeto_id} {self.operacion}"
+
+
+# --- Precios finales materializados ---
+
+class CorridaRepreciado(models.Model):
+    """
+    Ejecución de `reprice_catalog`. `secuencia` es la del registro de cambios al
+    empezar: la siguiente corrida incremental recalcula lo que cambió después. Solo
+    las corridas sobre todas las listas (`completa`) sirven de base a una incremental.
+    """
+    MODO_CHOICES = [
+        ('COMPLETO', 'Catálogo completo'),
+        ('INCREMENTAL', 'Solo lo modificado desde la corrida anterior'),
+    ]
+
+    modo = models.CharField(max_length=20, choices=MODO_CHOICES)
+    secuencia = models.BigIntegerField(default=0)
+    cantidades = models.JSONField(default=list, help_text="Cantidades por las que se calculó cada precio.")
+    completa = models.BooleanField(default=True, help_text="Falso si la corrida se limitó a algunas listas.")
+    inicio = models.DateTimeField(auto_now_add=True)
+    fin = models.DateTimeField(null=True, blank=True, help_text="Nulo mientras la corrida no termina.")
+    listas = models.PositiveIntegerField(default=0)
+    precios_calculados = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Corrida {self.pk} ({self.modo}, {self.inicio:%Y-%m-%d %H:%M})"
+
+
+class PrecioFinalMaterializado(models.Model):
+    """
+    Precio final de un artículo en una lista para una cantidad estándar, sin carrito
+    y con monto de pedido 0 (lo mismo que la exportación). Lo escribe `reprice_catalog`.
+    """
+    lista_precio = models.ForeignKey(ListaPrecio, on_delete=models.CASCADE, related_name='precios_materializados')
+    articulo = models.ForeignKey(Articulo, on_delete=models.CASCADE, related_name='precios_materializados')
+    cantidad = models.PositiveIntegerField()
+    precio_base = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_final = models.DecimalField(max_digits=10, decimal_places=2)
+    # Precio final sin redondear por la cantidad: no siempre es `precio_final * cantidad`
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+    reglas_aplicadas = models.JSONField(default=list)
+    autorizado_bajo_costo = models.BooleanField(default=False)
+    # Las filas que no cambian conservan la corrida que las escribió
+    corrida = models.ForeignKey(CorridaRepreciado, on_delete=models.PROTECT, related_name='precios')
+
+    class Meta:
+        unique_together = ('lista_precio', 'articulo', 'cantidad')
+        indexes = [
+            # Limpieza de filas que una corrida completa no volvió a escribir
+            models.Index(fields=['lista_precio', 'corrida'], name='materializado_lista_corr_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.articulo_id} x{self.cantidad} en lista {self.lista_precio_id}: S/ {self.precio_final}"
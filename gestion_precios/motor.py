@@ -0,0 +1,246 @@
+"""
+Representación compilada e inmutable de las reglas de una lista de precios.
+
+Este módulo no depende de Django: trabaja con valores planos (Decimal, int,
+str) para que el motor pueda evaluar reglas sin tocar la base de datos.
+"""
+from bisect import bisect_right
+from decimal import Decimal
+from heapq import merge
+from types import MappingProxyType
+
+CIEN = Decimal('100.0')
+
+
+def a_centesimos(valor) -> int:
+    """
+    Convierte un valor con hasta dos decimales a un entero de centésimos
+    (céntimos para montos, puntos básicos para porcentajes). Falla si se perdería precisión.
+    """
+    escalado = Decimal(valor).scaleb(2)
+    entero = int(escalado)
+    if entero != escalado:
+        raise ValueError(f"El valor {valor} tiene más de dos decimales.")
+    return entero
+
+
+class _Inmutable:
+    """
+    Base para objetos con `__slots__` que no se pueden modificar tras crearse.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError(f"{type(self).__name__} es inmutable.")
+
+    def __delattr__(self, nombre):
+        raise AttributeError(f"{type(self).__name__} es inmutable.")
+
+
+class ReglaCompilada(_Inmutable):
+    """
+    Regla de precio ya interpretada. Conserva los nombres de campo de
+    `ReglaPrecio` para que el motor la use igual que a una instancia del modelo.
+    """
+    __slots__ = (
+        'id', 'nombre_regla', 'tipo_regla', 'valor_regla', 'factor_porcentaje',
+        'valor_centesimos', 'condicion', 'condicion_valor', 'condicion_centesimos', 'aplica_articulo_id', 'aplica_grupo_id',
+        'aplica_linea_id', 'aplica_combinacion_id', 'prioridad', 'permite_venta_bajo_costo',
+    )
+
+    def __init__(
+        self, id, nombre_regla, tipo_regla, valor_regla, condicion, condicion_valor,
+        aplica_articulo_id=None, aplica_grupo_id=None, aplica_linea_id=None,
+        aplica_combinacion_id=None, prioridad=10, permite_venta_bajo_costo=False
+    ):
+        valor_regla = Decimal(valor_regla)
+        asignar = object.__setattr__
+        asignar(self, 'id', id)
+        asignar(self, 'nombre_regla', nombre_regla)
+        asignar(self, 'tipo_regla', tipo_regla)
+        asignar(self, 'valor_regla', valor_regla)
+        # Se precalcula el mismo cociente que usaba el bucle original
+        asignar(self, 'factor_porcentaje', valor_regla / CIEN)
+        # Para el motor en enteros: céntimos (MONTO_FIJO) o puntos básicos (PORCENTAJE)
+        asignar(self, 'valor_centesimos', a_centesimos(valor_regla))
+        asignar(self, 'condicion', condicion)
+        asignar(self, 'condicion_valor', Decimal(condicion_valor))
+        asignar(self, 'condicion_centesimos', a_centesimos(condicion_valor))
+        asignar(self, 'aplica_articulo_id', aplica_articulo_id)
+        asignar(self, 'aplica_grupo_id', aplica_grupo_id)
+        asignar(self, 'aplica_linea_id', aplica_linea_id)
+        asignar(self, 'aplica_combinacion_id', aplica_combinacion_id)
+        asignar(self, 'prioridad', prioridad)
+        asignar(self, 'permite_venta_bajo_costo', bool(permite_venta_bajo_costo))
+
+    def aplica_a(self, articulo_id, grupo_id, linea_id):
+        """
+        True si el artículo cumple todos los filtros de artículo, grupo y línea de la regla.
+        """
+        return (
+            (self.aplica_articulo_id is None or self.aplica_articulo_id == articulo_id)
+            and (self.aplica_grupo_id is None or self.aplica_grupo_id == grupo_id)
+            and (self.aplica_linea_id is None or self.aplica_linea_id == linea_id)
+        )
+
+    def __repr__(self):
+        return f"<ReglaCompilada {self.id} '{self.nombre_regla}' prioridad={self.prioridad}>"
+
+
+class ConjuntoReglas(_Inmutable):
+    """
+    Reglas de una lista ordenadas por prioridad, junto con los artículos de
+    cada combinación de la lista ya resueltos como `frozenset`.
+
+    Las reglas se indexan por su ámbito más específico (artículo, grupo, línea,
+    combinación o global) y se guarda el índice inverso artículo -> combinaciones,
+    de modo que `reglas_para` solo recorre las reglas que pueden aplicar al artículo.
+
+    Cada combinación se representa además como un bitset sobre un ordinal por
+    artículo de la lista, para comparar un carrito contra todas a la vez.
+
+    Los umbrales de cantidad y monto de la lista, ordenados, permiten resumir una
+    consulta en la `firma` que usa el caché de resultados (`cache_precios`).
+    """
+    __slots__ = (
+        'lista_id', 'reglas', 'combinaciones', 'combinaciones_por_articulo',
+        '_ordinales', '_mascaras', '_por_articulo', '_por_grupo', '_por_linea', '_por_combinacion', '_globales',
+        'umbrales_cantidad', 'umbrales_monto', '_combinaciones_con_reglas',
+    )
+
+    def __init__(self, lista_id, reglas, combinaciones):
+        asignar = object.__setattr__
+        reglas = tuple(sorted(reglas, key=lambda regla: (regla.prioridad, regla.id)))
+        asignar(self, 'lista_id', lista_id)
+        asignar(self, 'reglas', reglas)
+        asignar(self, 'combinaciones', MappingProxyType({
+            combinacion_id: frozenset(articulos)
+            for combinacion_id, articulos in combinaciones.items()
+        }))
+
+        combinaciones_por_articulo = {}
+        for combinacion_id, articulos in sorted(self.combinaciones.items()):
+            for articulo_id in articulos:
+                combinaciones_por_articulo.setdefault(articulo_id, []).append(combinacion_id)
+        asignar(self, 'combinaciones_por_articulo', MappingProxyType({
+            articulo_id: tuple(ids) for articulo_id, ids in combinaciones_por_articulo.items()
+        }))
+
+        # Ordinal de bit para cada artículo que participa en alguna combinación
+        ordinales = {articulo_id: bit for bit, articulo_id in enumerate(sorted(combinaciones_por_articulo))}
+        mascaras = []
+        for combinacion_id, articulos in sorted(self.combinaciones.items()):
+            mascara = 0
+            for articulo_id in articulos:
+                mascara |= 1 << ordinales[articulo_id]
+            mascaras.append((combinacion_id, mascara))
+        asignar(self, '_ordinales', MappingProxyType(ordinales))
+        asignar(self, '_mascaras', tuple(mascaras))
+
+        # Cada cubeta guarda posiciones dentro de `reglas`, ya ordenadas por prioridad
+        por_articulo, por_grupo, por_linea, por_combinacion, globales = {}, {}, {}, {}, []
+        for posicion, regla in enumerate(reglas):
+            if regla.aplica_articulo_id is not None:
+                por_articulo.setdefault(regla.aplica_articulo_id, []).append(posicion)
+            elif regla.aplica_grupo_id is not None:
+                por_grupo.setdefault(regla.aplica_grupo_id, []).append(posicion)
+            elif regla.aplica_linea_id is not None:
+                por_linea.setdefault(regla.aplica_linea_id, []).append(posicion)
+            elif regla.aplica_combinacion_id is not None:
+                por_combinacion.setdefault(regla.aplica_combinacion_id, []).append(posicion)
+            else:
+                globales.append(posicion)
+
+        def congelar(cubetas):
+            return MappingProxyType({clave: tuple(posiciones) for clave, posiciones in cubetas.items()})
+
+        asignar(self, '_por_articulo', congelar(por_articulo))
+        asignar(self, '_por_grupo', congelar(por_grupo))
+        asignar(self, '_por_linea', congelar(por_linea))
+        asignar(self, '_por_combinacion', congelar(por_combinacion))
+        asignar(self, '_globales', tuple(globales))
+
+        # Las condiciones solo comparan `valor >= condicion_valor`: dos consultas entre
+        # los mismos umbrales consecutivos cumplen exactamente las mismas reglas
+        asignar(self, 'umbrales_cantidad', tuple(sorted({
+            regla.condicion_valor for regla in reglas
+            if regla.aplica_combinacion_id is None and regla.condicion == 'CANTIDAD_MINIMA'
+        })))
+        asignar(self, 'umbrales_monto', tuple(sorted({
+            regla.condicion_valor for regla in reglas
+            if regla.aplica_combinacion_id is None and regla.condicion == 'MONTO_MINIMO'
+        })))
+        asignar(self, '_combinaciones_con_reglas', frozenset(
+            regla.aplica_combinacion_id for regla in reglas if regla.aplica_combinacion_id is not None
+        ))
+
+    def combinaciones_satisfechas(self, articulos_ids):
+        """
+        IDs de las combinaciones cuyos artículos están todos en `articulos_ids`.
+        El carrito se convierte a bitset una vez y se compara con todas las combinaciones;
+        el resultado se reutiliza para cada línea del mismo carrito.
+        """
+        if not self._mascaras:
+            return frozenset()
+        ordinales = self._ordinales
+        carrito = 0
+        for articulo_id in articulos_ids:
+            bit = ordinales.get(articulo_id)
+            if bit is not None:
+                carrito |= 1 << bit
+        return frozenset(
+            combinacion_id for combinacion_id, mascara in self._mascaras
+            if mascara & carrito == mascara
+        )
+
+    def firma(self, articulo_id, cantidad, monto_pedido, combinaciones_satisfechas):
+        """
+        Resume las entradas que deciden qué reglas aplican a un artículo: el tramo de
+        `cantidad` y de `monto_pedido` entre los umbrales de la lista y las combinaciones
+        del artículo, usadas por alguna regla, que el carrito completa. Dos consultas del
+        mismo artículo con la misma firma dan el mismo precio unitario.
+        """
+        combinaciones = tuple(
+            combinacion_id for combinacion_id in self.combinaciones_por_articulo.get(articulo_id, ())
+            if combinacion_id in self._combinaciones_con_reglas and combinacion_id in combinaciones_satisfechas
+        )
+        return (
+            bisect_right(self.umbrales_cantidad, cantidad),
+            bisect_right(self.umbrales_monto, monto_pedido),
+            combinaciones,
+        )
+
+    def reglas_para(self, articulo_id, grupo_id=None, linea_id=None):
+        """
+        Reglas que pueden aplicar al artículo, en orden de prioridad.
+
+        Se mezclan solo las cubetas del artículo, su grupo, su línea, sus combinaciones
+        y las globales; el costo depende de las reglas relevantes y no del tamaño de la lista.
+        Las condiciones de cantidad, monto y combinación completa las evalúa el motor.
+        """
+        vacio = ()
+        cubetas = [
+            self._por_articulo.get(articulo_id, vacio),
+            self._por_grupo.get(grupo_id, vacio),
+            self._por_linea.get(linea_id, vacio),
+            self._globales,
+        ]
+        for combinacion_id in self.combinaciones_por_articulo.get(articulo_id, vacio):
+            cubetas.append(self._por_combinacion.get(combinacion_id, vacio))
+        cubetas = [cubeta for cubeta in cubetas if cubeta]
+
+        if not cubetas:
+            return vacio
+        posiciones = cubetas[0] if len(cubetas) == 1 else merge(*cubetas)
+
+        reglas = self.reglas
+        return [
+            reglas[posicion] for posicion in posiciones
+            if reglas[posicion].aplica_a(articulo_id, grupo_id, linea_id)
+        ]
+
+    def __len__(self):
+        return len(self.reglas)
+
+    def __repr__(self):
+        return f"<ConjuntoReglas lista={self.lista_id} reglas={len(self.reglas)}>"
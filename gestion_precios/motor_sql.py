@@ -0,0 +1,199 @@
+"""
+Motor 'sql': precio final calculado por la base de datos para lecturas masivas.
+
+Con una cantidad y un monto de pedido fijos, las condiciones de cada regla no
+dependen del artículo: se resuelven en Python y solo queda, por regla, a qué
+artículos alcanza. Los artículos se reparten en clases que reciben las mismas
+reglas: cada artículo nombrado por una regla, y el resto según su grupo y su línea
+(solo importan los que nombran las reglas). Cada paso del motor es
+`p -> max(a * p - b, 0)` con `a >= 0` (un porcentaje mayor que 100 deja el precio en 0),
+y la composición de esos pasos conserva la forma `max(A * p - B, C)`; así cada clase
+se reduce a tres números calculados en Python, y el SQL es un `Case` plano con un
+`Greatest` por clase, sin anidar una expresión por regla (SQLite rechaza las consultas
+con más de unos pocos niveles de anidamiento). La consulta devuelve además si alguna
+regla aplicada permite vender bajo costo; la comparación con `Articulo.ultimo_costo`
+(`validar_costo`) se hace al leer cada fila, porque repetir el `Case` en varias
+columnas haría que la base de datos lo evaluara otras tantas veces.
+
+Solo se admiten listas cuyas reglas no son de combinación; `anotar` lanza
+`ReglasNoExpresables` con cualquier otra, y quien lo use vuelve al motor en Python.
+La base de datos calcula con su propia aritmética: en PostgreSQL es decimal exacta;
+en SQLite es de coma flotante y Django lee el resultado con 15 cifras significativas.
+Como con los otros motores, los precios salen sin redondear y los redondea a céntimos
+quien los presenta (`exportacion.py`).
+"""
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db.models import BooleanField, Case, DecimalField, ExpressionWrapper, F, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Articulo
+from .motor import ConjuntoReglas
+
+# Grupos x líneas nombrados por las reglas que se cumplen; con más, el `Case` no compensa
+MAXIMO_CLASES = 1000
+AJUSTE_COSTO_MINIMO = "Ajuste a costo mínimo (no autorizado bajo costo)"
+
+_IMPORTE = DecimalField(max_digits=30, decimal_places=10)
+CERO = Decimal('0')
+UNO = Decimal('1')
+IDENTIDAD = (UNO, CERO, CERO, False)
+
+
+class ReglasNoExpresables(ValueError):
+    pass
+
+
+def reglas_que_se_cumplen(conjunto: ConjuntoReglas, cantidad: int, monto_pedido: Decimal):
+    """
+    Reglas del conjunto, en orden de prioridad, cuya condición se cumple con `cantidad`
+    y `monto_pedido`. Lanza `ReglasNoExpresables` si hay reglas de combinación.
+    """
+    if any(regla.aplica_combinacion_id for regla in conjunto.reglas):
+        raise ReglasNoExpresables(f"La lista {conjunto.lista_id} tiene reglas de combinación.")
+    return [
+        regla for regla in conjunto.reglas
+        if (regla.condicion == 'CANTIDAD_MINIMA' and cantidad >= regla.condicion_valor)
+        or (regla.condicion == 'MONTO_MINIMO' and monto_pedido >= regla.condicion_valor)
+    ]
+
+
+def componer(reglas):
+    """
+    (A, B, C, permiso) tales que aplicar `reglas` en orden a un precio base `p > 0`,
+    como `PrecioService._aplicar_reglas`, da `max(A * p - B, C)`.
+    """
+    a_total, b_total, c_total, permiso = IDENTIDAD
+    for regla in reglas:
+        if regla.tipo_regla == 'PORCENTAJE':
+            factor = UNO - regla.factor_porcentaje
+            if factor < CERO:
+                a_total, b_total, c_total = CERO, CERO, CERO
+            else:
+                a_total, b_total, c_total = a_total * factor, b_total * factor, c_total * factor
+        elif regla.tipo_regla == 'MONTO_FIJO':
+            b_total += regla.valor_regla
+            c_total = max(c_total - regla.valor_regla, CERO)
+        permiso = permiso or regla.permite_venta_bajo_costo
+    return a_total, b_total, c_total, permiso
+
+
+def _lineal(a_total, b_total, c_total):
+    precio = F('precio_base')
+    if a_total != UNO:
+        precio = precio * Value(a_total)
+    if b_total == CERO and c_total == CERO:
+        return ExpressionWrapper(precio, output_field=_IMPORTE)
+    return Greatest(precio - Value(b_total), Value(c_total), output_field=_IMPORTE)
+
+
+def _clases(conjunto, reglas):
+    """
+    {parametros: [condiciones]} de las clases cuyos parámetros difieren de los de la
+    clase por defecto (ningún artículo, grupo ni línea nombrado), y esos parámetros.
+    Las condiciones son excluyentes entre sí, así que el orden no importa.
+    """
+    cumplidas = {regla.id for regla in reglas}
+    grupos = sorted({regla.aplica_grupo_id for regla in reglas} - {None})
+    lineas = sorted({regla.aplica_linea_id for regla in reglas} - {None})
+    if (len(grupos) + 1) * (len(lineas) + 1) > MAXIMO_CLASES:
+        raise ReglasNoExpresables(f"Las reglas de la lista {conjunto.lista_id} separan demasiadas clases.")
+
+    def parametros(articulo_id, grupo_id, linea_id):
+        return componer(
+            regla for regla in conjunto.reglas_para(articulo_id, grupo_id, linea_id) if regla.id in cumplidas
+        )
+
+    por_defecto = parametros(None, None, None)
+    clases = {}
+    nombrados = sorted({regla.aplica_articulo_id for regla in reglas} - {None})
+    if nombrados:
+        for articulo_id, grupo_id, linea_id in Articulo.objects.filter(pk__in=nombrados).values_list(
+            'pk', 'grupo_id', 'linea_id'
+        ):
+            clases.setdefault(parametros(articulo_id, grupo_id, linea_id), []).append(Q(articulo_id=articulo_id))
+
+    resto = ~Q(articulo_id__in=nombrados) if nombrados else Q()
+    for grupo_id in [*grupos, None]:
+        for linea_id in [*lineas, None]:
+            valores = parametros(None, grupo_id, linea_id)
+            if valores == por_defecto:
+                continue
+            condicion = resto
+            condicion &= Q(articulo__grupo_id=grupo_id) if grupo_id else ~Q(articulo__grupo_id__in=grupos)
+            condicion &= Q(articulo__linea_id=linea_id) if linea_id else ~Q(articulo__linea_id__in=lineas)
+            clases.setdefault(valores, []).append(condicion)
+    clases.pop(por_defecto, None)
+    return clases, por_defecto
+
+
+def anotar(precios, conjunto: ConjuntoReglas, cantidad: int = 1, monto_pedido: Decimal = Decimal('0.00')):
+    """
+    Anota un QuerySet de `PrecioArticulo` de la lista con `precio_calculado` (el precio
+    tras las reglas, como `PrecioService._aplicar_reglas` para un artículo solo en el
+    carrito) y `permiso_bajo_costo`. Si alguna regla que se cumple nombra artículos, lee
+    su grupo y su línea (una consulta).
+    """
+    # 1. Parámetros de cada clase de artículos
+    clases, por_defecto = _clases(conjunto, reglas_que_se_cumplen(conjunto, cantidad, monto_pedido))
+    condiciones = {valores: reduce(or_, lista) for valores, lista in clases.items()}
+
+    # 2. Precio tras las reglas: un `Greatest` por clase
+    precio = _lineal(*por_defecto[:3])
+    if condiciones:
+        precio = Case(
+            *(When(condicion, then=_lineal(*valores[:3])) for valores, condicion in condiciones.items()),
+            default=precio, output_field=_IMPORTE,
+        )
+
+    # 3. Permiso de venta bajo costo: alguna regla aplicada lo da (si lo da una que
+    #    aplica a todos, lo tienen todas las clases)
+    con_permiso = [condicion for valores, condicion in condiciones.items() if valores[3]]
+    if por_defecto[3]:
+        permiso = Q(pk__isnull=False)
+    else:
+        permiso = reduce(or_, con_permiso) if con_permiso else None
+
+    return precios.annotate(
+        precio_calculado=precio,
+        permiso_bajo_costo=Value(False) if permiso is None else Case(
+            When(permiso, then=Value(True)), default=Value(False), output_field=BooleanField()
+        ),
+    )
+
+
+def validar_costo(precio_calculado, ultimo_costo, permiso_bajo_costo):
+    """
+    Validación de costo del final de `PrecioService._aplicar_reglas` sobre una fila de
+    `anotar`. Devuelve (precio_final, autorizado_bajo_costo, ajustado_a_costo).
+    """
+    if precio_calculado < ultimo_costo:
+        if permiso_bajo_costo:
+            return precio_calculado, True, False
+        return ultimo_costo, False, True
+    return precio_calculado, False, False
+
+
+class NombresReglas:
+    """
+    `reglas_aplicadas` de cada fila, resuelto en Python: depende solo del artículo (si
+    alguna regla lo nombra), de su grupo y de su línea, así que se guarda por esa clave.
+    """
+
+    def __init__(self, conjunto: ConjuntoReglas, cantidad: int, monto_pedido: Decimal):
+        self.conjunto = conjunto
+        self.cumplidas = {regla.id for regla in reglas_que_se_cumplen(conjunto, cantidad, monto_pedido)}
+        self.con_reglas_propias = {regla.aplica_articulo_id for regla in conjunto.reglas} - {None}
+        self._nombres = {}
+
+    def __call__(self, articulo_id, grupo_id, linea_id, ajustado_a_costo):
+        clave = (articulo_id if articulo_id in self.con_reglas_propias else None, grupo_id, linea_id)
+        nombres = self._nombres.get(clave)
+        if nombres is None:
+            nombres = self._nombres[clave] = tuple(
+                regla.nombre_regla for regla in self.conjunto.reglas_para(articulo_id, grupo_id, linea_id)
+                if regla.id in self.cumplidas
+            )
+        return list(nombres) + [AJUSTE_COSTO_MINIMO] if ajustado_a_costo else list(nombres)
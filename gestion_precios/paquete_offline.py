@@ -0,0 +1,69 @@
+"""
+Paquete de una lista de precios para los terminales sin conexión (ver `evaluador_offline.py`).
+
+Se genera a partir del `ConjuntoReglas` compilado (el mismo que usa el motor) y de los
+precios base de la lista, recorridos con `.iterator()`: la memoria no depende del tamaño
+de la lista. La `secuencia` de la cabecera se lee antes que los datos, así que un
+terminal que después pida `/api/cambios/?desde=<secuencia>` no pierde ningún cambio
+(a lo sumo recibe otra vez alguno ya incluido, y aplicarlo de nuevo no cambia nada).
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .cambios import ultima_secuencia
+from .cache_reglas import obtener_conjunto_reglas
+from .evaluador_offline import COLUMNAS_ARTICULO, VERSION_FORMATO, datos_conjunto
+from .models import ListaPrecio, PrecioArticulo
+
+TIPO_CONTENIDO = 'application/x-ndjson; charset=utf-8'
+
+
+def _linea(registro):
+    return json.dumps(registro, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def consulta_articulos(lista_id: int):
+    """
+    Artículos con precio en la lista, como tuplas en el orden de `COLUMNAS_ARTICULO`.
+    """
+    return PrecioArticulo.objects.filter(lista_precio_id=lista_id).order_by('articulo_id').values_list(
+        'articulo_id', 'articulo__sku', 'articulo__grupo_id', 'articulo__linea_id',
+        'precio_base', 'articulo__ultimo_costo',
+    )
+
+
+def lineas_paquete(lista: ListaPrecio, chunk_size: int = 2000):
+    """
+    Genera las líneas del paquete de `lista`, en el orden que espera `EvaluadorOffline.cargar`.
+    """
+    secuencia = ultima_secuencia()
+    yield _linea({
+        'tipo': 'cabecera',
+        'version_formato': VERSION_FORMATO,
+        'secuencia': secuencia,
+        'generado': timezone.now(),
+        'lista': {
+            'id': lista.id,
+            'nombre': lista.nombre,
+            'empresa': lista.empresa_id,
+            'sucursal': lista.sucursal_id,
+            'canal_venta': lista.canal_venta,
+            'fecha_inicio_vigencia': lista.fecha_inicio_vigencia,
+            'fecha_fin_vigencia': lista.fecha_fin_vigencia,
+        },
+        'columnas_articulo': COLUMNAS_ARTICULO,
+    })
+
+    reglas, combinaciones = datos_conjunto(obtener_conjunto_reglas(lista.id))
+    for regla in reglas:
+        yield _linea({'tipo': 'regla', **regla})
+    for combinacion_id, articulos in combinaciones.items():
+        yield _linea({'tipo': 'combinacion', 'id': combinacion_id, 'articulos': articulos})
+
+    articulos = 0
+    for fila in consulta_articulos(lista.id).iterator(chunk_size=chunk_size):
+        articulos += 1
+        yield _linea(fila)
+    yield _linea({'tipo': 'fin', 'articulos': articulos})
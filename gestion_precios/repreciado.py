@@ -0,0 +1,235 @@
+"""
+Repreciado del catálogo completo hacia `PrecioFinalMaterializado`.
+
+El proceso principal lee de la base de datos y escribe; la evaluación de las reglas
+(`evaluador_offline.evaluar_lote`) se reparte por lotes de artículos entre procesos
+que no tocan la base de datos: reciben las reglas compiladas y los precios como valores
+planos y devuelven tuplas. Los procesos se crean con 'spawn', así que no heredan las
+conexiones abiertas del proceso principal.
+
+El modo incremental recalcula solo lo que cambió desde la última corrida terminada:
+lo que indica el registro de cambios (`cambios.py`) desde su `secuencia` y los
+artículos con `fecha_actualizacion` posterior a su inicio (grupo y línea no se
+publican en el feed).
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import materializados
+from .cache_reglas import obtener_conjunto_reglas
+from .cambios import ultima_secuencia
+from .evaluador_offline import datos_conjunto, evaluar_lote
+from .models import (
+    Articulo, CambioPrecio, CorridaRepreciado, ListaPrecio, PrecioArticulo, PrecioFinalMaterializado, ReglaPrecio
+)
+from .paquete_offline import consulta_articulos
+
+
+class _EjecucionLocal:
+    """
+    Ejecutor en el mismo proceso, para `procesos=1` (pruebas, catálogos chicos).
+    """
+    def submit(self, funcion, *args):
+        futuro = Future()
+        futuro.set_result(funcion(*args))
+        return futuro
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class RepreciadoService:
+    """
+    Calcula y guarda los precios finales de todas las listas activas para las cantidades pedidas.
+    """
+
+    @staticmethod
+    def ejecutar(cantidades, incremental: bool = False, procesos: int = None, lote: int = 2000, listas_ids=None):
+        """
+        Corre el repreciado y devuelve un resumen. Con `incremental`, si hay una corrida
+        anterior terminada sobre todas las listas con las mismas `cantidades`, solo se
+        recalcula lo modificado desde ella; si no, se recalcula todo. `listas_ids` limita
+        la corrida a esas listas; una corrida así no sirve de base a las siguientes, porque
+        no recalculó lo que cambió en las demás.
+        """
+        inicio = time.perf_counter()
+        cantidades = sorted(set(cantidades))
+        procesos = procesos or os.cpu_count() or 1
+
+        anterior = None
+        if incremental:
+            anterior = CorridaRepreciado.objects.filter(fin__isnull=False, completa=True).order_by('-pk').first()
+            if anterior is not None and anterior.cantidades != cantidades:
+                anterior = None
+
+        # Generaciones antes de la secuencia y de leer los datos: una escritura posterior
+        # cambia el contador y sus filas no se dan por vigentes (ver materializados.py)
+        activas = set(ListaPrecio.objects.filter(activa=True).values_list('pk', flat=True))
+        al_empezar = materializados.generaciones_al_empezar(
+            sorted(activas if listas_ids is None else activas & set(listas_ids))
+        )
+        corrida = CorridaRepreciado.objects.create(
+            modo='INCREMENTAL' if anterior else 'COMPLETO', secuencia=ultima_secuencia(), cantidades=cantidades,
+            completa=listas_ids is None,
+        )
+
+        # 1. Qué recalcular: {lista_id: None (todos sus artículos) o conjunto de artículos}
+        if anterior:
+            pendientes, con_bajas = RepreciadoService._modificado_desde(anterior, corrida, activas)
+        else:
+            pendientes, con_bajas = dict.fromkeys(activas), set()
+        if listas_ids is not None:
+            pendientes = {lista_id: articulos for lista_id, articulos in pendientes.items() if lista_id in listas_ids}
+            con_bajas &= set(listas_ids)
+
+        resumen = {
+            'corrida': corrida.pk, 'modo': corrida.modo, 'listas': len(pendientes),
+            'lotes': 0, 'precios_calculados': 0, 'filas_borradas': 0,
+        }
+
+        # 2. Evaluación en paralelo; se escribe a medida que terminan los lotes
+        if procesos > 1:
+            ejecutor = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            ejecutor = _EjecucionLocal()
+        with ejecutor:
+            en_curso = {}
+            for lista_id, reglas, combinaciones, filas in RepreciadoService._lotes(pendientes, lote):
+                futuro = ejecutor.submit(evaluar_lote, lista_id, reglas, combinaciones, filas, cantidades)
+                en_curso[futuro] = lista_id
+                resumen['lotes'] += 1
+                # Pocos lotes en vuelo a la vez: la memoria no depende del tamaño del catálogo
+                while len(en_curso) >= 2 * procesos:
+                    hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                    for hecho in hechos:
+                        resumen['precios_calculados'] += RepreciadoService._guardar(
+                            en_curso.pop(hecho), hecho.result(), corrida
+                        )
+            for futuro, lista_id in en_curso.items():
+                resumen['precios_calculados'] += RepreciadoService._guardar(lista_id, futuro.result(), corrida)
+
+        # 3. Filas que ya no corresponden: artículos sin precio, listas inactivas
+        resumen['filas_borradas'] = RepreciadoService._limpiar(pendientes, con_bajas, activas, corrida, listas_ids)
+
+        # Solo las listas que esta corrida puso al día: una lista sin cambios desde la
+        # corrida anterior conserva su marca, vigente o no
+        recalculadas = pendientes.keys() | con_bajas
+        materializados.marcar_vigentes(
+            {lista_id: marca for lista_id, marca in al_empezar.items() if lista_id in recalculadas}
+        )
+        corrida.fin = timezone.now()
+        corrida.listas = resumen['listas']
+        corrida.precios_calculados = resumen['precios_calculados']
+        corrida.save(update_fields=['fin', 'listas', 'precios_calculados'])
+        resumen['segundos'] = round(time.perf_counter() - inicio, 3)
+        return resumen
+
+    @staticmethod
+    def _modificado_desde(anterior, corrida, activas):
+        """
+        Listas y artículos a recalcular según el registro de cambios entre las dos corridas.
+        Devuelve `(pendientes, listas_con_bajas_de_precio)`.
+        """
+        completas, por_lista, globales, combinaciones, con_bajas = set(), {}, set(), set(), set()
+        registros = CambioPrecio.objects.filter(
+            pk__gt=anterior.secuencia, pk__lte=corrida.secuencia
+        ).values_list('entidad', 'objeto_id', 'lista_id', 'datos')
+        for entidad, objeto_id, lista_id, datos in registros.iterator():
+            if entidad in ('LISTA', 'REGLA'):
+                completas.add(lista_id)
+            elif entidad == 'COMBINACION':
+                completas.add(lista_id)
+                combinaciones.add(objeto_id)
+            elif entidad == 'PRECIO':
+                if datos is None:
+                    con_bajas.add(lista_id)
+                else:
+                    por_lista.setdefault(lista_id, set()).add(datos['articulo'])
+            elif entidad == 'ARTICULO':
+                globales.add(objeto_id)
+
+        # Reglas de otras listas que usan las combinaciones modificadas
+        completas.update(
+            ReglaPrecio.objects.filter(aplica_combinacion_id__in=combinaciones).values_list('lista_precio_id', flat=True)
+        )
+        # Costo, grupo o línea: el artículo se recalcula en todas sus listas
+        globales.update(Articulo.objects.filter(fecha_actualizacion__gte=anterior.inicio).values_list('pk', flat=True))
+
+        pendientes = {}
+        for lista_id in activas:
+            if lista_id in completas:
+                pendientes[lista_id] = None
+            elif globales or lista_id in por_lista:
+                pendientes[lista_id] = globales | por_lista.get(lista_id, set())
+        return pendientes, con_bajas
+
+    @staticmethod
+    def _lotes(pendientes, lote):
+        """
+        Genera `(lista_id, reglas, combinaciones, filas)` con hasta `lote` artículos por tarea.
+        """
+        for lista_id, articulos in sorted(pendientes.items()):
+            reglas, combinaciones = datos_conjunto(obtener_conjunto_reglas(lista_id))
+            if articulos is None:
+                filas = []
+                for fila in consulta_articulos(lista_id).iterator(chunk_size=lote):
+                    filas.append(fila)
+                    if len(filas) == lote:
+                        yield lista_id, reglas, combinaciones, filas
+                        filas = []
+                if filas:
+                    yield lista_id, reglas, combinaciones, filas
+                continue
+
+            articulos = sorted(articulos)
+            for desde in range(0, len(articulos), lote):
+                filas = list(consulta_articulos(lista_id).filter(articulo_id__in=articulos[desde:desde + lote]))
+                if filas:
+                    yield lista_id, reglas, combinaciones, filas
+
+    @staticmethod
+    def _guardar(lista_id, resultados, corrida):
+        with transaction.atomic():
+            PrecioFinalMaterializado.objects.bulk_create(
+                [
+                    PrecioFinalMaterializado(
+                        lista_precio_id=lista_id, articulo_id=articulo_id, cantidad=cantidad,
+                        precio_base=precio_base, precio_final=precio_final, total=total,
+                        reglas_aplicadas=reglas_aplicadas, autorizado_bajo_costo=autorizado_bajo_costo,
+                        corrida=corrida,
+                    )
+                    for articulo_id, cantidad, precio_base, precio_final, total, reglas_aplicadas, autorizado_bajo_costo
+                    in resultados
+                ],
+                update_conflicts=True,
+                unique_fields=['lista_precio', 'articulo', 'cantidad'],
+                update_fields=[
+                    'precio_base', 'precio_final', 'total', 'reglas_aplicadas', 'autorizado_bajo_costo', 'corrida',
+                ],
+            )
+        return len(resultados)
+
+    @staticmethod
+    def _limpiar(pendientes, con_bajas, activas, corrida, listas_ids):
+        materializados = PrecioFinalMaterializado.objects
+        borrados = 0
+        # Listas recalculadas completas: todo lo que esta corrida no volvió a escribir
+        completas = [lista_id for lista_id, articulos in pendientes.items() if articulos is None]
+        if completas:
+            borrados += materializados.filter(lista_precio_id__in=completas).exclude(corrida=corrida).delete()[0]
+        # Bajas de precios sueltas: filas cuyo artículo ya no tiene precio en la lista
+        for lista_id in con_bajas - set(completas):
+            borrados += materializados.filter(lista_precio_id=lista_id).exclude(
+                articulo_id__in=PrecioArticulo.objects.filter(lista_precio_id=lista_id).values('articulo_id')
+            ).delete()[0]
+        if listas_ids is None:
+            borrados += materializados.exclude(lista_precio_id__in=activas).delete()[0]
+        return borrados
@@ -6,41 +6,56 @@ from .models import (
     Empresa, Sucursal, LineaArticulo, GrupoArticulo, Articulo,
     ListaPrecio, PrecioArticulo, ReglaPrecio, CombinacionProducto
 )
+from .simulacion import LIMITE_MAXIMO, LIMITE_POR_DEFECTO
+
+# --- Selección de campos (`fields=` en los listados) ---
+
+class CamposDinamicosMixin:
+    """
+    Acepta `campos=[...]` al construir el serializador y descarta el resto de campos.
+    """
+    def __init__(self, *args, **kwargs):
+        campos = kwargs.pop('campos', None)
+        super().__init__(*args, **kwargs)
+        if campos is not None:
+            for nombre in set(self.fields) - set(campos):
+                self.fields.pop(nombre)
+
 
 # --- Serializadores base ---
 
-class EmpresaSerializer(serializers.ModelSerializer):
+class EmpresaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Empresa
         fields = '__all__'
 
 
-class SucursalSerializer(serializers.ModelSerializer):
+class SucursalSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Sucursal
         fields = '__all__'
 
 
-class LineaArticuloSerializer(serializers.ModelSerializer):
+class LineaArticuloSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = LineaArticulo
         fields = '__all__'
 
 
-class GrupoArticuloSerializer(serializers.ModelSerializer):
+class GrupoArticuloSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = GrupoArticulo
         fields = '__all__'
 
 
-class ArticuloSerializer(serializers.ModelSerializer):
+class ArticuloSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Articulo
         fields = '__all__'
 
 
 # --- Serializador para Lista de Precios ---
-class ListaPrecioSerializer(serializers.ModelSerializer):
+class ListaPrecioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = ListaPrecio
         fields = [
@@ -52,12 +67,28 @@ class ListaPrecioSerializer(serializers.ModelSerializer):
             'fecha_inicio_vigencia',
             'fecha_fin_vigencia',
             'activa',
+            'fecha_actualizacion',
         ]
 
     def validate(self, data):
         """
         Validación personalizada para evitar solapamiento de vigencias.
         """
+        query = self.consulta_solapamiento(data)
+
+        if query.exists():
+            lista_existente = query.first()
+            raise serializers.ValidationError(
+                f"Las fechas se solapan con una lista de precios existente: "
+                f"'{lista_existente.nombre}' (ID: {lista_existente.id})"
+            )
+
+        return data
+
+    def consulta_solapamiento(self, data):
+        """
+        QuerySet de listas activas que compiten con `data` y cuyas vigencias se solapan.
+        """
         inicio = data.get('fecha_inicio_vigencia')
         fin = data.get('fecha_fin_vigencia')
 
@@ -89,32 +120,25 @@ class ListaPrecioSerializer(serializers.ModelSerializer):
         if instancia_actual:
             query = query.exclude(pk=instancia_actual.pk)
 
-        if query.exists():
-            lista_existente = query.first()
-            raise serializers.ValidationError(
-                f"Las fechas se solapan con una lista de precios existente: "
-                f"'{lista_existente.nombre}' (ID: {lista_existente.id})"
-            )
-
-        return data
+        return query
 
 
 # --- Serializador para Combinación de Productos ---
-class CombinacionProductoSerializer(serializers.ModelSerializer):
+class CombinacionProductoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = CombinacionProducto
         fields = '__all__'
 
 
 # --- Serializador para Precio de Artículo ---
-class PrecioArticuloSerializer(serializers.ModelSerializer):
+class PrecioArticuloSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = PrecioArticulo
         fields = '__all__'
 
 
 # --- Serializador para Reglas de Precio ---
-class ReglaPrecioSerializer(serializers.ModelSerializer):
+class ReglaPrecioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     aplica_articulo = serializers.PrimaryKeyRelatedField(
         queryset=Articulo.objects.all(),
         allow_null=True,
@@ -136,30 +160,26 @@ class ReglaPrecioSerializer(serializers.ModelSerializer):
         required=False
     )
 
+    # Criterios que identifican una regla duplicada (los ausentes en `data` no se comparan)
+    CAMPOS_UNICOS = [
+        'lista_precio', 'tipo_regla', 'condicion', 'condicion_valor',
+        'aplica_articulo', 'aplica_grupo', 'aplica_linea', 'aplica_combinacion'
+    ]
+
     class Meta:
         model = ReglaPrecio
         fields = [
             'id', 'lista_precio', 'nombre_regla', 'tipo_regla', 'valor_regla',
             'condicion', 'condicion_valor', 'prioridad', 'permite_venta_bajo_costo',
-            'aplica_articulo', 'aplica_grupo', 'aplica_linea', 'aplica_combinacion'
+            'aplica_articulo', 'aplica_grupo', 'aplica_linea', 'aplica_combinacion',
+            'fecha_actualizacion'
         ]
 
     def validate(self, data):
         """
         Validación para evitar reglas duplicadas.
         """
-        campos_unicos = [
-            'lista_precio', 'tipo_regla', 'condicion', 'condicion_valor',
-            'aplica_articulo', 'aplica_grupo', 'aplica_linea', 'aplica_combinacion'
-        ]
-        filtro_duplicados = {}
-        for campo in campos_unicos:
-            if campo in data:
-                filtro_duplicados[campo] = data.get(campo)
-
-        query = ReglaPrecio.objects.filter(**filtro_duplicados)
-        if self.instance:
-            query = query.exclude(pk=self.instance.pk)
+        query = self.consulta_duplicados(data)
 
         if query.exists():
             regla_existente = query.first()
@@ -170,6 +190,21 @@ class ReglaPrecioSerializer(serializers.ModelSerializer):
 
         return data
 
+    def consulta_duplicados(self, data):
+        """
+        QuerySet de reglas con los mismos criterios que `data`.
+        """
+        filtro_duplicados = {}
+        for campo in self.CAMPOS_UNICOS:
+            if campo in data:
+                filtro_duplicados[campo] = data.get(campo)
+
+        query = ReglaPrecio.objects.filter(**filtro_duplicados)
+        if self.instance:
+            query = query.exclude(pk=self.instance.pk)
+
+        return query
+
 
 # --- Serializador de resultado de cálculo ---
 class ResultadoCalculoSerializer(serializers.Serializer):
@@ -180,3 +215,120 @@ class ResultadoCalculoSerializer(serializers.Serializer):
     total = serializers.DecimalField(max_digits=12, decimal_places=2)
     reglas_aplicadas = serializers.ListField(child=serializers.CharField())
     autorizado_bajo_costo = serializers.BooleanField()
+
+
+# --- Serializadores del cálculo de carrito ---
+class ItemCarritoSerializer(serializers.Serializer):
+    articulo_id = serializers.IntegerField(min_value=1)
+    cantidad = serializers.IntegerField(min_value=1)
+
+
+class CalcularCarritoSerializer(serializers.Serializer):
+    empresa_id = serializers.IntegerField()
+    canal_venta = serializers.CharField()
+    sucursal_id = serializers.IntegerField(required=False, allow_null=True)
+    fecha = serializers.DateField(required=False, allow_null=True)
+    items = ItemCarritoSerializer(many=True, allow_empty=False)
+
+
+class ResultadoLineaCarritoSerializer(ResultadoCalculoSerializer):
+    lista_precio_aplicada = None
+    articulo_id = serializers.IntegerField()
+
+
+class ResultadoCarritoSerializer(serializers.Serializer):
+    lista_precio_aplicada = serializers.CharField()
+    monto_pedido = serializers.DecimalField(max_digits=12, decimal_places=2)
+    lineas = ResultadoLineaCarritoSerializer(many=True)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+# --- Serializadores de la curva de precio por cantidad ---
+class TramoCurvaSerializer(serializers.Serializer):
+    cantidad_desde = serializers.IntegerField()
+    cantidad_hasta = serializers.IntegerField(allow_null=True)
+    precio_final = serializers.DecimalField(max_digits=10, decimal_places=2)
+    reglas_aplicadas = serializers.ListField(child=serializers.CharField())
+    autorizado_bajo_costo = serializers.BooleanField()
+
+
+class ResultadoCurvaSerializer(serializers.Serializer):
+    lista_precio_aplicada = serializers.CharField()
+    articulo_id = serializers.IntegerField()
+    precio_base = serializers.DecimalField(max_digits=10, decimal_places=2)
+    tramos = TramoCurvaSerializer(many=True)
+
+
+# --- Serializadores de la simulación de reglas (`simular`) ---
+class ReglaSimuladaSerializer(serializers.ModelSerializer):
+    """
+    Regla propuesta: los campos de `ReglaPrecio` sin la lista (es la de la URL) y sin
+    validar duplicados, porque no se guarda.
+    """
+    class Meta:
+        model = ReglaPrecio
+        fields = [
+            'nombre_regla', 'tipo_regla', 'valor_regla', 'condicion', 'condicion_valor',
+            'prioridad', 'permite_venta_bajo_costo',
+            'aplica_articulo', 'aplica_grupo', 'aplica_linea', 'aplica_combinacion',
+        ]
+
+
+class ModificacionReglaSerializer(ReglaSimuladaSerializer):
+    """
+    Cambios propuestos a una regla existente de la lista: `id` y solo los campos que cambian.
+    """
+    id = serializers.IntegerField()
+
+    class Meta(ReglaSimuladaSerializer.Meta):
+        fields = ['id'] + ReglaSimuladaSerializer.Meta.fields
+        extra_kwargs = {campo: {'required': False} for campo in ReglaSimuladaSerializer.Meta.fields}
+
+
+class SimulacionSerializer(serializers.Serializer):
+    agregar = ReglaSimuladaSerializer(many=True, required=False)
+    modificar = ModificacionReglaSerializer(many=True, required=False)
+    eliminar = serializers.ListField(child=serializers.IntegerField(), required=False)
+    cantidad = serializers.IntegerField(min_value=1, default=1)
+    monto_pedido = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0'), default=Decimal('0.00'))
+    cart_items = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    limite = serializers.IntegerField(min_value=0, max_value=LIMITE_MAXIMO, default=LIMITE_POR_DEFECTO)
+
+
+class ResumenSimulacionSerializer(serializers.Serializer):
+    ingreso = serializers.DecimalField(max_digits=16, decimal_places=2)
+    margen = serializers.DecimalField(max_digits=16, decimal_places=2)
+    margen_porcentual = serializers.FloatField(allow_null=True)
+    con_descuento = serializers.IntegerField()
+    bajo_costo_autorizado = serializers.IntegerField()
+    ajustados_a_costo = serializers.IntegerField()
+
+
+class DiferenciaSimulacionSerializer(ResumenSimulacionSerializer):
+    margen_porcentual = None
+    nuevos_bajo_costo = serializers.IntegerField()
+
+
+class ArticuloSimuladoSerializer(serializers.Serializer):
+    articulo_id = serializers.IntegerField()
+    sku = serializers.CharField()
+    precio_base = serializers.DecimalField(max_digits=10, decimal_places=2)
+    ultimo_costo = serializers.DecimalField(max_digits=10, decimal_places=2)
+    precio_actual = serializers.DecimalField(max_digits=10, decimal_places=2)
+    precio_propuesto = serializers.DecimalField(max_digits=10, decimal_places=2)
+    diferencia_margen = serializers.DecimalField(max_digits=14, decimal_places=2)
+    bajo_costo_autorizado = serializers.BooleanField()
+    ajustado_a_costo = serializers.BooleanField()
+
+
+class ResultadoSimulacionSerializer(serializers.Serializer):
+    lista_precio = serializers.IntegerField()
+    articulos = serializers.IntegerField()
+    cantidad = serializers.IntegerField()
+    monto_pedido = serializers.DecimalField(max_digits=12, decimal_places=2)
+    actual = ResumenSimulacionSerializer()
+    propuesto = ResumenSimulacionSerializer()
+    diferencia = DiferenciaSimulacionSerializer()
+    articulos_afectados = serializers.IntegerField()
+    detalle = ArticuloSimuladoSerializer(many=True)
+    segundos = serializers.FloatField()
@@ -1,7 +1,14 @@
 from .models import ListaPrecio, Articulo, PrecioArticulo, ReglaPrecio
-from decimal import Decimal
+from . import cache_listas, cache_precios, generaciones, materializados, metricas, motor_sql
+from .cache_reglas import obtener_conjunto_reglas, aobtener_conjunto_reglas
+from .evaluador_offline import ejecutar_reglas, ajustar_a_costo
+from .motor import ConjuntoReglas, a_centesimos
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
 from datetime import date
-from django.db.models import Q
+from django.conf import settings
+from django.db.models import Q, Case, When, Value
+
+MOTORES = ('decimal', 'centimos', 'sql')
 class PrecioService:
     """
     Clase que encapsula toda la lógica de negocio para el cálculo de precios.
@@ -15,191 +22,794 @@ class PrecioService:
         cantidad: int,
         sucursal_id: int = None,
         monto_pedido: Decimal = Decimal('0.00'),  # <-- NUEVO PARÁMETRO
-        cart_items_ids: list[int] = None
+        cart_items_ids: list[int] = None,
+        motor: str = None,
+        fecha: date = None
     ):
         """
         Calcula el precio final para un artículo, aplicando la lista y reglas correspondientes.
+        `motor` elige la aritmética del bucle de reglas ('decimal', 'centimos' o 'sql');
+        por defecto se usa `settings.PRECIOS_MOTOR`. `fecha` elige la lista vigente en
+        ese día (por defecto, hoy); precios base y reglas son los actuales de esa lista.
         """
-        # 1. Reutilizamos la función para encontrar la lista correcta
-        lista_vigente = PrecioService.obtener_lista_vigente(
-            empresa_id=empresa_id,
-            canal_venta=canal_venta,
-            sucursal_id=sucursal_id
+        resultado, _ = PrecioService.calcular_precio_final_con_origen(
+            empresa_id, canal_venta, articulo_id, cantidad, sucursal_id,
+            monto_pedido, cart_items_ids, motor, fecha
         )
+        return resultado
+
+    @staticmethod
+    def calcular_precio_final_con_origen(
+        empresa_id: int,
+        canal_venta: str,
+        articulo_id: int,
+        cantidad: int,
+        sucursal_id: int = None,
+        monto_pedido: Decimal = Decimal('0.00'),
+        cart_items_ids: list[int] = None,
+        motor: str = None,
+        fecha: date = None
+    ):
+        """
+        Igual que `calcular_precio_final`, pero devuelve `(resultado, origen)`: 'memo'
+        (caché de resultados), 'materializado' (tabla de `reprice_catalog`), 'motor'
+        (evaluación de las reglas) o None si hubo error.
+        """
+        # 1. Reutilizamos la función para encontrar la lista correcta
+        with metricas.tramo('lista_vigente'):
+            lista_vigente = PrecioService.obtener_lista_vigente(
+                empresa_id=empresa_id,
+                canal_venta=canal_venta,
+                sucursal_id=sucursal_id,
+                fecha=fecha
+            )
 
         if not lista_vigente:
-            return {"error": "No se encontró una lista de precios aplicable.", "precio_final": None}
+            return {"error": "No se encontró una lista de precios aplicable.", "precio_final": None}, None
+
+        # 2. Reglas compiladas de la lista y combinaciones que completa el carrito. Las
+        # generaciones se leen una vez: validan el conjunto y forman la clave del memo
+        with metricas.tramo('carga_reglas'):
+            generacion = generaciones.actuales_con_motor(lista_vigente.id) if generaciones.alias_cache() else None
+            conjunto = obtener_conjunto_reglas(lista_vigente.id, generacion)
+        combinaciones_satisfechas = PrecioService._combinaciones_del_carrito(conjunto, articulo_id, cart_items_ids)
+
+        # 3. Resultado memoizado de una consulta equivalente (ver cache_precios)
+        motor = motor or settings.PRECIOS_MOTOR
+        firma = conjunto.firma(articulo_id, cantidad, monto_pedido, combinaciones_satisfechas)
+        with metricas.tramo('memo'):
+            clave_memo, resultado = cache_precios.obtener(
+                lista_vigente.id, articulo_id, firma, motor, cantidad, generacion
+            )
+        if resultado is not None:
+            return resultado, 'memo'
 
-        # 2. Buscamos el precio base Y el artículo (con su costo)
+        # 4. Precio ya calculado por reprice_catalog, si la consulta equivale a la precalculada
+        if PrecioService._equivale_a_materializado(conjunto, articulo_id, cantidad, firma, motor):
+            with metricas.tramo('materializado'):
+                resultado = (
+                    materializados.obtener(lista_vigente, articulo_id, cantidad)
+                    if materializados.vigente(lista_vigente.id) else None
+                )
+            if resultado is not None:
+                return resultado, 'materializado'
+
+        # 5. Buscamos el precio base Y el artículo (con su costo)
         try:
             # Optimizamos la consulta para traer el artículo relacionado
-            precio_articulo_obj = PrecioArticulo.objects.select_related('articulo').get(
-                lista_precio=lista_vigente,
-                articulo_id=articulo_id
-            )
+            with metricas.tramo('precio_base'):
+                precio_articulo_obj = PrecioArticulo.objects.select_related('articulo').get(
+                    lista_precio=lista_vigente,
+                    articulo_id=articulo_id
+                )
             precio_base = precio_articulo_obj.precio_base
             articulo = precio_articulo_obj.articulo # Objeto Articulo
             ultimo_costo = articulo.ultimo_costo
         except PrecioArticulo.DoesNotExist:
-            return {"error": f"El artículo ID {articulo_id} no tiene un precio base definido en la lista '{lista_vigente.nombre}'.", "precio_final": None}
+            return {"error": f"El artículo ID {articulo_id} no tiene un precio base definido en la lista '{lista_vigente.nombre}'.", "precio_final": None}, None
 
-        # --- INICIO DE LA NUEVA LÓGICA DE REGLAS ---
+        resultado = PrecioService._resultado_precio_final(
+            lista_vigente, precio_base, articulo, ultimo_costo, conjunto,
+            cantidad, monto_pedido, combinaciones_satisfechas, motor
+        )
+        with metricas.tramo('memo'):
+            cache_precios.guardar(clave_memo, resultado)
+        return resultado, 'motor'
 
-        precio_final = precio_base
-        reglas_aplicadas = []
-        # Flag para saber si *alguna* regla aplicada nos da permiso de vender bajo costo
-        permiso_venta_bajo_costo = False 
-
-        # Obtenemos todas las reglas de la lista, ordenadas por prioridad
-        reglas = lista_vigente.reglas.all() # .all() usará el 'ordering' del Meta
-        if cart_items_ids is None:
-            cart_items_ids = []
-        
-        # Convertimos la lista de IDs del carrito a un Set para búsquedas rápidas
-        cart_items_set = set(cart_items_ids)
-        
+    @staticmethod
+    async def acalcular_precio_final(
+        empresa_id: int,
+        canal_venta: str,
+        articulo_id: int,
+        cantidad: int,
+        sucursal_id: int = None,
+        monto_pedido: Decimal = Decimal('0.00'),
+        cart_items_ids: list[int] = None,
+        motor: str = None,
+        fecha: date = None
+    ):
+        """
+        Versión asíncrona de `calcular_precio_final` sobre el ORM asíncrono de Django.
+        Mismo resultado; solo cambian las lecturas de base de datos.
+        """
+        resultado, _ = await PrecioService.acalcular_precio_final_con_origen(
+            empresa_id, canal_venta, articulo_id, cantidad, sucursal_id,
+            monto_pedido, cart_items_ids, motor, fecha
+        )
+        return resultado
+
+    @staticmethod
+    async def acalcular_precio_final_con_origen(
+        empresa_id: int,
+        canal_venta: str,
+        articulo_id: int,
+        cantidad: int,
+        sucursal_id: int = None,
+        monto_pedido: Decimal = Decimal('0.00'),
+        cart_items_ids: list[int] = None,
+        motor: str = None,
+        fecha: date = None
+    ):
+        """
+        Versión asíncrona de `calcular_precio_final_con_origen`.
+        """
+        with metricas.tramo('lista_vigente'):
+            lista_vigente = await PrecioService.aobtener_lista_vigente(
+                empresa_id=empresa_id,
+                canal_venta=canal_venta,
+                sucursal_id=sucursal_id,
+                fecha=fecha
+            )
+
+        if not lista_vigente:
+            return {"error": "No se encontró una lista de precios aplicable.", "precio_final": None}, None
+
+        with metricas.tramo('carga_reglas'):
+            generacion = (
+                await generaciones.aactuales_con_motor(lista_vigente.id) if generaciones.alias_cache() else None
+            )
+            conjunto = await aobtener_conjunto_reglas(lista_vigente.id, generacion)
+        combinaciones_satisfechas = PrecioService._combinaciones_del_carrito(conjunto, articulo_id, cart_items_ids)
+
+        motor = motor or settings.PRECIOS_MOTOR
+        firma = conjunto.firma(articulo_id, cantidad, monto_pedido, combinaciones_satisfechas)
+        with metricas.tramo('memo'):
+            clave_memo, resultado = await cache_precios.aobtener(
+                lista_vigente.id, articulo_id, firma, motor, cantidad, generacion
+            )
+        if resultado is not None:
+            return resultado, 'memo'
+
+        if PrecioService._equivale_a_materializado(conjunto, articulo_id, cantidad, firma, motor):
+            with metricas.tramo('materializado'):
+                resultado = (
+                    await materializados.aobtener(lista_vigente, articulo_id, cantidad)
+                    if await materializados.avigente(lista_vigente.id) else None
+                )
+            if resultado is not None:
+                return resultado, 'materializado'
+
+        try:
+            with metricas.tramo('precio_base'):
+                precio_articulo_obj = await PrecioArticulo.objects.select_related('articulo').aget(
+                    lista_precio=lista_vigente,
+                    articulo_id=articulo_id
+                )
+        except PrecioArticulo.DoesNotExist:
+            return {"error": f"El artículo ID {articulo_id} no tiene un precio base definido en la lista '{lista_vigente.nombre}'.", "precio_final": None}, None
+
+        articulo = precio_articulo_obj.articulo
+        resultado = PrecioService._resultado_precio_final(
+            lista_vigente, precio_articulo_obj.precio_base, articulo, articulo.ultimo_costo, conjunto,
+            cantidad, monto_pedido, combinaciones_satisfechas, motor
+        )
+        with metricas.tramo('memo'):
+            await cache_precios.aguardar(clave_memo, resultado)
+        return resultado, 'motor'
+
+    @staticmethod
+    def _equivale_a_materializado(conjunto, articulo_id, cantidad, firma, motor):
+        """
+        True si la consulta decide las mismas reglas que la precalculada por
+        `reprice_catalog` para esa cantidad (sin carrito y con monto 0): el monto y el
+        carrito no alcanzan ningún umbral ni completan ninguna combinación más. Las filas
+        se calculan con la aritmética 'decimal' (la que usa 'sql' para un artículo suelto).
+        """
+        if motor not in ('decimal', 'sql'):
+            return False
+        return firma == conjunto.firma(
+            articulo_id, cantidad, Decimal('0.00'), conjunto.combinaciones_satisfechas((articulo_id,))
+        )
+
+    @staticmethod
+    def _combinaciones_del_carrito(conjunto, articulo_id, cart_items_ids):
+        """
+        Combinaciones que completa el carrito; el artículo consultado cuenta como parte de él.
+        """
+        # Convertimos la lista de IDs del carrito a un Set para búsquedas rápidas.
         # Aseguramos que el artículo actual esté en el "carrito" para la lógica de combinación
-        cart_items_set.add(articulo_id)
-        
-        for regla in reglas:
-            
-            # ... (La verificación de aplicabilidad por articulo/grupo/linea se queda igual) ...
-            
-            # --- INICIO DE NUEVA LÓGICA DE COMBINACIÓN ---
-            
-            # Verificamos si la regla es de combinación
-            if regla.aplica_combinacion:
-                # 1. El artículo actual debe ser parte de la combinación
-                articulos_requeridos_ids = set(
-                    regla.aplica_combinacion.articulos.values_list('id', flat=True)
+        with metricas.tramo('combinaciones'):
+            cart_items_set = set(cart_items_ids or ())
+            cart_items_set.add(articulo_id)
+            return conjunto.combinaciones_satisfechas(cart_items_set)
+
+    @staticmethod
+    def _resultado_precio_final(
+        lista_vigente, precio_base, articulo, ultimo_costo, conjunto,
+        cantidad, monto_pedido, combinaciones_satisfechas, motor
+    ):
+        """
+        Parte de `calcular_precio_final` que no toca la base de datos: reglas, costo
+        mínimo y armado del resultado. La comparten la versión síncrona y la asíncrona.
+        """
+        aplicar_reglas = PrecioService._evaluador(motor)
+        precio_final, reglas_aplicadas, autorizado_bajo_costo = aplicar_reglas(
+            conjunto=conjunto,
+            articulo=articulo,
+            precio_base=precio_base,
+            ultimo_costo=ultimo_costo,
+            cantidad=cantidad,
+            monto_pedido=monto_pedido,
+            combinaciones_satisfechas=combinaciones_satisfechas,
+        )
+
+        # 4. Devolvemos el diccionario final
+        return {
+            "lista_precio_aplicada": lista_vigente.nombre,
+            "precio_base": precio_base,
+            "precio_final": precio_final,
+            "cantidad": cantidad,
+            "total": precio_final * cantidad,
+            "reglas_aplicadas": reglas_aplicadas,
+            "autorizado_bajo_costo": autorizado_bajo_costo
+        }
+
+    @staticmethod
+    def calcular_carrito(
+        empresa_id: int,
+        canal_venta: str,
+        items: list[dict],
+        sucursal_id: int = None,
+        motor: str = None,
+        fecha: date = None
+    ):
+        """
+        Calcula el precio final de todas las líneas de un carrito en una sola pasada.
+
+        `items` es una lista de diccionarios con 'articulo_id' y 'cantidad'. La lista
+        vigente se resuelve una vez, los precios base se cargan con una única consulta
+        `IN` y el `monto_pedido` y los artículos del carrito se calculan en el servidor,
+        de modo que el número de consultas no depende de la cantidad de líneas.
+        """
+        # 1. Resolvemos la lista una sola vez para todo el carrito
+        with metricas.tramo('lista_vigente'):
+            lista_vigente = PrecioService.obtener_lista_vigente(
+                empresa_id=empresa_id,
+                canal_venta=canal_venta,
+                sucursal_id=sucursal_id,
+                fecha=fecha
+            )
+
+        if not lista_vigente:
+            return {"error": "No se encontró una lista de precios aplicable.", "lineas": None}
+
+        # 2. Todos los precios base (con su artículo) en una sola consulta
+        articulos_ids = {item['articulo_id'] for item in items}
+        with metricas.tramo('precio_base'):
+            precios = {
+                precio.articulo_id: precio
+                for precio in PrecioArticulo.objects.select_related('articulo').filter(
+                    lista_precio=lista_vigente,
+                    articulo_id__in=articulos_ids
+                )
+            }
+
+        faltantes = sorted(articulos_ids - precios.keys())
+        if faltantes:
+            ids_texto = ', '.join(str(articulo_id) for articulo_id in faltantes)
+            return {"error": f"Los artículos ID {ids_texto} no tienen un precio base definido en la lista '{lista_vigente.nombre}'.", "lineas": None}
+
+        with metricas.tramo('carga_reglas'):
+            conjunto = obtener_conjunto_reglas(lista_vigente.id)
+
+        return PrecioService._resultado_carrito(lista_vigente, items, articulos_ids, precios, conjunto, motor)
+
+    @staticmethod
+    async def acalcular_carrito(
+        empresa_id: int,
+        canal_venta: str,
+        items: list[dict],
+        sucursal_id: int = None,
+        motor: str = None,
+        fecha: date = None
+    ):
+        """
+        Versión asíncrona de `calcular_carrito`: la lista, los precios (iteración asíncrona)
+        y las reglas se leen con el ORM asíncrono.
+        """
+        with metricas.tramo('lista_vigente'):
+            lista_vigente = await PrecioService.aobtener_lista_vigente(
+                empresa_id=empresa_id,
+                canal_venta=canal_venta,
+                sucursal_id=sucursal_id,
+                fecha=fecha
+            )
+
+        if not lista_vigente:
+            return {"error": "No se encontró una lista de precios aplicable.", "lineas": None}
+
+        articulos_ids = {item['articulo_id'] for item in items}
+        with metricas.tramo('precio_base'):
+            precios = {
+                precio.articulo_id: precio
+                async for precio in PrecioArticulo.objects.select_related('articulo').filter(
+                    lista_precio=lista_vigente,
+                    articulo_id__in=articulos_ids
+                )
+            }
+
+        faltantes = sorted(articulos_ids - precios.keys())
+        if faltantes:
+            ids_texto = ', '.join(str(articulo_id) for articulo_id in faltantes)
+            return {"error": f"Los artículos ID {ids_texto} no tienen un precio base definido en la lista '{lista_vigente.nombre}'.", "lineas": None}
+
+        with metricas.tramo('carga_reglas'):
+            generacion = (
+                await generaciones.aactuales_con_motor(lista_vigente.id) if generaciones.alias_cache() else None
+            )
+            conjunto = await aobtener_conjunto_reglas(lista_vigente.id, generacion)
+
+        return PrecioService._resultado_carrito(lista_vigente, items, articulos_ids, precios, conjunto, motor)
+
+    @staticmethod
+    def _resultado_carrito(lista_vigente, items, articulos_ids, precios, conjunto, motor):
+        """
+        Parte de `calcular_carrito` que no toca la base de datos, compartida con `acalcular_carrito`.
+        """
+        # 3. Contexto del carrito calculado en el servidor
+        monto_pedido = sum(
+            (precios[item['articulo_id']].precio_base * item['cantidad'] for item in items),
+            Decimal('0.00')
+        )
+
+        # 4. Las reglas ya vienen compiladas (una sola carga para todas las líneas) y
+        #    las combinaciones se comparan contra el carrito una sola vez.
+        with metricas.tramo('combinaciones'):
+            combinaciones_satisfechas = conjunto.combinaciones_satisfechas(articulos_ids)
+        aplicar_reglas = PrecioService._evaluador(motor)
+
+        lineas = []
+        total_carrito = Decimal('0.00')
+        for item in items:
+            precio_articulo_obj = precios[item['articulo_id']]
+            precio_final, reglas_aplicadas, autorizado_bajo_costo = aplicar_reglas(
+                conjunto=conjunto,
+                articulo=precio_articulo_obj.articulo,
+                precio_base=precio_articulo_obj.precio_base,
+                ultimo_costo=precio_articulo_obj.articulo.ultimo_costo,
+                cantidad=item['cantidad'],
+                monto_pedido=monto_pedido,
+                combinaciones_satisfechas=combinaciones_satisfechas,
+            )
+            total_linea = precio_final * item['cantidad']
+            total_carrito += total_linea
+            lineas.append({
+                "articulo_id": item['articulo_id'],
+                "precio_base": precio_articulo_obj.precio_base,
+                "precio_final": precio_final,
+                "cantidad": item['cantidad'],
+                "total": total_linea,
+                "reglas_aplicadas": reglas_aplicadas,
+                "autorizado_bajo_costo": autorizado_bajo_costo
+            })
+
+        return {
+            "lista_precio_aplicada": lista_vigente.nombre,
+            "monto_pedido": monto_pedido,
+            "lineas": lineas,
+            "total": total_carrito
+        }
+
+    @staticmethod
+    def curva_precio(
+        empresa_id: int,
+        canal_venta: str,
+        articulo_id: int,
+        sucursal_id: int = None,
+        motor: str = None,
+        fecha: date = None
+    ):
+        """
+        Precio unitario de un artículo para toda cantidad, como tramos constantes
+        ("1", "3+", "10+"). Cada tramo es el resultado de `calcular_carrito` con el
+        artículo como única línea: el monto del pedido es `precio_base * cantidad`.
+        El motor solo se evalúa en las cantidades donde puede cumplirse un umbral nuevo.
+        """
+        # 1. Lista vigente, precio base y reglas, una sola vez para toda la curva
+        with metricas.tramo('lista_vigente'):
+            lista_vigente = PrecioService.obtener_lista_vigente(
+                empresa_id=empresa_id,
+                canal_venta=canal_venta,
+                sucursal_id=sucursal_id,
+                fecha=fecha
+            )
+
+        if not lista_vigente:
+            return {"error": "No se encontró una lista de precios aplicable.", "tramos": None}
+
+        try:
+            with metricas.tramo('precio_base'):
+                precio_articulo_obj = PrecioArticulo.objects.select_related('articulo').get(
+                    lista_precio=lista_vigente,
+                    articulo_id=articulo_id
                 )
-                
-                if articulo_id not in articulos_requeridos_ids:
-                    continue # Esta regla de combinación no es para este artículo
-
-                # 2. Verificamos si todos los artículos de la combinación
-                #    están presentes en el carrito.
-                if not articulos_requeridos_ids.issubset(cart_items_set):
-                    # No están todos los artículos de la combinación en el carrito.
+        except PrecioArticulo.DoesNotExist:
+            return {"error": f"El artículo ID {articulo_id} no tiene un precio base definido en la lista '{lista_vigente.nombre}'.", "tramos": None}
+
+        with metricas.tramo('carga_reglas'):
+            conjunto = obtener_conjunto_reglas(lista_vigente.id)
+
+        return PrecioService._resultado_curva(lista_vigente, precio_articulo_obj, conjunto, motor)
+
+    @staticmethod
+    def _cantidades_de_quiebre(conjunto: ConjuntoReglas, articulo: Articulo, precio_base: Decimal):
+        """
+        Cantidades, ordenadas, desde las que alguna regla del artículo empieza a cumplir
+        su condición: el umbral de `CANTIDAD_MINIMA`, o el de `MONTO_MINIMO` dividido
+        por el precio base. Entre dos consecutivas se cumplen las mismas reglas.
+        """
+        cantidades = {1}
+        for regla in conjunto.reglas_para(articulo.id, articulo.grupo_id, articulo.linea_id):
+            # Las reglas de combinación no miran la cantidad
+            if regla.aplica_combinacion_id:
+                continue
+            if regla.condicion == 'CANTIDAD_MINIMA':
+                umbral = regla.condicion_valor
+            elif regla.condicion == 'MONTO_MINIMO':
+                # Con precio base 0 el monto no crece con la cantidad: no hay quiebre
+                if precio_base <= 0:
                     continue
-            
-            # --- FIN DE NUEVA LÓGICA DE COMBINACIÓN ---
-
-            # --- Verificación de Condiciones de la Regla (CANTIDAD/MONTO) ---
-            condicion_cumplida = False
-
-            # Si la regla NO es de combinación, aplicamos lógica de cantidad/monto
-            if not regla.aplica_combinacion:
-                if regla.condicion == 'CANTIDAD_MINIMA':
-                    if cantidad >= regla.condicion_valor:
-                        condicion_cumplida = True
-                elif regla.condicion == 'MONTO_MINIMO':
-                    if monto_pedido >= regla.condicion_valor:
-                        condicion_cumplida = True
+                umbral = regla.condicion_valor / precio_base
             else:
-                # Si es una regla de combinación, la condición ya se cumplió
-                # (todos los productos están en el carrito).
-                condicion_cumplida = True
+                continue
+            cantidades.add(max(1, int(umbral.to_integral_value(rounding=ROUND_CEILING))))
+        return sorted(cantidades)
+
+    @staticmethod
+    def _resultado_curva(lista_vigente, precio_articulo_obj, conjunto, motor):
+        """
+        Parte de `curva_precio` que no toca la base de datos.
+        """
+        articulo = precio_articulo_obj.articulo
+        precio_base = precio_articulo_obj.precio_base
+        combinaciones_satisfechas = conjunto.combinaciones_satisfechas((articulo.id,))
+        aplicar_reglas = PrecioService._evaluador(motor)
+
+        # 2. Una evaluación por cantidad de quiebre; los tramos iguales seguidos se unen
+        tramos = []
+        for cantidad in PrecioService._cantidades_de_quiebre(conjunto, articulo, precio_base):
+            precio_final, reglas_aplicadas, autorizado_bajo_costo = aplicar_reglas(
+                conjunto=conjunto,
+                articulo=articulo,
+                precio_base=precio_base,
+                ultimo_costo=articulo.ultimo_costo,
+                cantidad=cantidad,
+                monto_pedido=precio_base * cantidad,
+                combinaciones_satisfechas=combinaciones_satisfechas,
+            )
+            tramo = {
+                "cantidad_desde": cantidad,
+                "cantidad_hasta": None,
+                "precio_final": precio_final,
+                "reglas_aplicadas": reglas_aplicadas,
+                "autorizado_bajo_costo": autorizado_bajo_costo
+            }
+            if tramos:
+                anterior = tramos[-1]
+                if all(
+                    anterior[campo] == tramo[campo]
+                    for campo in ('precio_final', 'reglas_aplicadas', 'autorizado_bajo_costo')
+                ):
+                    continue
+                anterior["cantidad_hasta"] = cantidad - 1
+            tramos.append(tramo)
+
+        return {
+            "lista_precio_aplicada": lista_vigente.nombre,
+            "articulo_id": articulo.id,
+            "precio_base": precio_base,
+            "tramos": tramos
+        }
+
+    @staticmethod
+    def exportar_precios(
+        lista: ListaPrecio,
+        cantidad: int = 1,
+        monto_pedido: Decimal = Decimal('0.00'),
+        motor: str = None,
+        chunk_size: int = 2000
+    ):
+        """
+        Genera, artículo por artículo, el precio base y el precio final de toda la lista
+        para una `cantidad` y un `monto_pedido` dados.
+
+        Los precios se recorren con `.iterator(chunk_size)` (sin caché del queryset) y las
+        reglas se cargan una sola vez, así que la memoria no depende del tamaño de la lista.
+        Cada artículo se evalúa como si fuera el único del carrito, igual que
+        `calcular_precio_final` sin `cart_items_ids`.
+
+        Con el motor 'sql' los precios finales salen de la misma consulta (ver
+        `motor_sql.py`) si las reglas de la lista lo permiten; si no, se usa 'decimal'.
+        """
+        conjunto = obtener_conjunto_reglas(lista.id)
+        if (motor or settings.PRECIOS_MOTOR) == 'sql':
+            try:
+                filas = PrecioService._precios_finales_sql(lista, conjunto, cantidad, monto_pedido)
+            except motor_sql.ReglasNoExpresables:
+                pass
+            else:
+                yield from PrecioService._filas_exportacion_sql(filas, conjunto, cantidad, monto_pedido, chunk_size)
+                return
+        aplicar_reglas = PrecioService._evaluador(motor)
+
+        precios = PrecioArticulo.objects.filter(lista_precio=lista).select_related('articulo').only(
+            'articulo_id', 'precio_base',
+            'articulo__sku', 'articulo__nombre', 'articulo__ultimo_costo',
+            'articulo__grupo_id', 'articulo__linea_id',
+        ).order_by('articulo_id')
+
+        for precio_articulo_obj in precios.iterator(chunk_size=chunk_size):
+            articulo = precio_articulo_obj.articulo
+            precio_final, reglas_aplicadas, autorizado_bajo_costo = aplicar_reglas(
+                conjunto=conjunto,
+                articulo=articulo,
+                precio_base=precio_articulo_obj.precio_base,
+                ultimo_costo=articulo.ultimo_costo,
+                cantidad=cantidad,
+                monto_pedido=monto_pedido,
+                combinaciones_satisfechas=conjunto.combinaciones_satisfechas((articulo.id,)),
+            )
+            yield {
+                "articulo_id": articulo.id,
+                "sku": articulo.sku,
+                "nombre": articulo.nombre,
+                "precio_base": precio_articulo_obj.precio_base,
+                "precio_final": precio_final,
+                "cantidad": cantidad,
+                "total": precio_final * cantidad,
+                "reglas_aplicadas": reglas_aplicadas,
+                "autorizado_bajo_costo": autorizado_bajo_costo
+            }
+
+    @staticmethod
+    def _precios_finales_sql(lista, conjunto, cantidad, monto_pedido):
+        """
+        Precios de la lista con el precio tras las reglas calculado por la base de datos. Lanza
+        `motor_sql.ReglasNoExpresables` si las reglas de la lista no se pueden compilar.
+        """
+        precios = PrecioArticulo.objects.filter(lista_precio=lista).order_by('articulo_id')
+        return motor_sql.anotar(precios, conjunto, cantidad, monto_pedido).values_list(
+            'articulo_id', 'articulo__sku', 'articulo__nombre', 'articulo__grupo_id', 'articulo__linea_id',
+            'precio_base', 'precio_calculado', 'articulo__ultimo_costo', 'permiso_bajo_costo',
+        )
+
+    @staticmethod
+    def _filas_exportacion_sql(filas, conjunto, cantidad, monto_pedido, chunk_size):
+        reglas_aplicadas = motor_sql.NombresReglas(conjunto, cantidad, monto_pedido)
+        for (
+            articulo_id, sku, nombre, grupo_id, linea_id,
+            precio_base, precio_calculado, ultimo_costo, permiso_bajo_costo,
+        ) in filas.iterator(chunk_size=chunk_size):
+            precio_final, autorizado_bajo_costo, ajustado_a_costo = motor_sql.validar_costo(
+                precio_calculado, ultimo_costo, permiso_bajo_costo
+            )
+            yield {
+                "articulo_id": articulo_id,
+                "sku": sku,
+                "nombre": nombre,
+                "precio_base": precio_base,
+                "precio_final": precio_final,
+                "cantidad": cantidad,
+                "total": precio_final * cantidad,
+                "reglas_aplicadas": reglas_aplicadas(articulo_id, grupo_id, linea_id, ajustado_a_costo),
+                "autorizado_bajo_costo": autorizado_bajo_costo
+            }
+
+    @staticmethod
+    def _evaluador(motor: str = None):
+        """
+        Devuelve la implementación del bucle de reglas para el motor pedido. 'sql' solo
+        cambia las lecturas masivas; un artículo suelto se evalúa con el bucle 'decimal'.
+        """
+        motor = motor or getattr(settings, 'PRECIOS_MOTOR', 'decimal')
+        if motor in ('decimal', 'sql'):
+            return PrecioService._aplicar_reglas
+        if motor == 'centimos':
+            return PrecioService._aplicar_reglas_centimos
+        raise ValueError(f"Motor de precios desconocido: '{motor}'. Opciones: {', '.join(MOTORES)}.")
+
+    @staticmethod
+    def _aplicar_reglas(
+        conjunto: ConjuntoReglas,
+        articulo: Articulo,
+        precio_base: Decimal,
+        ultimo_costo: Decimal,
+        cantidad: int,
+        monto_pedido: Decimal,
+        combinaciones_satisfechas: frozenset
+    ):
+        """
+        Ejecuta el motor de reglas sobre un artículo y valida el costo mínimo.
+        `combinaciones_satisfechas` viene de `ConjuntoReglas.combinaciones_satisfechas`
+        sobre el carrito (que debe incluir al artículo).
+        Devuelve (precio_final, reglas_aplicadas, autorizado_bajo_costo).
+        """
+        inicio = metricas.marca()
+
+        # Solo las reglas dirigidas a este artículo, su grupo, su línea, sus
+        # combinaciones o globales, ya en orden de prioridad (bucle compartido con
+        # el evaluador sin conexión)
+        precio_final, reglas_aplicadas, permiso_venta_bajo_costo = ejecutar_reglas(
+            conjunto, articulo.id, precio_base,
+            conjunto.reglas_para(articulo.id, articulo.grupo_id, articulo.linea_id),
+            cantidad, monto_pedido, combinaciones_satisfechas
+        )
+        inicio = metricas.acumular('reglas', inicio)
+
+        # Validación de costo: bajo costo solo si alguna regla aplicada lo autoriza
+        precio_final, autorizado_bajo_costo = ajustar_a_costo(
+            precio_final, ultimo_costo, permiso_venta_bajo_costo, reglas_aplicadas
+        )
+        metricas.acumular('costo_minimo', inicio)
+
+        return precio_final, reglas_aplicadas, autorizado_bajo_costo
 
-            if not condicion_cumplida:
+    @staticmethod
+    def _aplicar_reglas_centimos(
+        conjunto: ConjuntoReglas,
+        articulo: Articulo,
+        precio_base: Decimal,
+        ultimo_costo: Decimal,
+        cantidad: int,
+        monto_pedido: Decimal,
+        combinaciones_satisfechas: frozenset
+    ):
+        """
+        Misma semántica que `_aplicar_reglas`, pero el bucle trabaja solo con enteros.
+
+        El precio se guarda como `entero / 10**escala`, empezando en céntimos (escala 2).
+        Un descuento porcentual en puntos básicos multiplica por (10000 - bp) y suma 4 a
+        la escala, de modo que no hay redondeos intermedios. Reglas de redondeo:
+        - Ningún paso del bucle redondea; el resultado se convierte a Decimal de forma exacta.
+        - El único redondeo (a 2 decimales, ROUND_HALF_EVEN) lo hace el serializador,
+          igual que con el motor Decimal.
+        - `monto_pedido` se compara truncado a céntimos: como `condicion_valor` tiene dos
+          decimales, `monto >= condicion` equivale a `piso(monto * 100) >= condicion * 100`.
+        """
+        inicio = metricas.marca()
+        articulo_id = articulo.id
+        entero = a_centesimos(precio_base)
+        escala = 2
+        costo = a_centesimos(ultimo_costo)
+        cantidad_centesimos = cantidad * 100
+        monto_centesimos = int(Decimal(monto_pedido).scaleb(2).to_integral_value(rounding=ROUND_FLOOR))
+
+        reglas_aplicadas = []
+        permiso_venta_bajo_costo = False
+
+        for regla in conjunto.reglas_para(articulo_id, articulo.grupo_id, articulo.linea_id):
+            if regla.aplica_combinacion_id:
+                if articulo_id not in conjunto.combinaciones[regla.aplica_combinacion_id]:
+                    continue
+                if regla.aplica_combinacion_id not in combinaciones_satisfechas:
+                    continue
+            elif regla.condicion == 'CANTIDAD_MINIMA':
+                if cantidad_centesimos < regla.condicion_centesimos:
+                    continue
+            elif regla.condicion == 'MONTO_MINIMO':
+                if monto_centesimos < regla.condicion_centesimos:
+                    continue
+            else:
                 continue
 
-            # --- Si llegamos aquí, la regla SE APLICA ---
-            
-            # 1. Aplicamos el descuento
             if regla.tipo_regla == 'PORCENTAJE':
-                descuento = precio_final * (regla.valor_regla / Decimal('100.0'))
-                precio_final -= descuento
+                entero *= 10000 - regla.valor_centesimos
+                escala += 4
             elif regla.tipo_regla == 'MONTO_FIJO':
-                precio_final -= regla.valor_regla
+                entero -= regla.valor_centesimos * 10 ** (escala - 2)
 
-            # 2. Registramos la regla aplicada
             reglas_aplicadas.append(regla.nombre_regla)
 
-            # 3. Verificamos si esta regla da permiso de venta bajo costo
             if regla.permite_venta_bajo_costo:
                 permiso_venta_bajo_costo = True
-            
-            # 4. Evitamos precios negativos
-            if precio_final < Decimal('0.00'):
-                precio_final = Decimal('0.00')
 
-        # --- FIN DE LA LÓGICA DE REGLAS ---
+            if entero < 0:
+                entero = 0
+
+        inicio = metricas.acumular('reglas', inicio)
 
-        # 3. Validación de Costo (Lógica Final)
+        # Validación de costo en la escala actual
         autorizado_bajo_costo = False
-        if precio_final < ultimo_costo:
+        if entero < costo * 10 ** (escala - 2):
             if permiso_venta_bajo_costo:
-                # El precio es bajo costo, PERO una regla aplicada lo autorizó.
                 autorizado_bajo_costo = True
             else:
-                # El precio es bajo costo y NO tiene autorización.
-                # Se ajusta el precio al costo.
-                precio_final = ultimo_costo
+                entero, escala = costo, 2
                 reglas_aplicadas.append("Ajuste a costo mínimo (no autorizado bajo costo)")
 
-
-        # 4. Devolvemos el diccionario final
-        return {
-            "lista_precio_aplicada": lista_vigente.nombre,
-            "precio_base": precio_base,
-            "precio_final": precio_final,
-            "cantidad": cantidad,
-            "total": precio_final * cantidad,
-            "reglas_aplicadas": reglas_aplicadas,
-            "autorizado_bajo_costo": autorizado_bajo_costo
-        }
+        # Conversión exacta a Decimal en el borde con el serializador
+        precio_final = Decimal(entero).scaleb(-escala)
+        metricas.acumular('costo_minimo', inicio)
+        return precio_final, reglas_aplicadas, autorizado_bajo_costo
 
 
     @staticmethod
-    def obtener_lista_vigente(empresa_id: int, canal_venta: str, sucursal_id: int = None):
+    def obtener_lista_vigente(empresa_id: int, canal_venta: str, sucursal_id: int = None, fecha: date = None):
         """
-        Encuentra la lista de precios más específica y aplicable para una operación.
+        Encuentra la lista de precios más específica y aplicable para una operación
+        en `fecha` (por defecto, hoy). Sirve igual para fechas pasadas y futuras.
         """
-        # ... (este método se queda exactamente como estaba)
-        hoy = date.today()
-
-        filtros_base = Q(empresa_id=empresa_id) & \
-                       Q(activa=True) & \
-                       Q(fecha_inicio_vigencia__lte=hoy) & \
-                       (Q(fecha_fin_vigencia__gte=hoy) | Q(fecha_fin_vigencia__isnull=True))
+        fecha = fecha or date.today()
 
-        if sucursal_id:
-            lista = ListaPrecio.objects.filter(
-                filtros_base &
-                Q(sucursal_id=sucursal_id) &
-                Q(canal_venta=canal_venta)
-            ).first()
-            if lista:
-                return lista
-
-            lista = ListaPrecio.objects.filter(
-                filtros_base &
-                Q(sucursal_id=sucursal_id) &
-                Q(canal_venta='TODOS')
-            ).first()
-            if lista:
-                return lista
-
-        lista = ListaPrecio.objects.filter(
-            filtros_base &
-            Q(sucursal_id__isnull=True) &
-            Q(canal_venta=canal_venta)
-        ).first()
-        if lista:
+        # 1. Índice de vigencias en caché: un acierto es una búsqueda binaria, sin consultas
+        encontrada, lista, ficha = cache_listas.obtener(empresa_id, sucursal_id, canal_venta, fecha)
+        if encontrada:
             return lista
 
-        lista = ListaPrecio.objects.filter(
-            filtros_base &
-            Q(sucursal_id__isnull=True) &
-            Q(canal_venta='TODOS')
-        ).first()
-        if lista:
-            return lista
+        # 2. Una sola consulta con todas las candidatas del contexto, para cualquier fecha
+        indice = cache_listas.IndiceVigencias.construir(PrecioService._candidatas_lista_vigente(
+            empresa_id=empresa_id,
+            canal_venta=canal_venta,
+            sucursal_id=sucursal_id
+        ))
+        cache_listas.guardar(empresa_id, sucursal_id, canal_venta, indice, ficha)
+        return indice.resolver(fecha)
 
-        return None
+    @staticmethod
+    async def aobtener_lista_vigente(empresa_id: int, canal_venta: str, sucursal_id: int = None, fecha: date = None):
+        """
+        Versión asíncrona de `obtener_lista_vigente`; comparte el índice de vigencias.
+        """
+        fecha = fecha or date.today()
 
+        encontrada, lista, ficha = await cache_listas.aobtener(empresa_id, sucursal_id, canal_venta, fecha)
+        if encontrada:
+            return lista
 
+        candidatas = PrecioService._candidatas_lista_vigente(
+            empresa_id=empresa_id,
+            canal_venta=canal_venta,
+            sucursal_id=sucursal_id
+        )
+        indice = cache_listas.IndiceVigencias.construir([candidata async for candidata in candidatas])
+        cache_listas.guardar(empresa_id, sucursal_id, canal_venta, indice, ficha)
+        return indice.resolver(fecha)
 
+    @staticmethod
+    def _candidatas_lista_vigente(empresa_id: int, canal_venta: str, sucursal_id: int):
+        """
+        QuerySet de todas las listas activas del contexto, ordenadas por especificidad.
+        """
+        filtros = Q(empresa_id=empresa_id) & \
+                  Q(activa=True) & \
+                  Q(canal_venta__in=[canal_venta, 'TODOS'])
 
+        if sucursal_id:
+            filtros &= Q(sucursal_id=sucursal_id) | Q(sucursal_id__isnull=True)
+            especificidad = Case(
+                When(sucursal_id=sucursal_id, canal_venta=canal_venta, then=Value(0)),
+                When(sucursal_id=sucursal_id, then=Value(1)),
+                When(canal_venta=canal_venta, then=Value(2)),
+                default=Value(3),
+            )
+        else:
+            filtros &= Q(sucursal_id__isnull=True)
+            especificidad = Case(
+                When(canal_venta=canal_venta, then=Value(2)),
+                default=Value(3),
+            )
 
+        # Pasadas, vigentes y futuras: `IndiceVigencias` las reparte por fechas
+        return ListaPrecio.objects.filter(filtros).annotate(
+            especificidad=especificidad
+        ).order_by('especificidad', 'pk')
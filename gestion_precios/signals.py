@@ -0,0 +1,254 @@
+"""
+Receptores de señales que mantienen coherentes los cachés del motor de precios y
+escriben el registro de cambios (`cambios.py`) de la sincronización incremental.
+"""
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import cache_listas, cache_reglas, cambios, generaciones
+from .models import (
+    ReglaPrecio, CombinacionProducto, ListaPrecio, PrecioArticulo, Articulo, GrupoArticulo, LineaArticulo
+)
+
+
+def invalidar_caches_del_motor():
+    """
+    Vacía todos los cachés del motor. Lo usan las cargas masivas (`bulk_create`,
+    `update`), que no emiten señales por fila.
+    """
+    cache_reglas.invalidar_todo()
+    cache_listas.invalidar_todo()
+    generaciones.incrementar_global()
+    generaciones.incrementar_motor()
+
+
+def invalidar_lista_del_motor(lista_id: int):
+    """
+    Invalida las reglas compiladas de la lista y sus resultados memoizados
+    (en todos los workers). Para escrituras que no emiten señales.
+    """
+    cache_reglas.invalidar_lista(lista_id)
+    generaciones.incrementar_lista(lista_id)
+
+
+def invalidar_empresa_del_motor(empresa_id: int):
+    """
+    Invalida los índices de vigencias de la empresa y la versión (ETag) de sus listas.
+    """
+    cache_listas.invalidar_empresa(empresa_id)
+    generaciones.incrementar_empresa(empresa_id)
+
+
+def _invalidar_combinaciones(combinaciones_ids):
+    """
+    Invalida las listas dueñas de las combinaciones y las listas cuyas reglas las usan.
+    """
+    listas = set(
+        CombinacionProducto.objects.filter(pk__in=combinaciones_ids).values_list('lista_precio_id', flat=True)
+    )
+    listas.update(
+        ReglaPrecio.objects.filter(aplica_combinacion_id__in=combinaciones_ids).values_list('lista_precio_id', flat=True)
+    )
+    for lista_id in listas:
+        invalidar_lista_del_motor(lista_id)
+
+
+# --- Reglas y combinaciones ---
+
+@receiver(pre_save, sender=ReglaPrecio)
+@receiver(pre_save, sender=CombinacionProducto)
+@receiver(pre_save, sender=PrecioArticulo)
+def recordar_lista_anterior(sender, instance, **kwargs):
+    """
+    Si una regla, combinación o precio se mueve a otra lista, la lista de origen
+    también debe invalidarse.
+    """
+    instance._lista_precio_anterior_id = None
+    if instance.pk:
+        instance._lista_precio_anterior_id = (
+            sender.objects.filter(pk=instance.pk).values_list('lista_precio_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=ReglaPrecio)
+@receiver(post_delete, sender=ReglaPrecio)
+@receiver(post_save, sender=CombinacionProducto)
+@receiver(post_delete, sender=CombinacionProducto)
+def invalidar_reglas_de_lista(sender, instance, **kwargs):
+    invalidar_lista_del_motor(instance.lista_precio_id)
+    lista_anterior_id = getattr(instance, '_lista_precio_anterior_id', None)
+    if lista_anterior_id and lista_anterior_id != instance.lista_precio_id:
+        invalidar_lista_del_motor(lista_anterior_id)
+
+
+@receiver(post_save, sender=CombinacionProducto)
+def invalidar_usos_de_combinacion(sender, instance, created, **kwargs):
+    # Reglas de otras listas pueden apuntar a esta combinación
+    if not created:
+        _invalidar_combinaciones([instance.pk])
+
+
+@receiver(pre_delete, sender=CombinacionProducto)
+def invalidar_reglas_de_combinacion(sender, instance, **kwargs):
+    # Antes del SET_NULL en las reglas, que se hace con un UPDATE sin señales
+    _invalidar_combinaciones([instance.pk])
+
+
+@receiver(m2m_changed, sender=CombinacionProducto.articulos.through)
+def invalidar_miembros_combinacion(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+
+    if not reverse:
+        # combinacion.articulos.add(...) / remove(...) / clear()
+        _invalidar_combinaciones([instance.pk])
+        return
+
+    # articulo.combinaciones.add(...): `pk_set` contiene IDs de combinaciones.
+    # En 'clear' no hay pk_set, así que se consultan antes de borrar.
+    if action == 'post_clear':
+        return
+    if action == 'pre_clear':
+        pk_set = list(instance.combinaciones.values_list('pk', flat=True))
+    _invalidar_combinaciones(pk_set)
+
+
+# --- Listas y artículos ---
+
+@receiver(pre_save, sender=ListaPrecio)
+def recordar_empresa_anterior(sender, instance, **kwargs):
+    instance._empresa_anterior_id = None
+    if instance.pk:
+        instance._empresa_anterior_id = (
+            ListaPrecio.objects.filter(pk=instance.pk).values_list('empresa_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=ListaPrecio)
+@receiver(post_delete, sender=ListaPrecio)
+def invalidar_lista_precio(sender, instance, **kwargs):
+    invalidar_lista_del_motor(instance.pk)
+    invalidar_empresa_del_motor(instance.empresa_id)
+    empresa_anterior_id = getattr(instance, '_empresa_anterior_id', None)
+    if empresa_anterior_id and empresa_anterior_id != instance.empresa_id:
+        invalidar_empresa_del_motor(empresa_anterior_id)
+
+
+@receiver(post_save, sender=PrecioArticulo)
+@receiver(post_delete, sender=PrecioArticulo)
+def invalidar_precios_memoizados(sender, instance, **kwargs):
+    # Las reglas compiladas no dependen del precio base; los resultados memoizados
+    # y los ETag de los precios de la lista sí
+    generaciones.incrementar_lista(instance.lista_precio_id)
+    lista_anterior_id = getattr(instance, '_lista_precio_anterior_id', None)
+    if lista_anterior_id and lista_anterior_id != instance.lista_precio_id:
+        generaciones.incrementar_lista(lista_anterior_id)
+
+
+@receiver(post_save, sender=Articulo)
+def invalidar_por_articulo(sender, instance, created, **kwargs):
+    # Costo, grupo y línea del artículo entran en el precio de todas sus listas
+    if not created:
+        generaciones.incrementar_global()
+
+
+@receiver(post_delete, sender=Articulo)
+@receiver(post_delete, sender=GrupoArticulo)
+@receiver(post_delete, sender=LineaArticulo)
+def invalidar_por_catalogo_eliminado(sender, instance, **kwargs):
+    # El borrado en cascada de las combinaciones no emite m2m_changed y el
+    # SET_NULL de aplica_articulo/grupo/linea se hace con un UPDATE sin señales
+    cache_reglas.invalidar_todo()
+    generaciones.incrementar_global()
+    generaciones.incrementar_motor()
+
+
+# --- Registro de cambios ---
+# Los modelos publicados heredan de `ModeloConCambios`: `save()` y `delete()` son
+# atómicos, así que cada registro se confirma junto con el cambio que describe.
+
+@receiver(post_save, sender=PrecioArticulo)
+@receiver(post_save, sender=ReglaPrecio)
+@receiver(post_save, sender=CombinacionProducto)
+@receiver(post_save, sender=ListaPrecio)
+def registrar_cambio(sender, instance, **kwargs):
+    lista_anterior_id = getattr(instance, '_lista_precio_anterior_id', None)
+    if lista_anterior_id and lista_anterior_id != instance.lista_precio_id:
+        # Para quien sigue solo la lista de origen, el objeto deja de existir en ella
+        cambios.registrar(instance, cambios.ELIMINADO, lista_id=lista_anterior_id)
+    cambios.registrar(instance)
+
+
+@receiver(post_delete, sender=PrecioArticulo)
+@receiver(post_delete, sender=ReglaPrecio)
+@receiver(post_delete, sender=CombinacionProducto)
+@receiver(post_delete, sender=ListaPrecio)
+def registrar_baja(sender, instance, **kwargs):
+    cambios.registrar(instance, cambios.ELIMINADO)
+
+
+@receiver(pre_save, sender=Articulo)
+def recordar_costo_anterior(sender, instance, **kwargs):
+    instance._ultimo_costo_anterior = None
+    if instance.pk:
+        instance._ultimo_costo_anterior = (
+            Articulo.objects.filter(pk=instance.pk).values_list('ultimo_costo', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Articulo)
+def registrar_costo(sender, instance, created, **kwargs):
+    # Del artículo solo se publica el costo, que es lo que entra en el precio
+    anterior = getattr(instance, '_ultimo_costo_anterior', None)
+    if created or anterior is None or anterior != instance.ultimo_costo:
+        cambios.registrar(instance)
+
+
+_REFERENCIAS_EN_REGLAS = {
+    Articulo: 'aplica_articulo',
+    GrupoArticulo: 'aplica_grupo',
+    LineaArticulo: 'aplica_linea',
+    CombinacionProducto: 'aplica_combinacion',
+}
+
+
+@receiver(pre_delete, sender=Articulo)
+@receiver(pre_delete, sender=GrupoArticulo)
+@receiver(pre_delete, sender=LineaArticulo)
+@receiver(pre_delete, sender=CombinacionProducto)
+def recordar_afectados_por_baja(sender, instance, **kwargs):
+    # El SET_NULL de las reglas y el borrado de los miembros de combinaciones no
+    # emiten señales: se anotan antes para registrar su estado nuevo después
+    instance._reglas_afectadas = list(
+        ReglaPrecio.objects.filter(**{_REFERENCIAS_EN_REGLAS[sender]: instance}).values_list('pk', flat=True)
+    )
+    instance._combinaciones_afectadas = []
+    if sender is Articulo:
+        instance._combinaciones_afectadas = list(instance.combinaciones.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Articulo)
+@receiver(post_delete, sender=GrupoArticulo)
+@receiver(post_delete, sender=LineaArticulo)
+@receiver(post_delete, sender=CombinacionProducto)
+def registrar_afectados_por_baja(sender, instance, **kwargs):
+    if sender is Articulo:
+        cambios.registrar(instance, cambios.ELIMINADO)
+    cambios.registrar_reglas(getattr(instance, '_reglas_afectadas', []))
+    cambios.registrar_combinaciones(getattr(instance, '_combinaciones_afectadas', []))
+
+
+@receiver(m2m_changed, sender=CombinacionProducto.articulos.through)
+def registrar_miembros_combinacion(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._combinaciones_afectadas = list(instance.combinaciones.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        cambios.registrar_combinaciones([instance.pk])
+    elif action == 'post_clear':
+        cambios.registrar_combinaciones(getattr(instance, '_combinaciones_afectadas', []))
+    else:
+        cambios.registrar_combinaciones(pk_set)
@@ -0,0 +1,338 @@
+"""
+Simulación de cambios de reglas sobre una lista entera ("qué pasaría si").
+
+`POST /api/listas-precio/{id}/simular/` recibe reglas a agregar, modificar o eliminar
+y compara los precios finales de todos los artículos de la lista con las reglas
+actuales y con las propuestas, sin guardar nada.
+
+En lugar de evaluar artículo por artículo, los precios base y costos de la lista se
+cargan en arreglos de NumPy (en céntimos, como `float64`) y cada regla se aplica a
+todos los artículos a los que alcanza con operaciones sobre arreglos: las posiciones
+de un artículo, grupo o línea se buscan una vez por corrida. El orden de las reglas,
+las condiciones, el tope en 0 y la validación de costo son los del motor 'decimal'.
+La aritmética en coma flotante puede diferir del motor en menos de un céntimo antes
+de redondear; al comparar con el costo se tolera `TOLERANCIA` céntimos.
+
+Los arreglos de cada lista se guardan en memoria del proceso mientras no cambien sus
+generaciones (`generaciones.py`), así que varias simulaciones seguidas sobre la misma
+lista no vuelven a leer la base de datos.
+
+NumPy está en `requirements.txt`; si no está instalada, el endpoint responde 501.
+"""
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast, Coalesce
+
+from . import generaciones
+from .cache_reglas import consulta_miembros, obtener_conjunto_reglas
+from .evaluador_offline import CAMPOS_REGLA
+from .models import Articulo, PrecioArticulo
+from .motor import ConjuntoReglas, ReglaCompilada
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende del entorno
+    np = None
+
+TOLERANCIA = 1e-6
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 10000
+MAXIMO_LISTAS_EN_CACHE = 4
+
+ArreglosLista = namedtuple('ArreglosLista', ('ids', 'grupos', 'lineas', 'precios', 'costos'))
+
+
+class SimulacionInvalida(ValueError):
+    pass
+
+
+def disponible() -> bool:
+    return np is not None
+
+
+# --- Arreglos de la lista ---
+
+_lock = threading.Lock()
+_arreglos = {}  # lista_id -> (generaciones, ArreglosLista)
+
+
+def _leer_arreglos(lista_id: int) -> ArreglosLista:
+    """
+    Precios base y costos de la lista en céntimos, ordenados por artículo. Grupo y línea
+    nulos quedan en 0. Los importes se leen como REAL para no crear un Decimal por fila.
+    """
+    consulta = PrecioArticulo.objects.filter(lista_precio_id=lista_id).order_by('articulo_id').values_list(
+        'articulo_id',
+        Coalesce('articulo__grupo_id', Value(0)),
+        Coalesce('articulo__linea_id', Value(0)),
+        Cast('precio_base', FloatField()),
+        Cast('articulo__ultimo_costo', FloatField()),
+    )
+    # El SQL del QuerySet se ejecuta directamente: sin los conversores por fila del ORM,
+    # la lectura de 500.000 filas tarda la mitad
+    sql, parametros = consulta.query.sql_with_params()
+    with connections[consulta.db].cursor() as cursor:
+        cursor.execute(sql, parametros)
+        filas = cursor.fetchall()
+    datos = np.array(filas, dtype=np.float64).reshape(-1, 5)
+    enteros = datos[:, :3].astype(np.int64)
+    return ArreglosLista(
+        ids=enteros[:, 0], grupos=enteros[:, 1], lineas=enteros[:, 2],
+        # Los importes tienen dos decimales: en céntimos son enteros exactos
+        precios=np.round(datos[:, 3] * 100), costos=np.round(datos[:, 4] * 100),
+    )
+
+
+def obtener_arreglos(lista_id: int) -> ArreglosLista:
+    """
+    Arreglos de la lista, desde la memoria del proceso si sus generaciones no cambiaron.
+    Sin caché de resultados configurado no hay generaciones y se leen siempre.
+    """
+    if generaciones.alias_cache() is None:
+        return _leer_arreglos(lista_id)
+    actuales = generaciones.actuales(lista_id)
+    guardado = _arreglos.get(lista_id)
+    if guardado is not None and guardado[0] == actuales:
+        return guardado[1]
+    arreglos = _leer_arreglos(lista_id)
+    with _lock:
+        _arreglos.pop(lista_id, None)
+        while len(_arreglos) >= MAXIMO_LISTAS_EN_CACHE:
+            _arreglos.pop(next(iter(_arreglos)))
+        _arreglos[lista_id] = (actuales, arreglos)
+    return arreglos
+
+
+def invalidar_todo():
+    with _lock:
+        _arreglos.clear()
+
+
+# --- Reglas propuestas ---
+
+def reglas_propuestas(conjunto: ConjuntoReglas, agregar=(), modificar=(), eliminar=()) -> ConjuntoReglas:
+    """
+    `ConjuntoReglas` de la lista con los cambios aplicados. `agregar` y `modificar` son
+    diccionarios con los campos de `CAMPOS_REGLA` (`modificar`, con `id` y solo los que
+    cambian); `eliminar`, IDs. Las reglas nuevas reciben IDs posteriores a los
+    existentes, como al guardarlas, para desempatar igual por prioridad.
+    """
+    actuales = {regla.id: {campo: getattr(regla, campo) for campo in CAMPOS_REGLA} for regla in conjunto.reglas}
+    desconocidas = ({cambio['id'] for cambio in modificar} | set(eliminar)) - actuales.keys()
+    if desconocidas:
+        ids_texto = ', '.join(str(regla_id) for regla_id in sorted(desconocidas))
+        raise SimulacionInvalida(f"Las reglas ID {ids_texto} no pertenecen a la lista.")
+
+    for cambio in modificar:
+        actuales[cambio['id']].update(cambio)
+    for regla_id in eliminar:
+        del actuales[regla_id]
+    siguiente = max((regla.id for regla in conjunto.reglas), default=0) + 1
+    for desplazamiento, nueva in enumerate(agregar):
+        actuales[siguiente + desplazamiento] = {**nueva, 'id': siguiente + desplazamiento}
+
+    reglas = [ReglaCompilada(**datos) for datos in actuales.values()]
+    combinaciones = dict(conjunto.combinaciones)
+    faltantes = {regla.aplica_combinacion_id for regla in reglas} - combinaciones.keys() - {None}
+    # Una regla nueva puede usar una combinación de otra lista
+    for combinacion_id, articulo_id in consulta_miembros(faltantes) if faltantes else ():
+        miembros = combinaciones.setdefault(combinacion_id, set())
+        if articulo_id is not None:
+            miembros.add(articulo_id)
+    return ConjuntoReglas(conjunto.lista_id, reglas, combinaciones)
+
+
+# --- Evaluación vectorizada ---
+
+class _Posiciones:
+    """
+    Posiciones de artículos, grupos y líneas dentro de los arreglos, calculadas una vez por corrida.
+    """
+
+    def __init__(self, arreglos):
+        self.arreglos = arreglos
+        self._por_columna = {}
+
+    def de_articulos(self, articulos_ids):
+        ids = self.arreglos.ids
+        buscados = np.fromiter(articulos_ids, dtype=np.int64)
+        posiciones = np.searchsorted(ids, buscados)
+        posiciones = posiciones[posiciones < len(ids)]
+        return posiciones[np.isin(ids[posiciones], buscados)]
+
+    def de_valor(self, columna, valor):
+        clave = (columna, valor)
+        if clave not in self._por_columna:
+            self._por_columna[clave] = np.flatnonzero(getattr(self.arreglos, columna) == valor)
+        return self._por_columna[clave]
+
+
+def _alcance(regla, arreglos, posiciones, combinaciones, carrito):
+    """
+    Posiciones de los artículos a los que aplica la regla (None: todos), según sus
+    filtros de artículo, grupo y línea y, si es de combinación, los artículos que con
+    el carrito la completan.
+    """
+    alcance = None
+    if regla.aplica_articulo_id is not None:
+        alcance = posiciones.de_articulos((regla.aplica_articulo_id,))
+    for columna, valor in (('grupos', regla.aplica_grupo_id), ('lineas', regla.aplica_linea_id)):
+        if valor is None:
+            continue
+        if alcance is None:
+            alcance = posiciones.de_valor(columna, valor)
+        else:
+            alcance = alcance[getattr(arreglos, columna)[alcance] == valor]
+
+    if regla.aplica_combinacion_id:
+        miembros = combinaciones.get(regla.aplica_combinacion_id, frozenset())
+        # El artículo consultado cuenta como parte del carrito: completa la combinación
+        # si es el único miembro que falta
+        faltantes = miembros - carrito
+        completan = miembros if not faltantes else faltantes if len(faltantes) == 1 else ()
+        del_combo = posiciones.de_articulos(completan)
+        alcance = del_combo if alcance is None else np.intersect1d(alcance, del_combo, assume_unique=True)
+    return alcance
+
+
+def evaluar(arreglos: ArreglosLista, conjunto: ConjuntoReglas, cantidad: int, monto_pedido: Decimal, carrito=()):
+    """
+    Precios finales de todos los artículos de `arreglos` con las reglas de `conjunto`.
+    Devuelve `(precios, autorizado_bajo_costo, ajustado_a_costo)`: precios en céntimos
+    redondeados y máscaras booleanas.
+    """
+    precios = arreglos.precios.copy()
+    permiso = np.zeros(len(precios), dtype=bool)
+    posiciones = _Posiciones(arreglos)
+    carrito = frozenset(carrito)
+
+    for regla in conjunto.reglas:
+        # Las condiciones de cantidad y monto no dependen del artículo
+        if not regla.aplica_combinacion_id:
+            if regla.condicion == 'CANTIDAD_MINIMA':
+                if not cantidad >= regla.condicion_valor:
+                    continue
+            elif regla.condicion == 'MONTO_MINIMO':
+                if not monto_pedido >= regla.condicion_valor:
+                    continue
+            else:
+                continue
+
+        alcance = _alcance(regla, arreglos, posiciones, conjunto.combinaciones, carrito)
+        if alcance is None:
+            alcance = slice(None)
+        elif not len(alcance):
+            continue
+
+        sub = precios[alcance]
+        if regla.tipo_regla == 'PORCENTAJE':
+            sub -= sub * float(regla.factor_porcentaje)
+        elif regla.tipo_regla == 'MONTO_FIJO':
+            sub -= regla.valor_centesimos
+        np.maximum(sub, 0.0, out=sub)
+        precios[alcance] = sub
+        if regla.permite_venta_bajo_costo:
+            permiso[alcance] = True
+
+    bajo_costo = precios < arreglos.costos - TOLERANCIA
+    autorizado = bajo_costo & permiso
+    ajustado = bajo_costo & ~permiso
+    precios[ajustado] = arreglos.costos[ajustado]
+    return np.round(precios), autorizado, ajustado
+
+
+# --- Resultado ---
+
+def _importe(centimos) -> Decimal:
+    return Decimal(int(centimos)).scaleb(-2)
+
+
+def _resumen(arreglos, precios, autorizado, ajustado, cantidad):
+    ingreso = float(precios.sum()) * cantidad
+    margen = float((precios - arreglos.costos).sum()) * cantidad
+    return {
+        'ingreso': _importe(ingreso),
+        'margen': _importe(margen),
+        'margen_porcentual': round(margen / ingreso * 100, 2) if ingreso else None,
+        'con_descuento': int(np.count_nonzero(precios < arreglos.precios)),
+        'bajo_costo_autorizado': int(np.count_nonzero(autorizado)),
+        'ajustados_a_costo': int(np.count_nonzero(ajustado)),
+    }
+
+
+class SimulacionService:
+    """
+    Compara los precios finales de una lista con sus reglas actuales y con cambios propuestos.
+    """
+
+    @staticmethod
+    def simular(
+        lista, agregar=(), modificar=(), eliminar=(), cantidad: int = 1,
+        monto_pedido: Decimal = Decimal('0.00'), cart_items_ids=(), limite: int = LIMITE_POR_DEFECTO
+    ) -> dict:
+        """
+        Devuelve los totales de la lista con las reglas actuales y las propuestas, sus
+        diferencias y los artículos cuyo precio final cambia, hasta `limite`, de mayor a
+        menor pérdida de margen. Lanza `SimulacionInvalida` si se modifica o elimina una
+        regla de otra lista.
+        """
+        inicio = time.perf_counter()
+        # 1. Reglas actuales y propuestas
+        conjunto = obtener_conjunto_reglas(lista.id)
+        propuesto = reglas_propuestas(conjunto, agregar, modificar, eliminar)
+
+        # 2. Precios de todos los artículos en los dos escenarios
+        arreglos = obtener_arreglos(lista.id)
+        actual = evaluar(arreglos, conjunto, cantidad, monto_pedido, cart_items_ids)
+        nuevo = evaluar(arreglos, propuesto, cantidad, monto_pedido, cart_items_ids)
+
+        # 3. Totales y diferencias
+        resumen_actual = _resumen(arreglos, *actual, cantidad)
+        resumen_propuesto = _resumen(arreglos, *nuevo, cantidad)
+        diferencia = {
+            clave: resumen_propuesto[clave] - resumen_actual[clave]
+            for clave in ('ingreso', 'margen', 'con_descuento', 'bajo_costo_autorizado', 'ajustados_a_costo')
+        }
+        bajo_costo_actual = actual[1] | actual[2]
+        bajo_costo_nuevo = nuevo[1] | nuevo[2]
+        diferencia['nuevos_bajo_costo'] = int(np.count_nonzero(bajo_costo_nuevo & ~bajo_costo_actual))
+
+        # 4. Artículos afectados, los que más margen pierden primero
+        cambiados = np.flatnonzero(nuevo[0] != actual[0])
+        delta = nuevo[0][cambiados] - actual[0][cambiados]
+        mostrados = cambiados[np.argsort(delta, kind='stable')[:limite]]
+        skus = dict(
+            Articulo.objects.filter(pk__in=arreglos.ids[mostrados].tolist()).values_list('pk', 'sku')
+        ) if len(mostrados) else {}
+        articulos = [
+            {
+                'articulo_id': int(arreglos.ids[posicion]),
+                'sku': skus.get(int(arreglos.ids[posicion])),
+                'precio_base': _importe(arreglos.precios[posicion]),
+                'ultimo_costo': _importe(arreglos.costos[posicion]),
+                'precio_actual': _importe(actual[0][posicion]),
+                'precio_propuesto': _importe(nuevo[0][posicion]),
+                'diferencia_margen': _importe((nuevo[0][posicion] - actual[0][posicion]) * cantidad),
+                'bajo_costo_autorizado': bool(nuevo[1][posicion]),
+                'ajustado_a_costo': bool(nuevo[2][posicion]),
+            }
+            for posicion in mostrados
+        ]
+
+        return {
+            'lista_precio': lista.id,
+            'articulos': len(arreglos.ids),
+            'cantidad': cantidad,
+            'monto_pedido': monto_pedido,
+            'actual': resumen_actual,
+            'propuesto': resumen_propuesto,
+            'diferencia': diferencia,
+            'articulos_afectados': len(cambiados),
+            'detalle': articulos,
+            'segundos': round(time.perf_counter() - inicio, 3),
+        }
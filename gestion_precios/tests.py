@@ -1,3 +1,1641 @@
-from django.test import TestCase
+import json
+import random
+import subprocess
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import Q
+from django.test import AsyncClient, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from .models import (
+    Empresa, Sucursal, LineaArticulo, GrupoArticulo, Articulo,
+    ListaPrecio, PrecioArticulo, ReglaPrecio, CombinacionProducto, CambioPrecio, PrecioFinalMaterializado
+)
+from . import cache_listas, cache_precios, cache_reglas, cambios, generaciones, materializados, metricas, motor_sql, simulacion
+from .motor import ReglaCompilada, ConjuntoReglas
+from .evaluador_offline import EvaluadorOffline, PaqueteInvalido
+from .importacion import ImportacionPreciosService, leer_filas
+from .management.commands.generate_load_data import generar_datos_carga
+from .repreciado import RepreciadoService
+from .carga_masiva import (
+    CargaListasService, CargaReglasService, CargaCombinacionesService,
+    ListaPrecioCargaSerializer, ReglaPrecioCargaSerializer
+)
+from .serializers import ListaPrecioSerializer, ReglaPrecioSerializer
+from .services import PrecioService
+
+
+# Los niveles del memo en memoria: las pruebas no tocan el caché de archivos de desarrollo
+CACHES_PRUEBAS = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'precios_l1': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas-precios-l1'},
+    'precios_l2': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas-precios-l2'},
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBAS)
+class MotorPreciosTestCase(TestCase):
+    """
+    Datos base para las pruebas: una lista E-commerce con reglas por volumen,
+    por monto de pedido y una combinación Teclado + Mouse.
+    """
+
+    def setUp(self):
+        # Los IDs se reutilizan entre pruebas; cada prueba parte con cachés vacíos
+        cache_reglas.invalidar_todo()
+        cache_listas.invalidar_todo()
+        cache_precios.invalidar_todo()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nombre='Empresa Test')
+        cls.sucursal = Sucursal.objects.create(empresa=cls.empresa, nombre='Sucursal Lima')
+        cls.linea = LineaArticulo.objects.create(nombre='Tecnología')
+        cls.grupo = GrupoArticulo.objects.create(nombre='Periféricos')
+
+        cls.laptop = Articulo.objects.create(
+            linea=cls.linea, grupo=cls.grupo, sku='LAP-001',
+            nombre='Laptop', ultimo_costo=Decimal('1500.00')
+        )
+        cls.mouse = Articulo.objects.create(
+            linea=cls.linea, grupo=cls.grupo, sku='MOU-001',
+            nombre='Mouse', ultimo_costo=Decimal('80.00')
+        )
+        cls.teclado = Articulo.objects.create(
+            linea=cls.linea, grupo=cls.grupo, sku='TEC-001',
+            nombre='Teclado', ultimo_costo=Decimal('120.00')
+        )
+
+        cls.lista = ListaPrecio.objects.create(
+            empresa=cls.empresa, sucursal=cls.sucursal, nombre='Lista E-commerce',
+            canal_venta='ECOMMERCE', fecha_inicio_vigencia=date.today() - timedelta(days=30)
+        )
+        PrecioArticulo.objects.create(lista_precio=cls.lista, articulo=cls.laptop, precio_base=Decimal('2000.00'))
+        PrecioArticulo.objects.create(lista_precio=cls.lista, articulo=cls.mouse, precio_base=Decimal('120.00'))
+        PrecioArticulo.objects.create(lista_precio=cls.lista, articulo=cls.teclado, precio_base=Decimal('180.00'))
+
+        ReglaPrecio.objects.create(
+            lista_precio=cls.lista, nombre_regla='Descuento x3 Mouse', tipo_regla='MONTO_FIJO',
+            valor_regla=Decimal('10.00'), condicion='CANTIDAD_MINIMA', condicion_valor=Decimal('3'),
+            aplica_articulo=cls.mouse, prioridad=20
+        )
+        ReglaPrecio.objects.create(
+            lista_precio=cls.lista, nombre_regla='Descuento 10% en pedidos > 5000', tipo_regla='PORCENTAJE',
+            valor_regla=Decimal('10.00'), condicion='MONTO_MINIMO', condicion_valor=Decimal('5000.00'),
+            prioridad=100
+        )
+        cls.combo = CombinacionProducto.objects.create(lista_precio=cls.lista, nombre='Combo Teclado + Mouse')
+        cls.combo.articulos.add(cls.mouse, cls.teclado)
+        ReglaPrecio.objects.create(
+            lista_precio=cls.lista, nombre_regla='Descuento Combo Teclado+Mouse', tipo_regla='MONTO_FIJO',
+            valor_regla=Decimal('25.00'), condicion='CANTIDAD_MINIMA', condicion_valor=Decimal('1'),
+            aplica_combinacion=cls.combo, prioridad=5
+        )
+
+
+class CalcularCarritoTests(MotorPreciosTestCase):
+
+    def test_lineas_coinciden_con_calculo_individual(self):
+        items = [
+            {'articulo_id': self.laptop.id, 'cantidad': 2},
+            {'articulo_id': self.mouse.id, 'cantidad': 3},
+            {'articulo_id': self.teclado.id, 'cantidad': 1},
+        ]
+        resultado = PrecioService.calcular_carrito(
+            empresa_id=self.empresa.id, canal_venta='ECOMMERCE',
+            sucursal_id=self.sucursal.id, items=items
+        )
+        self.assertEqual(resultado['monto_pedido'], Decimal('4540.00'))
+
+        cart_items = [item['articulo_id'] for item in items]
+        for item, linea in zip(items, resultado['lineas']):
+            individual = PrecioService.calcular_precio_final(
+                empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                articulo_id=item['articulo_id'], cantidad=item['cantidad'],
+                monto_pedido=resultado['monto_pedido'], cart_items_ids=cart_items
+            )
+            self.assertEqual(linea['precio_final'], individual['precio_final'])
+            self.assertEqual(linea['reglas_aplicadas'], individual['reglas_aplicadas'])
+        self.assertEqual(resultado['total'], sum(linea['total'] for linea in resultado['lineas']))
+
+    def test_consultas_no_dependen_de_las_lineas(self):
+        def contar_consultas(items):
+            with CaptureQueriesContext(connection) as contexto:
+                PrecioService.calcular_carrito(
+                    empresa_id=self.empresa.id, canal_venta='ECOMMERCE',
+                    sucursal_id=self.sucursal.id, items=items
+                )
+            return len(contexto.captured_queries)
+
+        contar_consultas([{'articulo_id': self.mouse.id, 'cantidad': 1}])  # calienta el caché de reglas
+        una_linea = contar_consultas([{'articulo_id': self.mouse.id, 'cantidad': 1}])
+        tres_lineas = contar_consultas([
+            {'articulo_id': self.laptop.id, 'cantidad': 1},
+            {'articulo_id': self.mouse.id, 'cantidad': 4},
+            {'articulo_id': self.teclado.id, 'cantidad': 2},
+        ])
+        self.assertEqual(una_linea, tres_lineas)
+
+    def test_endpoint_carrito(self):
+        respuesta = APIClient().post('/api/calcular-carrito/', {
+            'empresa_id': self.empresa.id,
+            'canal_venta': 'ecommerce',
+            'sucursal_id': self.sucursal.id,
+            'items': [
+                {'articulo_id': self.mouse.id, 'cantidad': 1},
+                {'articulo_id': self.teclado.id, 'cantidad': 1},
+            ],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['lineas'][0]['precio_final'], '95.00')
+        self.assertEqual(respuesta.data['total'], '250.00')
+
+    def test_articulo_sin_precio_devuelve_404(self):
+        silla = Articulo.objects.create(
+            linea=self.linea, grupo=self.grupo, sku='SIL-001', nombre='Silla'
+        )
+        respuesta = APIClient().post('/api/calcular-carrito/', {
+            'empresa_id': self.empresa.id,
+            'canal_venta': 'ECOMMERCE',
+            'sucursal_id': self.sucursal.id,
+            'items': [{'articulo_id': silla.id, 'cantidad': 1}],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class CurvaPrecioTests(MotorPreciosTestCase):
+
+    def test_tramos_iguales_al_carrito_de_una_linea(self):
+        # Con 10+ mouses el precio llega al costo; con el 10% por monto (42+) queda bajo costo
+        ReglaPrecio.objects.create(
+            lista_precio=self.lista, nombre_regla='Descuento x10 Mouse', tipo_regla='MONTO_FIJO',
+            valor_regla=Decimal('30.00'), condicion='CANTIDAD_MINIMA', condicion_valor=Decimal('10'),
+            aplica_articulo=self.mouse, prioridad=30
+        )
+        curva = PrecioService.curva_precio(
+            empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+            articulo_id=self.mouse.id
+        )
+        self.assertEqual(
+            [(tramo['cantidad_desde'], tramo['cantidad_hasta'], tramo['precio_final']) for tramo in curva['tramos']],
+            [(1, 2, Decimal('120.00')), (3, 9, Decimal('110.00')), (10, 41, Decimal('80.00')), (42, None, Decimal('80.00'))],
+        )
+        self.assertEqual(curva['tramos'][-1]['reglas_aplicadas'][-1], "Ajuste a costo mínimo (no autorizado bajo costo)")
+
+        # Cada cantidad cae en el tramo que da el carrito con esa única línea
+        for articulo in (self.laptop, self.mouse):
+            curva = PrecioService.curva_precio(
+                empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                articulo_id=articulo.id
+            )
+            for cantidad in range(1, 50):
+                tramo = next(
+                    tramo for tramo in curva['tramos']
+                    if tramo['cantidad_desde'] <= cantidad and (tramo['cantidad_hasta'] or cantidad) >= cantidad
+                )
+                linea, = PrecioService.calcular_carrito(
+                    empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                    items=[{'articulo_id': articulo.id, 'cantidad': cantidad}]
+                )['lineas']
+                for campo in ('precio_final', 'reglas_aplicadas', 'autorizado_bajo_costo'):
+                    self.assertEqual(tramo[campo], linea[campo])
+
+    def test_precio_base_cero(self):
+        muestra = Articulo.objects.create(
+            linea=self.linea, grupo=self.grupo, sku='MUE-001', nombre='Muestra', ultimo_costo=Decimal('0.00')
+        )
+        PrecioArticulo.objects.create(lista_precio=self.lista, articulo=muestra, precio_base=Decimal('0.00'))
+        ReglaPrecio.objects.create(
+            lista_precio=self.lista, nombre_regla='Muestra x5', tipo_regla='MONTO_FIJO',
+            valor_regla=Decimal('1.00'), condicion='CANTIDAD_MINIMA', condicion_valor=Decimal('5'),
+            aplica_articulo=muestra, prioridad=30
+        )
+        curva = PrecioService.curva_precio(
+            empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+            articulo_id=muestra.id
+        )
+        # El descuento por monto nunca se alcanza; el de cantidad sí marca un tramo
+        self.assertEqual(
+            [(tramo['cantidad_desde'], tramo['cantidad_hasta'], tramo['reglas_aplicadas']) for tramo in curva['tramos']],
+            [(1, 4, []), (5, None, ['Muestra x5'])],
+        )
+
+    def test_endpoint_curva(self):
+        cliente = APIClient()
+        respuesta = cliente.get('/api/curva-precio/', {
+            'empresa_id': self.empresa.id, 'canal_venta': 'ecommerce', 'sucursal_id': self.sucursal.id,
+            'articulo_id': self.laptop.id,
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        # 5000 / 2000 = 2,5: el descuento por monto empieza con 3 laptops
+        self.assertEqual(
+            [(tramo['cantidad_desde'], tramo['cantidad_hasta'], tramo['precio_final']) for tramo in respuesta.data['tramos']],
+            [(1, 2, '2000.00'), (3, None, '1800.00')],
+        )
+
+        respuesta = cliente.get('/api/curva-precio/', {'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE'})
+        self.assertEqual(respuesta.status_code, 400)
+        silla = Articulo.objects.create(linea=self.linea, grupo=self.grupo, sku='SIL-001', nombre='Silla')
+        respuesta = cliente.get('/api/curva-precio/', {
+            'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE', 'sucursal_id': self.sucursal.id,
+            'articulo_id': silla.id,
+        })
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class CacheReglasTests(MotorPreciosTestCase):
+
+    def calcular_mouse(self):
+        return PrecioService.calcular_precio_final(
+            empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+            articulo_id=self.mouse.id, cantidad=3
+        )
+
+    def test_acierto_no_consulta_tabla_de_reglas(self):
+        self.calcular_mouse()
+        antes = cache_reglas.estadisticas()
+        with CaptureQueriesContext(connection) as contexto:
+            self.calcular_mouse()
+        tablas = ' '.join(consulta['sql'] for consulta in contexto.captured_queries)
+        self.assertNotIn('gestion_precios_reglaprecio', tablas)
+        self.assertEqual(cache_reglas.estadisticas()['aciertos'], antes['aciertos'] + 1)
+
+    def test_senales_invalidan_y_reconstruyen(self):
+        self.assertEqual(self.calcular_mouse()['precio_final'], Decimal('110.00'))
+        antes = cache_reglas.estadisticas()
+        ReglaPrecio.objects.create(
+            lista_precio=self.lista, nombre_regla='Mouse 5%', tipo_regla='PORCENTAJE',
+            valor_regla=Decimal('5.00'), condicion='CANTIDAD_MINIMA', condicion_valor=Decimal('1'),
+            prioridad=1
+        )
+        self.assertEqual(self.calcular_mouse()['precio_final'], Decimal('104.00'))
+        self.assertEqual(cache_reglas.estadisticas()['reconstrucciones'], antes['reconstrucciones'] + 1)
+
+        self.combo.articulos.remove(self.teclado)
+        resultado = self.calcular_mouse()
+        self.assertIn('Descuento Combo Teclado+Mouse', resultado['reglas_aplicadas'])
+
+    def test_escritura_en_otro_worker_recompila(self):
+        self.assertEqual(self.calcular_mouse()['precio_final'], Decimal('110.00'))
+        # Otro worker cambia la regla: aquí solo se ve su generación en el caché compartido
+        ReglaPrecio.objects.filter(lista_precio=self.lista, condicion='CANTIDAD_MINIMA').update(
+            valor_regla=Decimal('20.00')
+        )
+        generaciones.incrementar_lista(self.lista.id)
+        self.assertEqual(self.calcular_mouse()['precio_final'], Decimal('100.00'))
+
+    def test_conjunto_compilado_durante_una_invalidacion_no_se_guarda(self):
+        compilar = cache_reglas.compilar_reglas
+
+        def con_escritura(lista_id):
+            conjunto = compilar(lista_id)
+            cache_reglas.invalidar_lista(lista_id)  # Llega tras la lectura
+            return conjunto
+
+        with mock.patch.object(cache_reglas, 'compilar_reglas', con_escritura):
+            cache_reglas.obtener_conjunto_reglas(self.lista.id)
+        antes = cache_reglas.estadisticas()
+        cache_reglas.obtener_conjunto_reglas(self.lista.id)
+        self.assertEqual(cache_reglas.estadisticas()['fallos'], antes['fallos'] + 1)
+
+
+class CachePreciosTests(MotorPreciosTestCase):
+
+    def calcular(self, articulo, cantidad, canal='ECOMMERCE', **kwargs):
+        return PrecioService.calcular_precio_final(
+            empresa_id=self.empresa.id, canal_venta=canal, sucursal_id=self.sucursal.id,
+            articulo_id=articulo.id, cantidad=cantidad, **kwargs
+        )
+
+    def test_consulta_equivalente_sin_consultas(self):
+        primero = self.calcular(self.mouse, 3)
+        # 7 unidades caen en el mismo tramo que 3 (umbral de cantidad: 3)
+        with self.assertNumQueries(0):
+            segundo = self.calcular(self.mouse, 7, monto_pedido=Decimal('4999.99'))
+        self.assertEqual(segundo['precio_final'], primero['precio_final'])
+        self.assertEqual(segundo['reglas_aplicadas'], primero['reglas_aplicadas'])
+        self.assertEqual(segundo['total'], primero['precio_final'] * 7)
+
+        # Otro tramo de cantidad, de monto o de combinaciones: se calcula de nuevo
+        self.assertEqual(self.calcular(self.mouse, 2)['precio_final'], Decimal('120.00'))
+        self.assertEqual(self.calcular(self.mouse, 3, monto_pedido=Decimal('5000'))['precio_final'], Decimal('99.00'))
+        self.assertEqual(
+            self.calcular(self.mouse, 3, cart_items_ids=[self.teclado.id])['precio_final'], Decimal('85.00')
+        )
+
+    def test_escritura_invalida_solo_su_lista(self):
+        tienda = ListaPrecio.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, nombre='Lista Tienda',
+            canal_venta='TIENDA', fecha_inicio_vigencia=date.today() - timedelta(days=30)
+        )
+        PrecioArticulo.objects.create(lista_precio=tienda, articulo=self.mouse, precio_base=Decimal('130.00'))
+        self.calcular(self.mouse, 1)
+        self.calcular(self.mouse, 1, canal='TIENDA')
+
+        precio = PrecioArticulo.objects.get(lista_precio=self.lista, articulo=self.mouse)
+        precio.precio_base = Decimal('150.00')
+        precio.save()
+        self.assertEqual(self.calcular(self.mouse, 1)['precio_final'], Decimal('150.00'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.calcular(self.mouse, 1, canal='TIENDA')['precio_final'], Decimal('130.00'))
+
+        ReglaPrecio.objects.create(
+            lista_precio=tienda, nombre_regla='Tienda 10%', tipo_regla='PORCENTAJE',
+            valor_regla=Decimal('10.00'), condicion='CANTIDAD_MINIMA', condicion_valor=Decimal('1'),
+            prioridad=1
+        )
+        self.assertEqual(self.calcular(self.mouse, 1, canal='TIENDA')['precio_final'], Decimal('117.00'))
+        with self.assertNumQueries(0):
+            self.calcular(self.mouse, 1)
+
+    def test_catalogo_invalida_todas_las_listas(self):
+        self.calcular(self.mouse, 1)
+        self.mouse.ultimo_costo = Decimal('125.00')
+        self.mouse.save()
+        resultado = self.calcular(self.mouse, 1)
+        self.assertEqual(resultado['precio_final'], Decimal('125.00'))
+        self.assertIn('Ajuste a costo mínimo (no autorizado bajo costo)', resultado['reglas_aplicadas'])
+
+
+class ListaVigenteTests(MotorPreciosTestCase):
+
+    def resolver(self, canal_venta='ECOMMERCE', sucursal_id=None):
+        return PrecioService.obtener_lista_vigente(
+            empresa_id=self.empresa.id, canal_venta=canal_venta, sucursal_id=sucursal_id
+        )
+
+    def test_prioriza_la_lista_mas_especifica(self):
+        hoy = date.today()
+        empresa_todos = ListaPrecio.objects.create(
+            empresa=self.empresa, nombre='Empresa Todos', canal_venta='TODOS', fecha_inicio_vigencia=hoy
+        )
+        sucursal_todos = ListaPrecio.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, nombre='Sucursal Todos',
+            canal_venta='TODOS', fecha_inicio_vigencia=hoy
+        )
+        self.assertEqual(self.resolver(sucursal_id=self.sucursal.id), self.lista)
+        self.assertEqual(self.resolver(canal_venta='TIENDA', sucursal_id=self.sucursal.id), sucursal_todos)
+        self.assertEqual(self.resolver(canal_venta='TIENDA'), empresa_todos)
+
+    def test_una_consulta_en_fallo_y_ninguna_en_acierto(self):
+        with self.assertNumQueries(1):
+            self.resolver(sucursal_id=self.sucursal.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolver(sucursal_id=self.sucursal.id), self.lista)
+
+    def lista_directa(self, canal_venta, sucursal_id, fecha):
+        """
+        Resolución de referencia, sin índice: la más específica de las candidatas ya vigentes.
+        """
+        candidatas = PrecioService._candidatas_lista_vigente(
+            empresa_id=self.empresa.id, canal_venta=canal_venta, sucursal_id=sucursal_id
+        ).filter(
+            Q(fecha_fin_vigencia__gte=fecha) | Q(fecha_fin_vigencia__isnull=True), fecha_inicio_vigencia__lte=fecha
+        )
+        return candidatas.first()
+
+    def test_cambia_en_los_limites_de_vigencia(self):
+        hoy = date.today()
+        ListaPrecio.objects.filter(pk=self.lista.pk).update(fecha_fin_vigencia=hoy + timedelta(days=5))
+        # Misma especificidad y mayor ID: no desplaza a la lista actual
+        futura = ListaPrecio.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, nombre='Lista Futura',
+            canal_venta='ECOMMERCE', fecha_inicio_vigencia=hoy + timedelta(days=3)
+        )
+        # Una lista futura más específica sí la desplaza cuando empieza
+        empresa_todos = ListaPrecio.objects.create(
+            empresa=self.empresa, nombre='Empresa Todos', canal_venta='TODOS', fecha_inicio_vigencia=hoy
+        )
+        sucursal_todos = ListaPrecio.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, nombre='Sucursal Todos Futura',
+            canal_venta='TODOS', fecha_inicio_vigencia=hoy + timedelta(days=2)
+        )
+        esperadas = {
+            'ECOMMERCE': ((0, self.lista), (5, self.lista), (6, futura)),
+            'TIENDA': ((0, empresa_todos), (1, empresa_todos), (2, sucursal_todos)),
+        }
+        for canal_venta, casos in esperadas.items():
+            for dias, esperada in casos:
+                lista = PrecioService.obtener_lista_vigente(
+                    empresa_id=self.empresa.id, canal_venta=canal_venta, sucursal_id=self.sucursal.id,
+                    fecha=hoy + timedelta(days=dias)
+                )
+                self.assertEqual(lista, esperada, (canal_venta, dias))
+
+    def test_escritura_invalida_la_resolucion(self):
+        self.assertEqual(self.resolver(sucursal_id=self.sucursal.id), self.lista)
+        self.lista.activa = False
+        self.lista.save()
+        self.assertIsNone(self.resolver(sucursal_id=self.sucursal.id))
+
+    def test_escritura_en_otro_worker_invalida_el_indice(self):
+        self.assertEqual(self.resolver(sucursal_id=self.sucursal.id), self.lista)
+        # Otro worker desactiva la lista: aquí solo se ve su generación en el caché compartido
+        ListaPrecio.objects.filter(pk=self.lista.pk).update(activa=False)
+        generaciones.incrementar_empresa(self.empresa.id)
+        self.assertIsNone(self.resolver(sucursal_id=self.sucursal.id))
+
+    def test_indice_construido_durante_una_invalidacion_no_se_guarda(self):
+        candidatas = PrecioService._candidatas_lista_vigente
+
+        def con_escritura(**kwargs):
+            consulta = list(candidatas(**kwargs))
+            cache_listas.invalidar_empresa(self.empresa.id)  # Llega tras la lectura
+            return consulta
+
+        with mock.patch.object(PrecioService, '_candidatas_lista_vigente', staticmethod(con_escritura)):
+            self.assertEqual(self.resolver(sucursal_id=self.sucursal.id), self.lista)
+        with self.assertNumQueries(1):
+            self.resolver(sucursal_id=self.sucursal.id)
+
+    def test_fecha_pasada_y_futura_sin_consultas(self):
+        hoy = date.today()
+        ListaPrecio.objects.filter(pk=self.lista.pk).update(fecha_fin_vigencia=hoy + timedelta(days=9))
+        futura = ListaPrecio.objects.create(
+            empresa=self.empresa, sucursal=self.sucursal, nombre='Lista Futura',
+            canal_venta='ECOMMERCE', fecha_inicio_vigencia=hoy + timedelta(days=10)
+        )
+        self.assertEqual(self.resolver(sucursal_id=self.sucursal.id), self.lista)
+        with self.assertNumQueries(0):
+            for dias, esperada in ((-31, None), (-30, self.lista), (9, self.lista), (10, futura), (400, futura)):
+                lista = PrecioService.obtener_lista_vigente(
+                    empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                    fecha=hoy + timedelta(days=dias)
+                )
+                self.assertEqual(lista, esperada, dias)
+
+    def test_indice_coincide_con_la_consulta_directa(self):
+        azar = random.Random(7)
+        hoy = date.today()
+        for numero in range(25):
+            inicio = hoy + timedelta(days=azar.randint(-60, 60))
+            ListaPrecio.objects.create(
+                empresa=self.empresa, sucursal=azar.choice([self.sucursal, None]), nombre=f'Lista {numero}',
+                canal_venta=azar.choice(['ECOMMERCE', 'TIENDA', 'TODOS']), fecha_inicio_vigencia=inicio,
+                fecha_fin_vigencia=azar.choice([None, inicio + timedelta(days=azar.randint(-1, 40))]),
+                activa=azar.random() > 0.1,
+            )
+        for canal_venta in ('ECOMMERCE', 'TIENDA'):
+            for sucursal_id in (self.sucursal.id, None):
+                for dias in range(-70, 110, 3):
+                    fecha = hoy + timedelta(days=dias)
+                    esperada = self.lista_directa(canal_venta, sucursal_id, fecha)
+                    lista = PrecioService.obtener_lista_vigente(
+                        empresa_id=self.empresa.id, canal_venta=canal_venta, sucursal_id=sucursal_id, fecha=fecha
+                    )
+                    self.assertEqual(lista, esperada, (canal_venta, sucursal_id, fecha))
+
+    def test_parametro_fecha_en_la_api(self):
+        cliente = APIClient()
+        parametros = {'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE', 'sucursal_id': self.sucursal.id}
+        pasado = (date.today() - timedelta(days=31)).isoformat()
+        self.assertEqual(cliente.get('/api/lista-vigente/', parametros).status_code, 200)
+        self.assertEqual(cliente.get('/api/lista-vigente/', {**parametros, 'fecha': pasado}).status_code, 404)
+        self.assertEqual(cliente.get('/api/lista-vigente/', {**parametros, 'fecha': '31/12/2025'}).status_code, 400)
+        respuesta = cliente.get('/api/calcular-precio/', {
+            **parametros, 'articulo_id': self.mouse.id, 'cantidad': 1, 'fecha': pasado
+        })
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class IndiceReglasTests(MotorPreciosTestCase):
+
+    def calcular(self, articulo, cantidad=1):
+        return PrecioService.calcular_precio_final(
+            empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+            articulo_id=articulo.id, cantidad=cantidad
+        )
+
+    def test_respeta_aplica_articulo_grupo_y_linea(self):
+        otro_grupo = GrupoArticulo.objects.create(nombre='Accesorios')
+        ReglaPrecio.objects.create(
+            lista_precio=self.lista, nombre_regla='Accesorios 50%', tipo_regla='PORCENTAJE',
+            valor_regla=Decimal('50.00'), condicion='CANTIDAD_MINIMA', condicion_valor=Decimal('1'),
+            aplica_grupo=otro_grupo, prioridad=1
+        )
+        ReglaPrecio.objects.create(
+            lista_precio=self.lista, nombre_regla='Tecnología 1%', tipo_regla='PORCENTAJE',
+            valor_regla=Decimal('1.00'), condicion='CANTIDAD_MINIMA', condicion_valor=Decimal('1'),
+            aplica_linea=self.linea, aplica_grupo=self.grupo, prioridad=2
+        )
+        # La regla del mouse (aplica_articulo) ya no se aplica a la laptop
+        self.assertEqual(self.calcular(self.laptop, cantidad=3)['reglas_aplicadas'], ['Tecnología 1%'])
+        self.assertEqual(
+            self.calcular(self.mouse, cantidad=3)['reglas_aplicadas'],
+            ['Tecnología 1%', 'Descuento x3 Mouse']
+        )
+
+    def test_mezcla_cubetas_en_orden_de_prioridad(self):
+        def regla(id, prioridad, **ambito):
+            return ReglaCompilada(
+                id=id, nombre_regla=f'R{id}', tipo_regla='MONTO_FIJO', valor_regla='1',
+                condicion='CANTIDAD_MINIMA', condicion_valor='1', prioridad=prioridad, **ambito
+            )
+        conjunto = ConjuntoReglas(1, [
+            regla(1, 50),
+            regla(2, 10, aplica_articulo_id=7),
+            regla(3, 30, aplica_grupo_id=2),
+            regla(4, 20, aplica_linea_id=3),
+            regla(5, 5, aplica_combinacion_id=9),
+            regla(6, 1, aplica_articulo_id=8),
+            regla(7, 40, aplica_articulo_id=7, aplica_grupo_id=99),
+        ], {9: {7, 8}})
+        ids = [r.id for r in conjunto.reglas_para(7, grupo_id=2, linea_id=3)]
+        self.assertEqual(ids, [5, 2, 4, 3, 1])
+        self.assertEqual([r.id for r in conjunto.reglas_para(10)], [1])
+
+    def test_combinaciones_satisfechas_por_bitset(self):
+        conjunto = ConjuntoReglas(1, [], {1: {10, 11}, 2: {11, 12, 13}, 3: {10}, 4: set()})
+        self.assertEqual(conjunto.combinaciones_satisfechas({10, 11, 99}), frozenset({1, 3, 4}))
+        self.assertEqual(conjunto.combinaciones_satisfechas({11, 12, 13}), frozenset({2, 4}))
+        self.assertEqual(ConjuntoReglas(1, [], {}).combinaciones_satisfechas({1}), frozenset())
+
+
+class MotorCentimosEquivalenciaTests(SimpleTestCase):
+    """
+    El motor en enteros debe producir exactamente lo mismo que el motor Decimal
+    sobre conjuntos de reglas aleatorios.
+    """
+    CENTIMO = Decimal('0.01')
+
+    def regla_aleatoria(self, azar, id, articulos, combinaciones):
+        ambito = {}
+        tipo_ambito = azar.random()
+        if tipo_ambito < 0.2:
+            ambito['aplica_articulo_id'] = azar.choice(articulos)
+        elif tipo_ambito < 0.35:
+            ambito['aplica_grupo_id'] = azar.randint(1, 3)
+        elif tipo_ambito < 0.5:
+            ambito['aplica_linea_id'] = azar.randint(1, 2)
+        elif tipo_ambito < 0.65 and combinaciones:
+            ambito['aplica_combinacion_id'] = azar.choice(list(combinaciones))
+
+        tipo_regla = azar.choice(['PORCENTAJE', 'MONTO_FIJO'])
+        if tipo_regla == 'PORCENTAJE':
+            valor = Decimal(azar.randint(1, 9000)) / 100
+        else:
+            valor = Decimal(azar.randint(1, 50000)) / 100
+        condicion = azar.choice(['CANTIDAD_MINIMA', 'MONTO_MINIMO'])
+        if condicion == 'CANTIDAD_MINIMA':
+            condicion_valor = Decimal(azar.randint(1, 10))
+        else:
+            condicion_valor = Decimal(azar.randint(0, 500000)) / 100
+
+        return ReglaCompilada(
+            id=id, nombre_regla=f'Regla {id}', tipo_regla=tipo_regla, valor_regla=valor,
+            condicion=condicion, condicion_valor=condicion_valor, prioridad=azar.randint(1, 20),
+            permite_venta_bajo_costo=azar.random() < 0.3, **ambito
+        )
+
+    def test_equivalencia_con_motor_decimal(self):
+        azar = random.Random(20251020)
+        articulos_ids = list(range(1, 31))
+        for caso in range(200):
+            combinaciones = {
+                100 + indice: set(azar.sample(articulos_ids, azar.randint(1, 4)))
+                for indice in range(azar.randint(0, 4))
+            }
+            reglas = [
+                self.regla_aleatoria(azar, id, articulos_ids, combinaciones)
+                for id in range(1, azar.randint(1, 12))
+            ]
+            conjunto = ConjuntoReglas(1, reglas, combinaciones)
+
+            for _ in range(10):
+                articulo = SimpleNamespace(
+                    id=azar.choice(articulos_ids), grupo_id=azar.randint(1, 3), linea_id=azar.randint(1, 2)
+                )
+                carrito = set(azar.sample(articulos_ids, azar.randint(0, 8))) | {articulo.id}
+                argumentos = dict(
+                    conjunto=conjunto,
+                    articulo=articulo,
+                    precio_base=Decimal(azar.randint(1, 500000)) / 100,
+                    ultimo_costo=Decimal(azar.randint(0, 400000)) / 100,
+                    cantidad=azar.randint(1, 12),
+                    monto_pedido=Decimal(azar.randint(0, 6000000)) / 1000,
+                    combinaciones_satisfechas=conjunto.combinaciones_satisfechas(carrito),
+                )
+                precio_d, reglas_d, autorizado_d = PrecioService._aplicar_reglas(**argumentos)
+                precio_c, reglas_c, autorizado_c = PrecioService._aplicar_reglas_centimos(**argumentos)
+
+                mensaje = f'caso {caso}: {argumentos}'
+                self.assertEqual(reglas_c, reglas_d, mensaje)
+                self.assertEqual(autorizado_c, autorizado_d, mensaje)
+                self.assertEqual(precio_c.quantize(self.CENTIMO), precio_d.quantize(self.CENTIMO), mensaje)
+                total = argumentos['cantidad']
+                self.assertEqual(
+                    (precio_c * total).quantize(self.CENTIMO), (precio_d * total).quantize(self.CENTIMO), mensaje
+                )
+                self.assertLess(abs(precio_c - precio_d), Decimal('1e-18'), mensaje)
+
+    def test_motor_desconocido(self):
+        with self.assertRaises(ValueError):
+            PrecioService._evaluador('flotante')
+
+
+class MotorCentimosServicioTests(MotorPreciosTestCase):
+
+    def test_calculo_completo_con_motor_centimos(self):
+        for motor in ('decimal', 'centimos'):
+            resultado = PrecioService.calcular_carrito(
+                empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                items=[
+                    {'articulo_id': self.laptop.id, 'cantidad': 3},
+                    {'articulo_id': self.mouse.id, 'cantidad': 3},
+                    {'articulo_id': self.teclado.id, 'cantidad': 1},
+                ],
+                motor=motor
+            )
+            self.assertEqual(resultado['total'], Decimal('5779.50'), motor)
+
+
+class ImportacionPreciosTests(MotorPreciosTestCase):
+
+    def test_upsert_csv_con_errores_por_fila(self):
+        lineas = [
+            'precio_base,sku\n',
+            '2100.00,LAP-001\n',      # actualiza
+            '99.90,MOU-001\n',
+            '95.00,MOU-001\n',        # repetido: gana la última fila
+            '10.00,NO-EXISTE\n',
+            'abc,TEC-001\n',
+            '1.005,TEC-001\n',
+        ]
+        resumen = ImportacionPreciosService.importar(self.lista, leer_filas(lineas, 'csv'), lote=2)
+
+        self.assertEqual(resumen['filas_procesadas'], 6)
+        self.assertEqual(resumen['filas_importadas'], 3)
+        self.assertEqual([error['fila'] for error in resumen['errores']], [5, 6, 7])
+        precios = dict(PrecioArticulo.objects.filter(lista_precio=self.lista).values_list('articulo__sku', 'precio_base'))
+        self.assertEqual(precios, {
+            'LAP-001': Decimal('2100.00'), 'MOU-001': Decimal('95.00'), 'TEC-001': Decimal('180.00'),
+        })
+
+    def test_endpoint_ndjson_crea_precios_en_lista_nueva(self):
+        lista = ListaPrecio.objects.create(
+            empresa=self.empresa, nombre='Lista Tienda', canal_venta='TIENDA',
+            fecha_inicio_vigencia=date.today()
+        )
+        cuerpo = (
+            '{"sku": "LAP-001", "precio_base": "1999.99"}\n'
+            '{"sku": "MOU-001", "precio_base": 110}\n'
+            'no es json\n'
+        )
+        respuesta = APIClient().post(
+            f'/api/listas-precio/{lista.id}/importar/', cuerpo, content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['filas_importadas'], 2)
+        self.assertEqual(respuesta.data['errores'][0]['fila'], 3)
+        self.assertEqual(
+            PrecioArticulo.objects.get(lista_precio=lista, articulo=self.laptop).precio_base, Decimal('1999.99')
+        )
+
+
+class CargaMasivaListasTests(MotorPreciosTestCase):
+
+    def datos_lista(self, nombre, inicio, fin=None, **extra):
+        return {
+            'nombre': nombre, 'empresa': self.empresa.id, 'sucursal': self.sucursal.id,
+            'canal_venta': 'ECOMMERCE', 'fecha_inicio_vigencia': inicio.isoformat(),
+            'fecha_fin_vigencia': fin.isoformat() if fin else None, **extra,
+        }
+
+    def test_mismo_rechazo_que_el_alta_individual(self):
+        azar = random.Random(3)
+        hoy = date.today()
+        ListaPrecio.objects.filter(pk=self.lista.pk).update(fecha_fin_vigencia=hoy - timedelta(days=1))
+        for numero in range(6):
+            inicio = hoy + timedelta(days=azar.randint(0, 90))
+            ListaPrecio.objects.create(
+                empresa=self.empresa, sucursal=self.sucursal, nombre=f'Existente {numero}', canal_venta='ECOMMERCE',
+                fecha_inicio_vigencia=inicio, fecha_fin_vigencia=inicio + timedelta(days=azar.randint(0, 15)),
+                activa=azar.random() > 0.2,
+            )
+
+        for numero in range(150):
+            inicio = hoy + timedelta(days=azar.randint(-40, 120))
+            fin = azar.choice([None, inicio + timedelta(days=azar.randint(0, 20))])
+            item = self.datos_lista(f'Nueva {numero}', inicio, fin)
+            esperado = ListaPrecioSerializer(data=item).is_valid()
+
+            validada = ListaPrecioCargaSerializer(data=item)
+            self.assertTrue(validada.is_valid())
+            errores = {}
+            CargaListasService._validar_solapamientos({0: validada.validated_data}, errores)
+            self.assertEqual(not errores, esperado, item)
+
+    def test_informa_todos_los_conflictos_sin_crear_nada(self):
+        hoy = date.today()
+        ListaPrecio.objects.filter(pk=self.lista.pk).update(fecha_fin_vigencia=hoy + timedelta(days=30))
+        datos = [
+            self.datos_lista('Verano', hoy + timedelta(days=100), hoy + timedelta(days=130)),
+            self.datos_lista('Verano bis', hoy + timedelta(days=120), hoy + timedelta(days=140)),
+            self.datos_lista('Abierta', hoy + timedelta(days=200)),       # sin fin: compite con todas
+            self.datos_lista('Empresa', hoy, empresa=999999),
+            self.datos_lista('Otro canal', hoy, hoy + timedelta(days=5), canal_venta='TIENDA'),
+        ]
+        with self.assertNumQueries(5):
+            resumen = CargaListasService.crear_listas(datos)
+
+        self.assertEqual(resumen['listas_creadas'], 0)
+        errores = {error['indice']: error['errores'] for error in resumen['errores']}
+        self.assertEqual(sorted(errores), [1, 2, 3])
+        self.assertIn("(índice 0)", errores[1]['non_field_errors'][0])
+        self.assertEqual(len(errores[2]['non_field_errors']), 3)  # lista existente + las dos anteriores
+        self.assertIn('empresa', errores[3])
+        self.assertFalse(ListaPrecio.objects.filter(nombre='Otro canal').exists())
+
+    def test_endpoint_crea_e_invalida_la_resolucion(self):
+        hoy = date.today()
+        PrecioService.obtener_lista_vigente(empresa_id=self.empresa.id, canal_venta='TIENDA')
+        datos = [
+            self.datos_lista(f'Temporada {mes}', hoy + timedelta(days=30 * mes), hoy + timedelta(days=30 * mes + 29),
+                             sucursal=None, canal_venta='TIENDA')
+            for mes in range(12)
+        ]
+        respuesta = APIClient().post('/api/listas-precio/bulk/', datos, format='json')
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(len(respuesta.data['ids']), 12)
+        self.assertEqual(
+            PrecioService.obtener_lista_vigente(empresa_id=self.empresa.id, canal_venta='TIENDA').nombre, 'Temporada 0'
+        )
+
+
+class CargaMasivaReglasTests(MotorPreciosTestCase):
+
+    def datos_regla(self, nombre, condicion_valor='3', **extra):
+        return {
+            'lista_precio': self.lista.id, 'nombre_regla': nombre, 'tipo_regla': 'MONTO_FIJO',
+            'valor_regla': '5.00', 'condicion': 'CANTIDAD_MINIMA', 'condicion_valor': condicion_valor, **extra,
+        }
+
+    def test_mismo_rechazo_que_el_alta_individual(self):
+        azar = random.Random(5)
+        opciones = {
+            'aplica_articulo': [None, self.mouse.id, self.teclado.id],
+            'aplica_grupo': [None, self.grupo.id],
+            'aplica_combinacion': [None, self.combo.id],
+        }
+        for numero in range(120):
+            item = self.datos_regla(f'Regla {numero}', condicion_valor=azar.choice(['1', '3', '3.00', '4']))
+            for campo, valores in opciones.items():
+                if azar.random() < 0.6:  # los campos ausentes no se comparan
+                    item[campo] = azar.choice(valores)
+            esperado = ReglaPrecioSerializer(data=item).is_valid()
+
+            validada = ReglaPrecioCargaSerializer(data=item)
+            self.assertTrue(validada.is_valid())
+            errores = {}
+            CargaReglasService._validar_duplicados({0: validada.validated_data}, errores)
+            self.assertEqual(not errores, esperado, item)
+
+    def test_duplicados_en_la_carga_y_existentes_sin_crear_nada(self):
+        datos = [
+            self.datos_regla('Nueva x4', condicion_valor='4', aplica_articulo=self.mouse.id),
+            self.datos_regla('Repetida x4', condicion_valor='4.00', aplica_articulo=self.mouse.id),
+            self.datos_regla('Como la existente', aplica_articulo=self.mouse.id),
+            self.datos_regla('Sin articulo', condicion_valor='4', aplica_articulo=None),
+            self.datos_regla('Grupo inexistente', condicion_valor='9', aplica_grupo=999999),
+        ]
+        with self.assertNumQueries(6):  # lista, artículos, grupos, firmas y el savepoint (2)
+            resumen = CargaReglasService.crear_reglas(datos)
+
+        self.assertEqual(resumen['reglas_creadas'], 0)
+        errores = {error['indice']: error['errores'] for error in resumen['errores']}
+        self.assertEqual(sorted(errores), [1, 2, 4])
+        self.assertIn("(índice 0)", errores[1]['non_field_errors'][0])
+        self.assertIn("'Descuento x3 Mouse'", errores[2]['non_field_errors'][0])
+        self.assertIn('aplica_grupo', errores[4])
+        self.assertEqual(ReglaPrecio.objects.count(), 3)
+
+    def test_endpoints_crean_reglas_y_combinaciones(self):
+        cliente = APIClient()
+
+        def reglas_mouse():
+            return PrecioService.calcular_precio_final(
+                empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                articulo_id=self.mouse.id, cantidad=1, cart_items_ids=[self.laptop.id]
+            )['reglas_aplicadas']
+        self.assertEqual(reglas_mouse(), [])
+
+        respuesta = cliente.post('/api/combinaciones/bulk/', [
+            {'nombre': 'Combo Laptop + Mouse', 'lista_precio': self.lista.id,
+             'articulos': [self.laptop.id, self.mouse.id, self.mouse.id]},
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.data['articulos_asignados'], 2)
+        combo = CombinacionProducto.objects.get(pk=respuesta.data['ids'][0])
+        self.assertEqual(set(combo.articulos.values_list('id', flat=True)), {self.laptop.id, self.mouse.id})
+
+        respuesta = cliente.post('/api/reglas-precio/bulk/', {'reglas': [
+            self.datos_regla('Combo laptop', condicion_valor='1', aplica_combinacion=combo.id, prioridad=1),
+        ]}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        # Las reglas compiladas de la lista se invalidaron
+        self.assertEqual(reglas_mouse(), ['Combo laptop'])
+
+        respuesta = cliente.post('/api/combinaciones/bulk/', [
+            {'nombre': 'Sin artículos', 'lista_precio': self.lista.id, 'articulos': []},
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('articulos', respuesta.data['errores'][0]['errores'])
+
+
+class ExportacionListaTests(MotorPreciosTestCase):
+
+    def test_ndjson_coincide_con_calculo_individual(self):
+        respuesta = APIClient().get(
+            f'/api/listas-precio/{self.lista.id}/export/', {'formato': 'ndjson', 'cantidad': 3, 'monto_pedido': '6000'}
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        filas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).decode().splitlines()]
+
+        self.assertEqual([fila['sku'] for fila in filas], ['LAP-001', 'MOU-001', 'TEC-001'])
+        for fila in filas:
+            esperado = PrecioService.calcular_precio_final(
+                empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                articulo_id=fila['articulo_id'], cantidad=3, monto_pedido=Decimal('6000')
+            )
+            self.assertEqual(Decimal(fila['precio_final']), esperado['precio_final'].quantize(Decimal('0.01')))
+            self.assertEqual(fila['reglas_aplicadas'], esperado['reglas_aplicadas'])
+
+    def test_csv_con_encabezado_y_formato_invalido(self):
+        cliente = APIClient()
+        respuesta = cliente.get(f'/api/listas-precio/{self.lista.id}/export/')
+        lineas = b''.join(respuesta.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0].split(',')[:5], ['articulo_id', 'sku', 'nombre', 'precio_base', 'precio_final'])
+        self.assertEqual(len(lineas), 4)
+
+        respuesta = cliente.get(f'/api/listas-precio/{self.lista.id}/export/', {'formato': 'xml'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class MotorSqlTests(MotorPreciosTestCase):
+
+    def lista_simple(self):
+        """
+        Lista sin reglas de combinación, con reglas aleatorias de todos los ámbitos.
+        """
+        lista = ListaPrecio.objects.create(
+            empresa=self.empresa, nombre='Lista Tienda', canal_venta='TIENDA', fecha_inicio_vigencia=date.today()
+        )
+        otra_linea = LineaArticulo.objects.create(nombre='Oficina')
+        lineas = [self.linea, otra_linea, LineaArticulo.objects.create(nombre='Jardín')]
+        otro_grupo = GrupoArticulo.objects.create(nombre='Sillas')
+        articulos = [self.laptop, self.mouse, self.teclado] + [
+            Articulo.objects.create(
+                linea=lineas[numero % 3], grupo=otro_grupo if numero % 2 else self.grupo,
+                sku=f'SIL-{numero:03d}', nombre=f'Silla {numero}', ultimo_costo=Decimal(40 + 7 * numero)
+            )
+            for numero in range(9)
+        ]
+        for articulo in articulos:
+            PrecioArticulo.objects.create(
+                lista_precio=lista, articulo=articulo, precio_base=articulo.ultimo_costo * Decimal('1.37')
+            )
+
+        # Montos negativos (recargos) incluidos: ejercitan el piso de la composición
+        aleatorio = random.Random(24)
+        for numero in range(30):
+            ambito = aleatorio.choice([
+                {}, {'aplica_articulo': aleatorio.choice(articulos)}, {'aplica_grupo': otro_grupo},
+                {'aplica_linea': self.linea}, {'aplica_grupo': self.grupo, 'aplica_linea': otra_linea},
+            ])
+            porcentaje = aleatorio.random() < 0.5
+            ReglaPrecio.objects.create(
+                lista_precio=lista, nombre_regla=f'Aleatoria {numero}',
+                tipo_regla='PORCENTAJE' if porcentaje else 'MONTO_FIJO',
+                valor_regla=Decimal(aleatorio.randint(-300, 1200)) / (100 if porcentaje else 10),
+                condicion=aleatorio.choice(['CANTIDAD_MINIMA', 'MONTO_MINIMO']),
+                condicion_valor=Decimal(aleatorio.choice([1, 3, 6, 5000])),
+                prioridad=aleatorio.randint(1, 50), permite_venta_bajo_costo=aleatorio.random() < 0.3, **ambito
+            )
+        return lista
+
+    def test_exportacion_igual_que_el_motor_decimal(self):
+        lista = self.lista_simple()
+        for cantidad in (1, 3, 6):
+            for monto in (Decimal('0'), Decimal('5000')):
+                esperado = list(PrecioService.exportar_precios(lista, cantidad, monto, motor='decimal'))
+                # Los precios y, si alguna regla que se cumple nombra artículos, su grupo y su línea
+                with CaptureQueriesContext(connection) as consultas:
+                    obtenido = list(PrecioService.exportar_precios(lista, cantidad, monto, motor='sql'))
+                self.assertLessEqual(len(consultas), 2)
+                self.assertEqual(len(obtenido), 12)
+                for fila, fila_esperada in zip(obtenido, esperado):
+                    for campo in ('precio_final', 'total'):
+                        self.assertEqual(
+                            fila[campo].quantize(Decimal('0.01')), fila_esperada[campo].quantize(Decimal('0.01'))
+                        )
+                    for campo in ('articulo_id', 'reglas_aplicadas', 'autorizado_bajo_costo'):
+                        self.assertEqual(fila[campo], fila_esperada[campo])
+
+    def test_reglas_de_combinacion_usan_el_motor_en_python(self):
+        conjunto = cache_reglas.obtener_conjunto_reglas(self.lista.id)
+        with self.assertRaises(motor_sql.ReglasNoExpresables):
+            motor_sql.anotar(PrecioArticulo.objects.filter(lista_precio=self.lista), conjunto)
+
+        respuesta = APIClient().get(
+            f'/api/listas-precio/{self.lista.id}/export/', {'formato': 'ndjson', 'cantidad': 3, 'motor': 'sql'}
+        )
+        filas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).decode().splitlines()]
+        self.assertEqual([fila['precio_final'] for fila in filas], ['2000.00', '110.00', '180.00'])
+        respuesta = APIClient().get(f'/api/listas-precio/{self.lista.id}/export/', {'motor': 'gpu'})
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ListadosTests(MotorPreciosTestCase):
+
+    def test_paginacion_por_cursor_y_filtro(self):
+        cliente = APIClient()
+        respuesta = cliente.get('/api/precios-articulo/', {'lista_precio': self.lista.id, 'page_size': 2})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.data['results']), 2)
+        self.assertIsNotNone(respuesta.data['next'])
+
+        siguiente = cliente.get(respuesta.data['next'])
+        ids = [fila['id'] for fila in respuesta.data['results'] + siguiente.data['results']]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), 3)
+        self.assertIsNone(siguiente.data['next'])
+
+        respuesta = cliente.get('/api/precios-articulo/', {'lista_precio': 'x'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_fields_reduce_json_y_select(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = APIClient().get('/api/precios-articulo/', {'fields': 'id,precio_base'})
+        self.assertEqual(set(respuesta.data['results'][0]), {'id', 'precio_base'})
+        select = consultas.captured_queries[-1]['sql']
+        self.assertIn('"precio_base"', select)
+        self.assertNotIn('"articulo_id"', select)
+
+        respuesta = APIClient().get('/api/precios-articulo/', {'fields': 'id,inexistente'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_updated_since(self):
+        futuro = (date.today() + timedelta(days=1)).isoformat()
+        respuesta = APIClient().get('/api/reglas-precio/', {'updated_since': futuro})
+        self.assertEqual(respuesta.data['results'], [])
+
+        respuesta = APIClient().get('/api/reglas-precio/', {'updated_since': '2000-01-01T00:00:00'})
+        self.assertEqual(len(respuesta.data['results']), 3)
+
+        respuesta = APIClient().get('/api/empresas/', {'updated_since': futuro})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_combinaciones_sin_n_mas_uno(self):
+        for i in range(5):
+            combo = CombinacionProducto.objects.create(lista_precio=self.lista, nombre=f'Combo {i}')
+            combo.articulos.add(self.laptop, self.mouse)
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = APIClient().get('/api/combinaciones/')
+        self.assertEqual(len(respuesta.data['results']), 6)
+        self.assertEqual(sorted(respuesta.data['results'][0]['articulos']), sorted([self.mouse.id, self.teclado.id]))
+        self.assertEqual(len(consultas), 2)
+
+
+class GetCondicionalTests(MotorPreciosTestCase):
+
+    def test_lista_vigente_304_sin_consultas(self):
+        cliente = APIClient()
+        parametros = {'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE', 'sucursal_id': self.sucursal.id}
+        respuesta = cliente.get('/api/lista-vigente/', parametros)
+        etiqueta = respuesta['ETag']
+
+        with self.assertNumQueries(0):
+            respuesta = cliente.get('/api/lista-vigente/', parametros, HTTP_IF_NONE_MATCH=etiqueta)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etiqueta)
+
+        # Otra fecha es otro recurso
+        otra_fecha = dict(parametros, fecha=(date.today() - timedelta(days=1)).isoformat())
+        self.assertEqual(cliente.get('/api/lista-vigente/', otra_fecha, HTTP_IF_NONE_MATCH=etiqueta).status_code, 200)
+
+        self.lista.nombre = 'Lista E-commerce 2025'
+        self.lista.save()
+        respuesta = cliente.get('/api/lista-vigente/', parametros, HTTP_IF_NONE_MATCH=etiqueta)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['nombre'], 'Lista E-commerce 2025')
+        self.assertNotEqual(respuesta['ETag'], etiqueta)
+
+    def test_precios_de_lista_versionados_por_lista(self):
+        otra = ListaPrecio.objects.create(
+            empresa=self.empresa, nombre='Lista Tienda', canal_venta='TIENDA',
+            fecha_inicio_vigencia=date.today()
+        )
+        cliente = APIClient()
+        respuesta = cliente.get('/api/precios-articulo/', {'lista_precio': self.lista.id})
+        etiqueta = respuesta['ETag']
+
+        # Escribir en otra lista no cambia la versión
+        PrecioArticulo.objects.create(lista_precio=otra, articulo=self.mouse, precio_base=Decimal('99.00'))
+        with self.assertNumQueries(0):
+            respuesta = cliente.get(
+                '/api/precios-articulo/', {'lista_precio': self.lista.id}, HTTP_IF_NONE_MATCH=f'W/{etiqueta}'
+            )
+        self.assertEqual(respuesta.status_code, 304)
+
+        # Mover un precio a la otra lista cambia las dos
+        precio = PrecioArticulo.objects.get(lista_precio=self.lista, articulo=self.laptop)
+        precio.lista_precio = otra
+        precio.save()
+        respuesta = cliente.get('/api/precios-articulo/', {'lista_precio': self.lista.id}, HTTP_IF_NONE_MATCH=etiqueta)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.data['results']), 2)
+
+    def test_listados_sin_alcance_no_llevan_etag(self):
+        cliente = APIClient()
+        self.assertIn('ETag', cliente.get('/api/listas-precio/', {'empresa': self.empresa.id}))
+        self.assertNotIn('ETag', cliente.get('/api/listas-precio/'))
+        self.assertEqual(cliente.get('/api/listas-precio/', {'empresa': 'x'}).status_code, 400)
+
+
+class CambiosTests(MotorPreciosTestCase):
+
+    def ultima_secuencia(self):
+        return CambioPrecio.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    def estado_replicado(self, limite=1000):
+        """
+        Estado final que reconstruye un cliente leyendo el feed desde 0, lote por lote.
+        """
+        estado, desde, hay_mas = {}, 0, True
+        while hay_mas:
+            lote = APIClient().get('/api/cambios/', {'desde': desde, 'limite': limite}).data
+            for cambio in lote['cambios']:
+                estado[(cambio['entidad'], cambio['id'], cambio['lista_precio'])] = cambio['datos']
+            desde, hay_mas = lote['hasta'], lote['hay_mas']
+        return estado
+
+    def test_feed_pliega_cambios_y_registra_bajas(self):
+        desde = self.ultima_secuencia()
+        precio = PrecioArticulo.objects.get(lista_precio=self.lista, articulo=self.laptop)
+        precio.precio_base = Decimal('2100.00')
+        precio.save()
+        precio.precio_base = Decimal('2200.00')
+        precio.save()
+        ReglaPrecio.objects.get(nombre_regla='Descuento x3 Mouse').delete()
+        self.mouse.nombre = 'Mouse óptico'  # sin cambio de costo: no se publica
+        self.mouse.save()
+        self.teclado.ultimo_costo = Decimal('125.00')
+        self.teclado.save()
+
+        respuesta = APIClient().get('/api/cambios/', {'desde': desde})
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(respuesta.data['hay_mas'])
+        self.assertEqual(respuesta.data['hasta'], self.ultima_secuencia())
+        resumen = [(c['entidad'], c['operacion'], c['datos']) for c in respuesta.data['cambios']]
+        self.assertEqual(resumen, [
+            ('PRECIO', 'ACTUALIZADO', {'lista_precio': self.lista.id, 'articulo': self.laptop.id, 'precio_base': '2200.00'}),
+            ('REGLA', 'ELIMINADO', None),
+            ('ARTICULO', 'ACTUALIZADO', {'sku': 'TEC-001', 'ultimo_costo': '125.00'}),
+        ])
+        self.assertEqual(APIClient().get('/api/cambios/', {'limite': 0}).status_code, 400)
+
+    def test_bajas_en_cascada_publican_reglas_y_combinaciones(self):
+        desde = self.ultima_secuencia()
+        regla = ReglaPrecio.objects.get(nombre_regla='Descuento x3 Mouse')
+        mouse_id = self.mouse.id
+        self.mouse.delete()
+
+        cambios_feed = {
+            (c['entidad'], c['id']): c for c in cambios.leer(desde)['cambios']
+        }
+        self.assertEqual(cambios_feed[('ARTICULO', mouse_id)]['operacion'], 'ELIMINADO')
+        self.assertIsNone(cambios_feed[('REGLA', regla.id)]['datos']['aplica_articulo'])
+        self.assertEqual(cambios_feed[('COMBINACION', self.combo.id)]['datos']['articulos'], [self.teclado.id])
+        self.assertEqual(
+            [c['operacion'] for c in cambios_feed.values() if c['entidad'] == 'PRECIO'], ['ELIMINADO']
+        )
+
+    def test_cargas_masivas_registran_cambios(self):
+        desde = self.ultima_secuencia()
+        ImportacionPreciosService.importar(self.lista, leer_filas(['LAP-001,2100.00\n'], 'csv'))
+        resumen = CargaCombinacionesService.crear_combinaciones([
+            {'nombre': 'Combo Laptop + Mouse', 'lista_precio': self.lista.id, 'articulos': [self.laptop.id, self.mouse.id]},
+        ])
+
+        feed = cambios.leer(desde, lista_id=self.lista.id)['cambios']
+        precio = PrecioArticulo.objects.get(lista_precio=self.lista, articulo=self.laptop)
+        self.assertEqual([(c['entidad'], c['id']) for c in feed], [
+            ('PRECIO', precio.id), ('COMBINACION', resumen['ids'][0]),
+        ])
+        self.assertEqual(feed[0]['datos']['precio_base'], '2100.00')
+        self.assertEqual(feed[1]['datos']['articulos'], sorted([self.laptop.id, self.mouse.id]))
+
+    def test_compactar_conserva_el_estado_final(self):
+        precio = PrecioArticulo.objects.get(lista_precio=self.lista, articulo=self.mouse)
+        for valor in ('121.00', '122.00', '123.00'):
+            precio.precio_base = Decimal(valor)
+            precio.save()
+        otra = ListaPrecio.objects.create(
+            empresa=self.empresa, nombre='Lista Tienda', canal_venta='TIENDA', fecha_inicio_vigencia=date.today()
+        )
+        self.combo.lista_precio = otra
+        self.combo.save()
+        ReglaPrecio.objects.filter(aplica_combinacion=self.combo).delete()
+        estado = self.estado_replicado(limite=2)
+        registros = CambioPrecio.objects.count()
+
+        borrados = cambios.compactar(self.ultima_secuencia())
+
+        self.assertGreater(borrados, 0)
+        self.assertEqual(CambioPrecio.objects.count(), registros - borrados)
+        self.assertEqual(self.estado_replicado(), estado)
+        # La combinación figura como baja en la lista de origen y con su estado en la nueva
+        self.assertIsNone(estado[('COMBINACION', self.combo.id, self.lista.id)])
+        self.assertEqual(estado[('COMBINACION', self.combo.id, otra.id)]['lista_precio'], otra.id)
+        self.assertEqual(estado[('PRECIO', precio.id, self.lista.id)]['precio_base'], '123.00')
+
+
+class PaqueteOfflineTests(MotorPreciosTestCase):
+
+    def descargar(self, lista=None, **extra):
+        respuesta = APIClient().get(f'/api/listas-precio/{(lista or self.lista).id}/bundle/', **extra)
+        lineas = [linea.decode() for linea in respuesta.streaming_content] if respuesta.status_code == 200 else []
+        return respuesta, lineas
+
+    def test_evaluador_conforme_con_el_servicio(self):
+        azar = random.Random(20)
+        articulos = [self.laptop, self.mouse, self.teclado] + [
+            Articulo.objects.create(
+                linea=self.linea, grupo=self.grupo, sku=f'GEN-{i}', nombre=f'Genérico {i}',
+                ultimo_costo=Decimal(azar.randint(100, 5000)) / 100
+            )
+            for i in range(5)
+        ]
+        for articulo in articulos[3:-1]:  # el último queda sin precio base
+            PrecioArticulo.objects.create(
+                lista_precio=self.lista, articulo=articulo, precio_base=Decimal(azar.randint(500, 20000)) / 100
+            )
+        combo = CombinacionProducto.objects.create(lista_precio=self.lista, nombre='Combo aleatorio')
+        combo.articulos.add(*azar.sample(articulos, 3))
+        for i in range(25):
+            ReglaPrecio.objects.create(
+                lista_precio=self.lista, nombre_regla=f'Regla {i}',
+                tipo_regla=azar.choice(['PORCENTAJE', 'MONTO_FIJO']),
+                valor_regla=Decimal(azar.randint(1, 3000)) / 100,
+                condicion=azar.choice(['CANTIDAD_MINIMA', 'MONTO_MINIMO']),
+                condicion_valor=Decimal(azar.choice([1, 2, 5, 10, 250, 1000, 4000])),
+                aplica_articulo=azar.choice([None, None, *articulos]),
+                aplica_grupo=azar.choice([None, self.grupo]),
+                aplica_combinacion=azar.choice([None, None, None, combo, self.combo]),
+                prioridad=azar.randint(1, 50), permite_venta_bajo_costo=azar.random() < 0.3,
+            )
+
+        respuesta, lineas = self.descargar()
+        self.assertEqual(respuesta.status_code, 200)
+        evaluador = EvaluadorOffline.cargar(lineas)
+
+        for _ in range(200):
+            carrito = [articulo.id for articulo in azar.sample(articulos, azar.randint(1, 4))]
+            cantidad = azar.randint(1, 12)
+            # Los umbrales exactos prueban el borde de las condiciones `>=`
+            monto = azar.choice([Decimal(azar.randint(0, 600000)) / 100, Decimal(azar.choice([250, 1000, 4000]))])
+            for articulo_id in carrito:
+                esperado = PrecioService.calcular_precio_final(
+                    empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                    articulo_id=articulo_id, cantidad=cantidad, monto_pedido=monto,
+                    cart_items_ids=carrito, motor='decimal'
+                )
+                self.assertEqual(
+                    evaluador.calcular_precio_final(articulo_id, cantidad, monto, carrito), esperado,
+                    f'artículo {articulo_id}, carrito {carrito}, cantidad {cantidad}, monto {monto}'
+                )
+
+    def test_paquete_incompleto_y_get_condicional(self):
+        respuesta, lineas = self.descargar()
+        etiqueta = respuesta['ETag']
+        evaluador = EvaluadorOffline.cargar(lineas)
+        self.assertEqual(evaluador.lista['id'], self.lista.id)
+        self.assertEqual(len(evaluador.articulos), 3)
+        with self.assertRaises(PaqueteInvalido):
+            EvaluadorOffline.cargar(lineas[:-2] + lineas[-1:])
+
+        with self.assertNumQueries(1):  # Solo la existencia de la lista
+            respuesta, _ = self.descargar(HTTP_IF_NONE_MATCH=etiqueta)
+        self.assertEqual(respuesta.status_code, 304)
+        respuesta = APIClient().get('/api/listas-precio/999999/bundle/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(respuesta.status_code, 404)
+
+        # El costo de un artículo entra en el paquete
+        self.mouse.ultimo_costo = Decimal('85.00')
+        self.mouse.save()
+        respuesta, lineas = self.descargar(HTTP_IF_NONE_MATCH=etiqueta)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(EvaluadorOffline.cargar(lineas).articulos[self.mouse.id].ultimo_costo, Decimal('85.00'))
+
+    def test_evaluador_no_depende_de_django(self):
+        codigo = (
+            "import sys; sys.modules['django'] = None; "
+            "from gestion_precios.evaluador_offline import EvaluadorOffline"
+        )
+        resultado = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True)
+        self.assertEqual(resultado.returncode, 0, resultado.stderr)
+
+
+class RepreciadoTests(MotorPreciosTestCase):
+
+    def materializados(self):
+        return {
+            (fila.articulo_id, fila.cantidad): fila
+            for fila in PrecioFinalMaterializado.objects.filter(lista_precio=self.lista)
+        }
+
+    def test_corrida_completa_coincide_con_el_servicio(self):
+        resumen = RepreciadoService.ejecutar([1, 3], procesos=1, lote=2)
+
+        self.assertEqual((resumen['modo'], resumen['precios_calculados'], resumen['lotes']), ('COMPLETO', 6, 2))
+        for (articulo_id, cantidad), fila in self.materializados().items():
+            esperado = PrecioService.calcular_precio_final(
+                empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                articulo_id=articulo_id, cantidad=cantidad, motor='decimal'
+            )
+            self.assertEqual(fila.precio_final, esperado['precio_final'].quantize(Decimal('0.01')))
+            self.assertEqual(fila.reglas_aplicadas, esperado['reglas_aplicadas'])
+        self.assertEqual(self.materializados()[(self.mouse.id, 3)].precio_final, Decimal('110.00'))
+
+    def test_procesos_en_paralelo_dan_lo_mismo(self):
+        RepreciadoService.ejecutar([1, 3], procesos=1)
+        locales = {clave: (fila.precio_final, fila.reglas_aplicadas) for clave, fila in self.materializados().items()}
+
+        resumen = RepreciadoService.ejecutar([1, 3], procesos=2, lote=1)
+
+        self.assertEqual(resumen['lotes'], 3)
+        paralelos = {clave: (fila.precio_final, fila.reglas_aplicadas) for clave, fila in self.materializados().items()}
+        self.assertEqual(paralelos, locales)
+
+    def test_incremental_recalcula_solo_lo_modificado(self):
+        otra = ListaPrecio.objects.create(
+            empresa=self.empresa, nombre='Lista Tienda', canal_venta='TIENDA', fecha_inicio_vigencia=date.today()
+        )
+        PrecioArticulo.objects.create(lista_precio=otra, articulo=self.laptop, precio_base=Decimal('1900.00'))
+        RepreciadoService.ejecutar([1], procesos=1)
+        self.assertEqual(PrecioFinalMaterializado.objects.count(), 4)
+
+        precio = PrecioArticulo.objects.get(lista_precio=self.lista, articulo=self.mouse)
+        precio.precio_base = Decimal('130.00')
+        precio.save()
+        PrecioArticulo.objects.get(lista_precio=self.lista, articulo=self.teclado).delete()
+
+        resumen = RepreciadoService.ejecutar([1], incremental=True, procesos=1)
+
+        self.assertEqual((resumen['modo'], resumen['precios_calculados'], resumen['filas_borradas']), ('INCREMENTAL', 1, 1))
+        self.assertEqual(self.materializados()[(self.mouse.id, 1)].precio_final, Decimal('130.00'))
+        self.assertEqual(set(self.materializados()), {(self.laptop.id, 1), (self.mouse.id, 1)})
+
+        # Un costo cambia el artículo en todas sus listas; una regla, la lista entera
+        self.laptop.ultimo_costo = Decimal('1950.00')
+        self.laptop.save()
+        resumen = RepreciadoService.ejecutar([1], incremental=True, procesos=1)
+        self.assertEqual(resumen['precios_calculados'], 2)
+        self.assertEqual(
+            PrecioFinalMaterializado.objects.get(lista_precio=otra, articulo=self.laptop).precio_final, Decimal('1950.00')
+        )
+        regla = ReglaPrecio.objects.filter(lista_precio=self.lista).first()
+        regla.prioridad = 1
+        regla.save()
+        self.assertEqual(RepreciadoService.ejecutar([1], incremental=True, procesos=1)['precios_calculados'], 2)
+
+        # Otras cantidades no pueden partir de la corrida anterior
+        self.assertEqual(RepreciadoService.ejecutar([1, 6], incremental=True, procesos=1)['modo'], 'COMPLETO')
+
+    def test_listas_generadas_quedan_en_el_registro_de_cambios(self):
+        RepreciadoService.ejecutar([1], procesos=1)
+        generados = generar_datos_carga(
+            sucursales=1, articulos=5, listas=2, reglas_por_lista=2, combinaciones=1, lineas=1, grupos=1,
+            prefijo='PRUEBA'
+        )
+        resumen = RepreciadoService.ejecutar([1], incremental=True, procesos=1)
+
+        self.assertEqual(resumen['modo'], 'INCREMENTAL')
+        registradas = CambioPrecio.objects.filter(entidad='LISTA', objeto_id__in=generados['listas'])
+        self.assertEqual(set(registradas.values_list('objeto_id', flat=True)), set(generados['listas']))
+        for lista_id in generados['listas']:
+            self.assertEqual(PrecioFinalMaterializado.objects.filter(lista_precio_id=lista_id).count(), 5)
+
+    def test_corrida_limitada_no_es_base_de_la_incremental(self):
+        otra = ListaPrecio.objects.create(
+            empresa=self.empresa, nombre='Lista Tienda', canal_venta='TIENDA', fecha_inicio_vigencia=date.today()
+        )
+        precio = PrecioArticulo.objects.create(lista_precio=otra, articulo=self.mouse, precio_base=Decimal('100.00'))
+        RepreciadoService.ejecutar([1], procesos=1)
+
+        precio.precio_base = Decimal('200.00')
+        precio.save()
+        RepreciadoService.ejecutar([1], incremental=True, procesos=1, listas_ids=[self.lista.id])
+        resumen = RepreciadoService.ejecutar([1], incremental=True, procesos=1)
+
+        self.assertEqual((resumen['modo'], resumen['listas']), ('INCREMENTAL', 1))
+        self.assertEqual(
+            PrecioFinalMaterializado.objects.get(lista_precio=otra, articulo=self.mouse).precio_final, Decimal('200.00')
+        )
+
+
+class PrecioMaterializadoTests(MotorPreciosTestCase):
+
+    def consultar(self, articulo, cantidad, **parametros):
+        return APIClient().get('/api/calcular-precio/', {
+            'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE', 'sucursal_id': self.sucursal.id,
+            'articulo_id': articulo.id, 'cantidad': cantidad, **parametros,
+        })
+
+    def test_consulta_por_cantidad_precalculada(self):
+        RepreciadoService.ejecutar([1, 3], procesos=1)
+        respuesta = self.consultar(self.mouse, 3)
+        self.assertEqual(respuesta['X-Precio-Origen'], 'materializado')
+        self.assertEqual(respuesta.data['precio_final'], '110.00')
+        self.assertEqual(respuesta.data['total'], '330.00')
+        # Lista y reglas ya en caché: una sola lectura por el índice único
+        with self.assertNumQueries(1):
+            respuesta = self.consultar(self.mouse, 3, monto_pedido='4999.99', cart_items=f'{self.laptop.id}')
+        self.assertEqual(respuesta['X-Precio-Origen'], 'materializado')
+
+        en_vivo = PrecioService.calcular_precio_final(
+            empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+            articulo_id=self.mouse.id, cantidad=3, motor='centimos'
+        )
+        self.assertEqual(respuesta.data['reglas_aplicadas'], en_vivo['reglas_aplicadas'])
+
+    def test_consultas_que_dependen_del_carrito_se_evaluan(self):
+        RepreciadoService.ejecutar([1, 3], procesos=1)
+        # Completa la combinación, alcanza el umbral de monto o pide una cantidad sin fila
+        for articulo, cantidad, parametros, precio in (
+            (self.mouse, 1, {'cart_items': f'{self.teclado.id}'}, '95.00'),
+            (self.mouse, 3, {'monto_pedido': '5000'}, '99.00'),
+            (self.laptop, 2, {}, '2000.00'),
+        ):
+            respuesta = self.consultar(articulo, cantidad, **parametros)
+            self.assertEqual(respuesta['X-Precio-Origen'], 'motor')
+            self.assertEqual(respuesta.data['precio_final'], precio)
+        self.assertEqual(self.consultar(self.laptop, 2)['X-Precio-Origen'], 'memo')
+        # Las filas se calculan con la aritmética 'decimal'
+        with self.settings(PRECIOS_MOTOR='centimos'):
+            self.assertEqual(self.consultar(self.laptop, 1)['X-Precio-Origen'], 'motor')
+
+    def test_escritura_deja_la_lista_sin_materializar_hasta_la_proxima_corrida(self):
+        RepreciadoService.ejecutar([1, 3], procesos=1)
+        precio = PrecioArticulo.objects.get(lista_precio=self.lista, articulo=self.mouse)
+        precio.precio_base = Decimal('150.00')
+        precio.save()
+
+        respuesta = self.consultar(self.mouse, 3)
+        self.assertEqual((respuesta['X-Precio-Origen'], respuesta.data['precio_final']), ('motor', '140.00'))
+
+        RepreciadoService.ejecutar([1, 3], incremental=True, procesos=1)
+        respuesta = self.consultar(self.mouse, 1)
+        self.assertEqual((respuesta['X-Precio-Origen'], respuesta.data['precio_final']), ('materializado', '150.00'))
+
+        # Una corrida limitada a otras listas no vuelve a marcar esta
+        self.mouse.ultimo_costo = Decimal('90.00')
+        self.mouse.save()
+        RepreciadoService.ejecutar([1, 3], procesos=1, listas_ids=[0])
+        self.assertEqual(self.consultar(self.teclado, 1)['X-Precio-Origen'], 'motor')
+
+    def test_corrida_limitada_no_marca_las_demas_listas(self):
+        otra = ListaPrecio.objects.create(
+            empresa=self.empresa, nombre='Lista Tienda', canal_venta='TIENDA', fecha_inicio_vigencia=date.today()
+        )
+        precio = PrecioArticulo.objects.create(lista_precio=otra, articulo=self.mouse, precio_base=Decimal('100.00'))
+        RepreciadoService.ejecutar([1], procesos=1)
+        precio.precio_base = Decimal('200.00')
+        precio.save()
+
+        RepreciadoService.ejecutar([1], incremental=True, procesos=1, listas_ids=[self.lista.id])
+
+        self.assertFalse(materializados.vigente(otra.id))
+        resultado, origen = PrecioService.calcular_precio_final_con_origen(
+            empresa_id=self.empresa.id, canal_venta='TIENDA', articulo_id=self.mouse.id, cantidad=1
+        )
+        self.assertEqual((origen, resultado['precio_final']), ('motor', Decimal('200.00')))
+
+    def test_escritura_durante_la_corrida_no_queda_marcada(self):
+        RepreciadoService.ejecutar([1], procesos=1)
+        modificado_desde = RepreciadoService._modificado_desde
+
+        def con_escritura(*args):
+            # Llega después de la secuencia de la corrida, antes de que termine
+            resultado = modificado_desde(*args)
+            precio = PrecioArticulo.objects.get(lista_precio=self.lista, articulo=self.mouse)
+            precio.precio_base = Decimal('150.00')
+            precio.save()
+            return resultado
+
+        with mock.patch.object(RepreciadoService, '_modificado_desde', staticmethod(con_escritura)):
+            RepreciadoService.ejecutar([1], incremental=True, procesos=1)
+
+        respuesta = self.consultar(self.mouse, 1)
+        self.assertEqual((respuesta['X-Precio-Origen'], respuesta.data['precio_final']), ('motor', '150.00'))
+
+    async def test_ruta_asincrona(self):
+        await sync_to_async(RepreciadoService.ejecutar)([1, 3], procesos=1)
+        respuesta = await AsyncClient().get('/api/async/calcular-precio/', {
+            'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE', 'sucursal_id': self.sucursal.id,
+            'articulo_id': self.mouse.id, 'cantidad': 3,
+        })
+        self.assertEqual(respuesta['X-Precio-Origen'], 'materializado')
+        self.assertEqual(respuesta.json()['precio_final'], '110.00')
+
+
+@skipUnless(simulacion.disponible(), 'La simulación requiere NumPy.')
+class SimulacionTests(MotorPreciosTestCase):
+
+    def simular(self, cuerpo):
+        return APIClient().post(f'/api/listas-precio/{self.lista.id}/simular/', cuerpo, format='json')
+
+    def test_arreglos_coinciden_con_el_motor(self):
+        otra_linea = LineaArticulo.objects.create(nombre='Oficina')
+        self.teclado.linea = otra_linea
+        self.teclado.save()
+        aleatorio = random.Random(23)
+        for numero in range(20):
+            ambito = aleatorio.choice([
+                {}, {'aplica_articulo': self.laptop}, {'aplica_grupo': self.grupo},
+                {'aplica_linea': self.linea}, {'aplica_grupo': self.grupo, 'aplica_linea': otra_linea},
+                {'aplica_combinacion': self.combo},
+            ])
+            porcentaje = aleatorio.random() < 0.5
+            ReglaPrecio.objects.create(
+                lista_precio=self.lista, nombre_regla=f'Aleatoria {numero}',
+                tipo_regla='PORCENTAJE' if porcentaje else 'MONTO_FIJO',
+                valor_regla=Decimal(aleatorio.randint(1, 3000)) / (100 if porcentaje else 10),
+                condicion=aleatorio.choice(['CANTIDAD_MINIMA', 'MONTO_MINIMO']),
+                condicion_valor=Decimal(aleatorio.choice([1, 3, 6, 5000])),
+                prioridad=aleatorio.randint(1, 50), permite_venta_bajo_costo=aleatorio.random() < 0.3, **ambito
+            )
+
+        conjunto = cache_reglas.obtener_conjunto_reglas(self.lista.id)
+        arreglos = simulacion.obtener_arreglos(self.lista.id)
+        for cantidad in (1, 3, 6):
+            for monto in (Decimal('0'), Decimal('5000')):
+                for carrito in ((), (self.teclado.id,)):
+                    precios, autorizado, _ = simulacion.evaluar(arreglos, conjunto, cantidad, monto, carrito)
+                    for posicion, articulo_id in enumerate(arreglos.ids.tolist()):
+                        esperado = PrecioService.calcular_precio_final(
+                            empresa_id=self.empresa.id, canal_venta='ECOMMERCE', sucursal_id=self.sucursal.id,
+                            articulo_id=articulo_id, cantidad=cantidad, monto_pedido=monto,
+                            cart_items_ids=list(carrito), motor='decimal'
+                        )
+                        self.assertEqual(
+                            Decimal(int(precios[posicion])).scaleb(-2), esperado['precio_final'].quantize(Decimal('0.01'))
+                        )
+                        self.assertEqual(bool(autorizado[posicion]), esperado['autorizado_bajo_costo'])
+
+    def test_totales_y_articulos_afectados(self):
+        respuesta = self.simular({
+            'agregar': [{
+                'nombre_regla': 'Liquidación 50%', 'tipo_regla': 'PORCENTAJE', 'valor_regla': '50',
+                'condicion': 'CANTIDAD_MINIMA', 'condicion_valor': '1',
+            }],
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.data
+        self.assertEqual((datos['articulos'], datos['articulos_afectados']), (3, 3))
+        self.assertEqual((datos['actual']['ingreso'], datos['actual']['margen']), ('2300.00', '600.00'))
+        # Todos quedan bajo costo y, sin permiso, se ajustan al costo
+        self.assertEqual((datos['propuesto']['ingreso'], datos['propuesto']['margen']), ('1700.00', '0.00'))
+        self.assertEqual(datos['diferencia']['margen'], '-600.00')
+        self.assertEqual((datos['diferencia']['ajustados_a_costo'], datos['diferencia']['nuevos_bajo_costo']), (3, 3))
+        self.assertEqual([fila['sku'] for fila in datos['detalle']], ['LAP-001', 'TEC-001', 'MOU-001'])
+
+        # Cambiar el umbral de una regla y quitar otra; solo cambia el Mouse
+        por_nombre = dict(ReglaPrecio.objects.filter(lista_precio=self.lista).values_list('nombre_regla', 'id'))
+        respuesta = self.simular({
+            'modificar': [{'id': por_nombre['Descuento x3 Mouse'], 'condicion_valor': '1'}],
+            'eliminar': [por_nombre['Descuento Combo Teclado+Mouse']],
+            'cantidad': 2, 'limite': 1,
+        })
+        self.assertEqual(respuesta.data['articulos_afectados'], 1)
+        fila = respuesta.data['detalle'][0]
+        self.assertEqual((fila['sku'], fila['precio_propuesto'], fila['diferencia_margen']), ('MOU-001', '110.00', '-20.00'))
+
+    def test_errores(self):
+        self.assertEqual(self.simular({'eliminar': [999999]}).status_code, 400)
+        self.assertEqual(self.simular({'agregar': [{'nombre_regla': 'Sin tipo'}]}).status_code, 400)
+        with mock.patch.object(simulacion, 'np', None):
+            self.assertEqual(self.simular({}).status_code, 501)
+
+
+class MetricasTests(MotorPreciosTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metricas.reiniciar()
+
+    def test_tramos_y_consultas_por_endpoint(self):
+        cliente = APIClient()
+        for _ in range(2):
+            respuesta = cliente.get('/api/calcular-precio/', {
+                'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE',
+                'sucursal_id': self.sucursal.id, 'articulo_id': self.mouse.id, 'cantidad': 3,
+            })
+            self.assertEqual(respuesta.status_code, 200)
+
+        texto = cliente.get('/api/metrics/').content.decode()
+        etiquetas = '{endpoint="api/calcular-precio/",metodo="GET"}'
+        self.assertIn(f'precios_http_peticion_segundos_count{etiquetas} 2', texto)
+        self.assertIn(
+            'precios_http_peticiones_total{endpoint="api/calcular-precio/",metodo="GET",estado="200"} 2', texto
+        )
+        for tramo in ('lista_vigente', 'carga_reglas', 'combinaciones', 'memo', 'serializacion'):
+            self.assertIn(f'precios_tramo_segundos_count{{endpoint="api/calcular-precio/",tramo="{tramo}"}} 2', texto)
+        # La segunda petición sale del resultado memoizado
+        for tramo in ('precio_base', 'reglas', 'costo_minimo'):
+            self.assertIn(f'precios_tramo_segundos_count{{endpoint="api/calcular-precio/",tramo="{tramo}"}} 1', texto)
+
+        # Primera petición: lista, reglas, combinaciones y precio; la segunda ninguna (cachés calientes)
+        self.assertIn(f'precios_sql_consultas_por_peticion_sum{etiquetas} 4', texto)
+        self.assertIn('precios_cache_precios_aciertos_l1 ', texto)
+        self.assertIn('precios_calculo_origen_total{origen="memo"} 1', texto)
+        self.assertIn('precios_calculo_origen_total{origen="motor"} 1', texto)
+
+    def test_cubetas_acumuladas(self):
+        metricas.registrar_peticion('prueba', 'GET', 200, 0.003, metricas.ContadorSQL(), {})
+        metricas.registrar_peticion('prueba', 'GET', 200, 0.2, metricas.ContadorSQL(), {})
+        texto = metricas.exportar_prometheus()
+        prefijo = 'precios_http_peticion_segundos_bucket{endpoint="prueba",metodo="GET",le='
+        self.assertIn(prefijo + '"0.001"} 0', texto)
+        self.assertIn(prefijo + '"0.005"} 1', texto)
+        self.assertIn(prefijo + '"0.25"} 2', texto)
+        self.assertIn(prefijo + '"+Inf"} 2', texto)
+
+
+class RutaAsincronaTests(MotorPreciosTestCase):
+
+    async def test_calcular_precio_igual_que_sincrono(self):
+        cliente = AsyncClient()
+        for articulo, cantidad, carrito in (
+            (self.mouse, 3, ''), (self.mouse, 1, f'{self.teclado.id}'), (self.laptop, 2, ''),
+        ):
+            parametros = {
+                'empresa_id': self.empresa.id, 'canal_venta': 'ecommerce', 'sucursal_id': self.sucursal.id,
+                'articulo_id': articulo.id, 'cantidad': cantidad, 'monto_pedido': '6000', 'cart_items': carrito,
+            }
+            asincrona = await cliente.get('/api/async/calcular-precio/', parametros)
+            sincrona = await sync_to_async(APIClient().get)('/api/calcular-precio/', parametros)
+            self.assertEqual(asincrona.status_code, 200)
+            self.assertEqual(asincrona.json(), sincrona.json())
+
+        respuesta = await cliente.get('/api/async/calcular-precio/', {'empresa_id': self.empresa.id})
+        self.assertEqual(respuesta.status_code, 400)
+
+    async def test_carrito_y_lista_vigente(self):
+        cliente = AsyncClient()
+        cuerpo = {
+            'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE', 'sucursal_id': self.sucursal.id,
+            'items': [{'articulo_id': self.mouse.id, 'cantidad': 3}, {'articulo_id': self.teclado.id, 'cantidad': 1}],
+        }
+        asincrona = await cliente.post('/api/async/calcular-carrito/', cuerpo, content_type='application/json')
+        sincrona = await sync_to_async(APIClient().post)('/api/calcular-carrito/', cuerpo, format='json')
+        self.assertEqual(asincrona.status_code, 200)
+        self.assertEqual(asincrona.json(), sincrona.json())
+
+        respuesta = await cliente.get('/api/async/lista-vigente/', {
+            'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE', 'sucursal_id': self.sucursal.id,
+        })
+        self.assertEqual(respuesta.json()['id'], self.lista.id)
+
+        respuesta = await cliente.get('/api/async/lista-vigente/', {'empresa_id': self.empresa.id, 'canal_venta': 'TIENDA'})
+        self.assertEqual(respuesta.status_code, 404)
+
+    async def test_lista_vigente_get_condicional(self):
+        cliente = AsyncClient()
+        parametros = {'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE', 'sucursal_id': self.sucursal.id}
+        respuesta = await cliente.get('/api/async/lista-vigente/', parametros)
+        etiqueta = respuesta['ETag']
+        # La ruta síncrona en JSON comparte la etiqueta
+        sincrona = await sync_to_async(APIClient().get)('/api/lista-vigente/', {**parametros, 'format': 'json'})
+        self.assertEqual(sincrona['ETag'], etiqueta)
+
+        respuesta = await cliente.get('/api/async/lista-vigente/', parametros, headers={'if-none-match': etiqueta})
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etiqueta)
+
+        await sync_to_async(generaciones.incrementar_empresa)(self.empresa.id)
+        respuesta = await cliente.get('/api/async/lista-vigente/', parametros, headers={'if-none-match': etiqueta})
+        self.assertEqual(respuesta.status_code, 200)
+
+    async def test_metricas_cuentan_consultas_asincronas(self):
+        metricas.reiniciar()
+        await AsyncClient().get('/api/async/calcular-precio/', {
+            'empresa_id': self.empresa.id, 'canal_venta': 'ECOMMERCE', 'sucursal_id': self.sucursal.id,
+            'articulo_id': self.mouse.id, 'cantidad': 1,
+        })
+        texto = metricas.exportar_prometheus()
+        self.assertIn(
+            'precios_sql_consultas_por_peticion_sum{endpoint="api/async/calcular-precio/",metodo="GET"} 4', texto
+        )
+        self.assertIn('precios_tramo_segundos_count{endpoint="api/async/calcular-precio/",tramo="reglas"} 1', texto)
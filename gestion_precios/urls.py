@@ -3,7 +3,14 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CalcularPrecioFinalAPIView, 
+    CalcularPrecioCarritoAPIView,
+    CurvaPrecioAPIView,
     ObtenerListaVigenteAPIView,
+    MetricasAPIView,
+    CambiosAPIView,
+    CalcularPrecioFinalAsyncView,
+    CalcularPrecioCarritoAsyncView,
+    ObtenerListaVigenteAsyncView,
     EmpresaViewSet,
     SucursalViewSet,
     ArticuloViewSet,
@@ -32,7 +39,16 @@ router.register(r'grupos-articulo', GrupoArticuloViewSet)
 urlpatterns = [
     # Las URLs de tus vistas APIView manuales
     path('calcular-precio/', CalcularPrecioFinalAPIView.as_view(), name='calcular-precio'),
+    path('calcular-carrito/', CalcularPrecioCarritoAPIView.as_view(), name='calcular-carrito'),
+    path('curva-precio/', CurvaPrecioAPIView.as_view(), name='curva-precio'),
     path('lista-vigente/', ObtenerListaVigenteAPIView.as_view(), name='lista-vigente'),
+    path('metrics/', MetricasAPIView.as_view(), name='metrics'),
+    path('cambios/', CambiosAPIView.as_view(), name='cambios'),
+
+    # Versiones asíncronas del cálculo (aprovechan la concurrencia bajo ASGI)
+    path('async/calcular-precio/', CalcularPrecioFinalAsyncView.as_view(), name='async-calcular-precio'),
+    path('async/calcular-carrito/', CalcularPrecioCarritoAsyncView.as_view(), name='async-calcular-carrito'),
+    path('async/lista-vigente/', ObtenerListaVigenteAsyncView.as_view(), name='async-lista-vigente'),
     
     # Las URLs automáticas generadas por el router
     path('', include(router.urls)),
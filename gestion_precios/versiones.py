@@ -0,0 +1,67 @@
+"""
+GET condicionales (`ETag` / `If-None-Match`) para los recursos que consultan los
+terminales de venta periódicamente.
+
+El ETag se deriva de los contadores de `generaciones.py` (por lista, por empresa y
+global), que las señales y las cargas masivas cambian en cada escritura. Comprobar
+`If-None-Match` solo lee esos contadores del caché: un 304 no toca las tablas ni
+ejecuta serializadores. Sin caché configurado (`PRECIOS_CACHE_RESULTADOS`) no hay
+contadores y las respuestas salen sin ETag.
+"""
+import hashlib
+
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from . import generaciones
+
+
+def etag(*partes) -> str:
+    """
+    ETag fuerte y opaco a partir del recurso, sus contadores y el formato de la respuesta.
+    """
+    resumen = hashlib.blake2b(':'.join(map(str, partes)).encode(), digest_size=12).hexdigest()
+    return f'"{resumen}"'
+
+
+def etag_empresa(recurso, empresa_id, *partes):
+    if generaciones.alias_cache() is None:
+        return None
+    return etag(recurso, 'empresa', empresa_id, *generaciones.actuales_empresa(empresa_id), *partes)
+
+
+async def aetag_empresa(recurso, empresa_id, *partes):
+    """
+    Igual que `etag_empresa`, con la API asíncrona del caché (vistas asíncronas).
+    """
+    if generaciones.alias_cache() is None:
+        return None
+    return etag(recurso, 'empresa', empresa_id, *await generaciones.aactuales_empresa(empresa_id), *partes)
+
+
+def etag_lista(recurso, lista_id, *partes):
+    if generaciones.alias_cache() is None:
+        return None
+    return etag(recurso, 'lista', lista_id, *generaciones.actuales(lista_id), *partes)
+
+
+def coincide(request, etiqueta) -> bool:
+    """
+    True si `If-None-Match` contiene `etiqueta` (comparación débil, como exige RFC 9110) o `*`.
+    """
+    cabecera = request.META.get('HTTP_IF_NONE_MATCH')
+    if not cabecera or etiqueta is None:
+        return False
+    etiquetas = parse_etags(cabecera)
+    if etiquetas == ['*']:
+        return True
+    return any(candidata.removeprefix('W/') == etiqueta for candidata in etiquetas)
+
+
+def no_modificado(etiqueta):
+    """
+    304 sin cuerpo; sirve tanto en las vistas de DRF como en las asíncronas de Django.
+    """
+    respuesta = HttpResponseNotModified()
+    respuesta['ETag'] = etiqueta
+    return respuesta
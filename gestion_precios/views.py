@@ -1,8 +1,22 @@
+import json
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from django.db.models import Prefetch
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from datetime import date
 from decimal import Decimal, InvalidOperation
-from .services import PrecioService
+from .services import MOTORES, PrecioService
+from .carga_masiva import CargaListasService, CargaReglasService, CargaCombinacionesService
+from .importacion import ImportacionPreciosService, FORMATOS, decodificar_lineas, leer_filas
+from . import cambios, exportacion, metricas, paquete_offline, simulacion, versiones
+from .listados import ListadoMixin
 from .models import (
     Empresa, Sucursal, Articulo, ListaPrecio, 
     PrecioArticulo, ReglaPrecio, CombinacionProducto, LineaArticulo, GrupoArticulo
@@ -11,45 +25,408 @@ from .serializers import ( # <-- 3. IMPORTA TODOS LOS SERIALIZERS
     EmpresaSerializer, SucursalSerializer, ArticuloSerializer, 
     ListaPrecioSerializer, PrecioArticuloSerializer, 
     ReglaPrecioSerializer, CombinacionProductoSerializer,
-    ResultadoCalculoSerializer, LineaArticuloSerializer, GrupoArticuloSerializer
+    ResultadoCalculoSerializer, LineaArticuloSerializer, GrupoArticuloSerializer,
+    CalcularCarritoSerializer, ResultadoCarritoSerializer, ResultadoCurvaSerializer,
+    SimulacionSerializer, ResultadoSimulacionSerializer
 )
+from .simulacion import SimulacionInvalida, SimulacionService
+
+def responder_carga_masiva(request, clave, crear):
+    """
+    Respuesta común de los endpoints `bulk/`: acepta un arreglo JSON o `{clave: [...]}`,
+    llama a `crear` y responde 201 con el resumen, o 400 si alguna fila tiene errores.
+    """
+    datos = request.data
+    if isinstance(datos, dict):
+        datos = datos.get(clave)
+    if not isinstance(datos, list) or not datos:
+        return Response(
+            {"error": f"Se esperaba un arreglo JSON no vacío (o {{\"{clave}\": [...]}})."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    resumen = crear(datos)
+    if resumen['errores']:
+        return Response(resumen, status=status.HTTP_400_BAD_REQUEST)
+    return Response(resumen, status=status.HTTP_201_CREATED)
 
-class EmpresaViewSet(viewsets.ModelViewSet):
+
+class EmpresaViewSet(ListadoMixin, viewsets.ModelViewSet):
     queryset = Empresa.objects.all()
     serializer_class = EmpresaSerializer
 
-class SucursalViewSet(viewsets.ModelViewSet):
+class SucursalViewSet(ListadoMixin, viewsets.ModelViewSet):
     queryset = Sucursal.objects.all()
     serializer_class = SucursalSerializer
+    filtros = {'empresa': ('empresa_id', 'entero')}
 
-class ArticuloViewSet(viewsets.ModelViewSet):
+class ArticuloViewSet(ListadoMixin, viewsets.ModelViewSet):
     queryset = Articulo.objects.all()
     serializer_class = ArticuloSerializer
+    filtros = {
+        'sku': ('sku', 'texto'),
+        'linea': ('linea_id', 'entero'),
+        'grupo': ('grupo_id', 'entero'),
+    }
     
-class ListaPrecioViewSet(viewsets.ModelViewSet):
+class ListaPrecioViewSet(ListadoMixin, viewsets.ModelViewSet):
     queryset = ListaPrecio.objects.all()
     serializer_class = ListaPrecioSerializer
+    filtros = {
+        'empresa': ('empresa_id', 'entero'),
+        'sucursal': ('sucursal_id', 'entero'),
+        'canal_venta': ('canal_venta', 'texto'),
+        'activa': ('activa', 'booleano'),
+    }
+    versionado = {'empresa': 'empresa'}
+
+    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser])
+    def importar(self, request, pk=None):
+        """
+        Importa precios base (CSV o NDJSON) en la lista, insertando o actualizando por SKU.
+        Acepta un archivo multipart en el campo 'archivo' o el cuerpo crudo de la petición
+        (Content-Type text/csv o application/x-ndjson). El formato se toma del parámetro
+        'formato', de la extensión del archivo o del Content-Type. Parámetro opcional: 'lote'.
+        """
+        lista = self.get_object()
+
+        # 1. Origen de las líneas: archivo subido o cuerpo de la petición, sin cargarlo entero
+        tipo_contenido = (request.content_type or '').split(';')[0].strip().lower()
+        nombre_archivo = ''
+        if tipo_contenido == 'multipart/form-data':
+            archivo = request.FILES.get('archivo')
+            if archivo is None:
+                return Response(
+                    {"error": "Falta el archivo en el campo 'archivo'."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            nombre_archivo = archivo.name.lower()
+            lineas = archivo
+        else:
+            lineas = request.stream or []
+
+        # 2. Formato
+        formato = request.query_params.get('formato')
+        if not formato:
+            if nombre_archivo.endswith('.ndjson') or nombre_archivo.endswith('.jsonl') or 'ndjson' in tipo_contenido:
+                formato = 'ndjson'
+            else:
+                formato = 'csv'
+        if formato not in FORMATOS:
+            return Response(
+                {"error": f"'formato' debe ser uno de: {', '.join(FORMATOS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            lote = int(request.query_params.get('lote', 5000))
+            if lote < 1:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "'lote' debe ser un entero positivo."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 3. Importar
+        try:
+            resumen = ImportacionPreciosService.importar(
+                lista, leer_filas(decodificar_lineas(lineas), formato), lote=lote
+            )
+        except UnicodeDecodeError:
+            return Response({"error": "El archivo debe estar codificado en UTF-8."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(resumen, status=status.HTTP_200_OK)
 
-class PrecioArticuloViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def carga_masiva(self, request):
+        """
+        Crea varias listas en una sola petición. Espera un arreglo JSON de listas (o
+        {"listas": [...]}) con los campos del alta individual. Los solapamientos se validan
+        por conjuntos; si alguna lista tiene errores no se crea ninguna y se informan todos.
+        """
+        return responder_carga_masiva(request, 'listas', CargaListasService.crear_listas)
+
+    @action(detail=True, methods=['get'], url_path='export')
+    def exportar(self, request, pk=None):
+        """
+        Exporta todos los artículos de la lista con su precio base y su precio final
+        en CSV o NDJSON, como respuesta en streaming.
+        Parámetros opcionales: 'formato' (csv | ndjson), 'cantidad' (por defecto 1),
+        'monto_pedido' (por defecto 0) y 'motor' (por defecto `PRECIOS_MOTOR`; con 'sql'
+        la base de datos calcula los precios finales). Se usa 'formato' porque DRF reserva 'format'.
+        """
+        lista = self.get_object()
+
+        # 1. Validar parámetros
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in exportacion.FORMATOS:
+            return Response(
+                {"error": f"'formato' debe ser uno de: {', '.join(exportacion.FORMATOS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            cantidad = int(request.query_params.get('cantidad', 1))
+            monto_pedido = Decimal(request.query_params.get('monto_pedido', '0.00'))
+            if cantidad < 1 or not monto_pedido.is_finite() or monto_pedido < 0:
+                raise ValueError
+        except (ValueError, TypeError, InvalidOperation):
+            return Response(
+                {"error": "'cantidad' debe ser un entero positivo y 'monto_pedido' un número no negativo."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        motor = request.query_params.get('motor')
+        if motor is not None and motor not in MOTORES:
+            return Response(
+                {"error": f"'motor' debe ser uno de: {', '.join(MOTORES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # 2. Respuesta en streaming: las filas se calculan a medida que se envían
+        filas = PrecioService.exportar_precios(lista, cantidad=cantidad, monto_pedido=monto_pedido, motor=motor)
+        respuesta = StreamingHttpResponse(
+            exportacion.serializar(filas, formato),
+            content_type=exportacion.TIPOS_CONTENIDO[formato]
+        )
+        respuesta['Content-Disposition'] = f'attachment; filename="lista-{lista.id}.{formato}"'
+        return respuesta
+
+    @action(detail=True, methods=['get'], url_path='bundle')
+    def paquete(self, request, pk=None):
+        """
+        Paquete JSON por líneas con la lista resuelta (precios base, costos, reglas
+        compiladas y combinaciones) para `evaluador_offline.py`. Admite GET condicional:
+        el ETag cambia con cualquier escritura que afecte a los precios de la lista.
+        """
+        # 1. La lista debe existir: con `If-None-Match: *` una inexistente daría 304
+        lista = self.get_object()
+
+        # 2. GET condicional antes de leer el contenido del paquete
+        etiqueta = versiones.etag_lista('bundle', lista.id, paquete_offline.VERSION_FORMATO)
+        if versiones.coincide(request, etiqueta):
+            return versiones.no_modificado(etiqueta)
+
+        # 3. Respuesta en streaming
+        respuesta = StreamingHttpResponse(
+            paquete_offline.lineas_paquete(lista), content_type=paquete_offline.TIPO_CONTENIDO
+        )
+        respuesta['Content-Disposition'] = f'attachment; filename="lista-{lista.id}-bundle.ndjson"'
+        if etiqueta is not None:
+            respuesta['ETag'] = etiqueta
+        return respuesta
+
+    @action(detail=True, methods=['post'], url_path='simular')
+    def simular(self, request, pk=None):
+        """
+        Simula cambios de reglas sobre todos los artículos de la lista sin guardarlos.
+        Espera un cuerpo JSON con 'agregar' (reglas nuevas), 'modificar' (cambios por
+        'id'), 'eliminar' (IDs) y, opcionales, 'cantidad', 'monto_pedido', 'cart_items'
+        y 'limite' (artículos a detallar). Devuelve totales, diferencias de margen y los
+        artículos cuyo precio final cambia. Requiere NumPy.
+        """
+        if not simulacion.disponible():
+            return Response(
+                {"error": "La simulación requiere NumPy (pip install numpy)."},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        lista = self.get_object()
+
+        # 1. Validar el cuerpo de la petición
+        entrada = SimulacionSerializer(data=request.data)
+        if not entrada.is_valid():
+            return Response(entrada.errors, status=status.HTTP_400_BAD_REQUEST)
+        datos = entrada.validated_data
+
+        # 2. Simular con las reglas propuestas (relaciones como IDs, igual que en el motor)
+        try:
+            resultado = SimulacionService.simular(
+                lista,
+                agregar=[campos_regla(regla) for regla in datos.get('agregar', [])],
+                modificar=[campos_regla(regla) for regla in datos.get('modificar', [])],
+                eliminar=datos.get('eliminar', []),
+                cantidad=datos['cantidad'],
+                monto_pedido=datos['monto_pedido'],
+                cart_items_ids=datos.get('cart_items', []),
+                limite=datos['limite'],
+            )
+        except SimulacionInvalida as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ResultadoSimulacionSerializer(resultado).data, status=status.HTTP_200_OK)
+
+
+def campos_regla(datos):
+    """
+    Datos validados de una regla con sus relaciones como `<campo>_id`.
+    """
+    return {
+        f'{campo}_id' if campo.startswith('aplica_') else campo: getattr(valor, 'pk', valor)
+        for campo, valor in datos.items()
+    }
+
+class PrecioArticuloViewSet(ListadoMixin, viewsets.ModelViewSet):
     queryset = PrecioArticulo.objects.all()
     serializer_class = PrecioArticuloSerializer
+    filtros = {
+        'lista_precio': ('lista_precio_id', 'entero'),
+        'articulo': ('articulo_id', 'entero'),
+    }
+    versionado = {'lista_precio': 'lista'}
 
-class ReglaPrecioViewSet(viewsets.ModelViewSet):
+class ReglaPrecioViewSet(ListadoMixin, viewsets.ModelViewSet):
     queryset = ReglaPrecio.objects.all()
     serializer_class = ReglaPrecioSerializer
+    filtros = {
+        'lista_precio': ('lista_precio_id', 'entero'),
+        'aplica_articulo': ('aplica_articulo_id', 'entero'),
+        'aplica_grupo': ('aplica_grupo_id', 'entero'),
+        'aplica_linea': ('aplica_linea_id', 'entero'),
+        'aplica_combinacion': ('aplica_combinacion_id', 'entero'),
+    }
+    versionado = {'lista_precio': 'lista'}
 
-class CombinacionProductoViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def carga_masiva(self, request):
+        """
+        Crea varias reglas en una sola petición (arreglo JSON o {"reglas": [...]}), en una
+        transacción. Los duplicados se detectan contra las firmas de las listas destino,
+        leídas una vez, y dentro de la carga; si hay errores no se crea ninguna.
+        """
+        return responder_carga_masiva(request, 'reglas', CargaReglasService.crear_reglas)
+
+class CombinacionProductoViewSet(ListadoMixin, viewsets.ModelViewSet):
     queryset = CombinacionProducto.objects.all()
     serializer_class = CombinacionProductoSerializer
+    filtros = {'lista_precio': ('lista_precio_id', 'entero')}
+    versionado = {'lista_precio': 'lista'}
 
-class LineaArticuloViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Los artículos de todas las combinaciones de la página en una sola consulta (sin N+1)
+        if self.incluye_campo('articulos'):
+            queryset = queryset.prefetch_related(
+                Prefetch('articulos', queryset=Articulo.objects.only('id'))
+            )
+        return queryset
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def carga_masiva(self, request):
+        """
+        Crea varias combinaciones con sus artículos en una sola petición (arreglo JSON o
+        {"combinaciones": [...]}), con un `bulk_create` para las combinaciones y otro para
+        la tabla intermedia. Si hay errores no se crea ninguna.
+        """
+        return responder_carga_masiva(request, 'combinaciones', CargaCombinacionesService.crear_combinaciones)
+
+class LineaArticuloViewSet(ListadoMixin, viewsets.ModelViewSet):
     queryset = LineaArticulo.objects.all()
     serializer_class = LineaArticuloSerializer
 
-class GrupoArticuloViewSet(viewsets.ModelViewSet):
+class GrupoArticuloViewSet(ListadoMixin, viewsets.ModelViewSet):
     queryset = GrupoArticulo.objects.all()
     serializer_class = GrupoArticuloSerializer
 
+MENSAJE_SIN_LISTA = {"mensaje": "No se encontró una lista de precios aplicable para los criterios dados."}
+
+
+MENSAJE_FECHA_INVALIDA = {"error": "El parámetro 'fecha' debe tener el formato AAAA-MM-DD."}
+
+# Camino que resolvió calcular-precio: 'memo', 'materializado' o 'motor'
+CABECERA_ORIGEN = 'X-Precio-Origen'
+
+
+def leer_fecha(parametros):
+    """
+    Lee el parámetro opcional `fecha` (ISO, AAAA-MM-DD). Lanza ValueError si no es válido.
+    """
+    fecha = parametros.get('fecha')
+    return date.fromisoformat(fecha) if fecha else None
+
+
+def leer_parametros_lista_vigente(parametros):
+    """
+    Valida los query params de lista vigente. Devuelve `(kwargs_del_servicio, None)`
+    o `(None, error)`. Lo usan la vista síncrona y la asíncrona.
+    """
+    empresa_id = parametros.get('empresa_id')
+    canal_venta = parametros.get('canal_venta')
+    sucursal_id = parametros.get('sucursal_id')
+
+    if not empresa_id or not canal_venta:
+        return None, {"error": "Los parámetros 'empresa_id' y 'canal_venta' son requeridos."}
+
+    try:
+        fecha = leer_fecha(parametros)
+    except ValueError:
+        return None, MENSAJE_FECHA_INVALIDA
+
+    try:
+        return {
+            'empresa_id': int(empresa_id),
+            'canal_venta': canal_venta.upper(),  # Convertimos a mayúsculas por si acaso
+            'sucursal_id': int(sucursal_id) if sucursal_id else None,
+            'fecha': fecha,
+        }, None
+    except (ValueError, TypeError):
+        return None, {"error": "Los IDs deben ser números enteros válidos."}
+
+
+def leer_parametros_calculo(parametros):
+    """
+    Valida los query params de calcular-precio. Devuelve `(kwargs_del_servicio, None)`
+    o `(None, error)`. Lo usan la vista síncrona y la asíncrona.
+    """
+    empresa_id = parametros.get('empresa_id')
+    canal_venta = parametros.get('canal_venta')
+    sucursal_id = parametros.get('sucursal_id')
+    articulo_id = parametros.get('articulo_id')
+    cantidad = parametros.get('cantidad')
+    monto_pedido = parametros.get('monto_pedido')
+    cart_items_str = parametros.get('cart_items', '')  # ej: "1,5,23"
+
+    required_params = {'empresa_id': empresa_id, 'canal_venta': canal_venta, 'articulo_id': articulo_id, 'cantidad': cantidad}
+    for param, value in required_params.items():
+        if not value:
+            return None, {"error": f"El parámetro '{param}' es requerido."}
+
+    try:
+        fecha = leer_fecha(parametros)
+    except ValueError:
+        return None, MENSAJE_FECHA_INVALIDA
+
+    try:
+        # monto_pedido es opcional (default 0)
+        monto_pedido_decimal = Decimal(monto_pedido) if monto_pedido else Decimal('0.00')
+        cart_items_ids = []
+        if cart_items_str:
+            cart_items_ids = [int(item_id) for item_id in cart_items_str.split(',') if item_id.isdigit()]
+        return {
+            'empresa_id': int(empresa_id),
+            'canal_venta': canal_venta.upper(),
+            'sucursal_id': int(sucursal_id) if sucursal_id else None,
+            'articulo_id': int(articulo_id),
+            'cantidad': int(cantidad),
+            'monto_pedido': monto_pedido_decimal,
+            'cart_items_ids': cart_items_ids,
+            'fecha': fecha,
+        }, None
+    except (ValueError, TypeError, InvalidOperation):
+        return None, {"error": "Los IDs, cantidad y monto_pedido deben ser números válidos."}
+
+
+def leer_parametros_curva(parametros):
+    """
+    Valida los query params de curva-precio: los de lista vigente más `articulo_id`.
+    """
+    if not parametros.get('articulo_id'):
+        return None, {"error": "El parámetro 'articulo_id' es requerido."}
+    kwargs, error = leer_parametros_lista_vigente(parametros)
+    if error:
+        return None, error
+    try:
+        kwargs['articulo_id'] = int(parametros['articulo_id'])
+    except ValueError:
+        return None, {"error": "Los IDs deben ser números enteros válidos."}
+    return kwargs, None
+
+
 class ObtenerListaVigenteAPIView(APIView):
     """
     Endpoint para obtener la lista de precios vigente según los parámetros.
@@ -61,41 +438,36 @@ class ObtenerListaVigenteAPIView(APIView):
         - empresa_id (requerido)
         - canal_venta (requerido)
         - sucursal_id (opcional)
+        - fecha (opcional, AAAA-MM-DD; por defecto, hoy)
         """
-        # 1. Obtener parámetros de la URL
-        empresa_id = request.query_params.get('empresa_id')
-        canal_venta = request.query_params.get('canal_venta')
-        sucursal_id = request.query_params.get('sucursal_id')
+        # 1. Obtener y validar parámetros de la URL
+        parametros, error = leer_parametros_lista_vigente(request.query_params)
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
 
-        # 2. Validar que los parámetros requeridos existan
-        if not empresa_id or not canal_venta:
-            return Response(
-                {"error": "Los parámetros 'empresa_id' y 'canal_venta' son requeridos."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # 2. GET condicional: la respuesta solo cambia con las listas de la empresa (y el día)
+        etiqueta = versiones.etag_empresa(
+            'lista-vigente', parametros['empresa_id'], parametros['sucursal_id'], parametros['canal_venta'],
+            parametros['fecha'] or date.today(), request.accepted_renderer.format
+        )
+        if versiones.coincide(request, etiqueta):
+            return versiones.no_modificado(etiqueta)
 
         # 3. Llamar a nuestro "cerebro" (el servicio)
-        try:
-            lista_vigente = PrecioService.obtener_lista_vigente(
-                empresa_id=int(empresa_id),
-                canal_venta=canal_venta.upper(), # Convertimos a mayúsculas por si acaso
-                sucursal_id=int(sucursal_id) if sucursal_id else None
-            )
-        except (ValueError, TypeError):
-             return Response(
-                {"error": "Los IDs deben ser números enteros válidos."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        lista_vigente = PrecioService.obtener_lista_vigente(**parametros)
 
         # 4. Preparar y enviar la respuesta
         if lista_vigente:
             # Si encontramos una lista, la "traducimos" con el serializer
             serializer = ListaPrecioSerializer(lista_vigente)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            respuesta = Response(serializer.data, status=status.HTTP_200_OK)
+            if etiqueta is not None:
+                respuesta['ETag'] = etiqueta
+            return respuesta
         else:
             # Si el servicio no encontró nada, respondemos con un error 404
             return Response(
-                {"mensaje": "No se encontró una lista de precios aplicable para los criterios dados."},
+                MENSAJE_SIN_LISTA,
                 status=status.HTTP_404_NOT_FOUND
             )
 
@@ -105,53 +477,200 @@ class CalcularPrecioFinalAPIView(APIView):
     Endpoint para calcular el precio final de un artículo.
     """
     def get(self, request, *args, **kwargs):
-        # 1. Obtener parámetros (añadimos monto_pedido)
-        empresa_id = request.query_params.get('empresa_id')
-        canal_venta = request.query_params.get('canal_venta')
-        sucursal_id = request.query_params.get('sucursal_id')
-        articulo_id = request.query_params.get('articulo_id')
-        cantidad = request.query_params.get('cantidad')
-        monto_pedido = request.query_params.get('monto_pedido') # <-- NUEVO
-        cart_items_str = request.query_params.get('cart_items', '') # ej: "1,5,23"
-        # 2. Validar requeridos
-        required_params = {'empresa_id': empresa_id, 'canal_venta': canal_venta, 'articulo_id': articulo_id, 'cantidad': cantidad}
-        for param, value in required_params.items():
-            if not value:
-                return Response({"error": f"El parámetro '{param}' es requerido."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 3. Validar y castear tipos
-        try:
-            empresa_id_int = int(empresa_id)
-            sucursal_id_int = int(sucursal_id) if sucursal_id else None
-            articulo_id_int = int(articulo_id)
-            cantidad_int = int(cantidad)
-
-            # Validar monto_pedido (es opcional, default 0)
-            monto_pedido_decimal = Decimal('0.00')
-            if monto_pedido:
-                monto_pedido_decimal = Decimal(monto_pedido)
-            # Procesar cart_items
-            cart_items_ids = []
-            if cart_items_str:
-                cart_items_ids = [int(item_id) for item_id in cart_items_str.split(',') if item_id.isdigit()]
+        # 1. Obtener y validar parámetros (incluye monto_pedido y cart_items, ej: "1,5,23")
+        parametros, error = leer_parametros_calculo(request.query_params)
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
 
-        except (ValueError, TypeError, InvalidOperation):
-             return Response({"error": "Los IDs, cantidad y monto_pedido deben ser números válidos."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 4. Llamar al servicio (con el nuevo parámetro)
-        resultado = PrecioService.calcular_precio_final(
-            empresa_id=empresa_id_int,
-            canal_venta=canal_venta.upper(),
-            sucursal_id=sucursal_id_int,
-            articulo_id=articulo_id_int,
-            cantidad=cantidad_int,
-            monto_pedido=monto_pedido_decimal, # <-- PASAMOS EL NUEVO VALOR
-            cart_items_ids=cart_items_ids
-        )
+        # 2. Llamar al servicio
+        resultado, origen = PrecioService.calcular_precio_final_con_origen(**parametros)
 
-        # 5. Enviar respuesta (esta lógica se queda igual)
+        # 3. Enviar respuesta
         if "error" in resultado:
             return Response(resultado, status=status.HTTP_404_NOT_FOUND)
         else:
-            serializer = ResultadoCalculoSerializer(resultado)
-            return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+            with metricas.tramo('serializacion'):
+                datos = ResultadoCalculoSerializer(resultado).data
+            metricas.contar_origen(origen)
+            return Response(datos, status=status.HTTP_200_OK, headers={CABECERA_ORIGEN: origen})
+
+
+class CalcularPrecioCarritoAPIView(APIView):
+    """
+    Endpoint para calcular el precio final de todas las líneas de un carrito.
+    """
+    def post(self, request, *args, **kwargs):
+        """
+        Espera un cuerpo JSON con:
+        - empresa_id (requerido)
+        - canal_venta (requerido)
+        - sucursal_id (opcional)
+        - fecha (opcional, AAAA-MM-DD; por defecto, hoy)
+        - items (requerido): lista de {"articulo_id": ..., "cantidad": ...}
+        """
+        # 1. Validar el cuerpo de la petición
+        entrada = CalcularCarritoSerializer(data=request.data)
+        if not entrada.is_valid():
+            return Response(entrada.errors, status=status.HTTP_400_BAD_REQUEST)
+        datos = entrada.validated_data
+
+        # 2. Llamar al servicio una sola vez para todo el carrito
+        resultado = PrecioService.calcular_carrito(
+            empresa_id=datos['empresa_id'],
+            canal_venta=datos['canal_venta'].upper(),
+            sucursal_id=datos.get('sucursal_id'),
+            items=datos['items'],
+            fecha=datos.get('fecha')
+        )
+
+        # 3. Enviar respuesta
+        if "error" in resultado:
+            return Response(resultado, status=status.HTTP_404_NOT_FOUND)
+        with metricas.tramo('serializacion'):
+            datos_respuesta = ResultadoCarritoSerializer(resultado).data
+        return Response(datos_respuesta, status=status.HTTP_200_OK)
+
+
+class CurvaPrecioAPIView(APIView):
+    """
+    Endpoint con el precio unitario de un artículo por tramos de cantidad
+    ("1", "3+", "10+"), con una sola carga de lista, precio y reglas.
+    """
+    def get(self, request, *args, **kwargs):
+        """
+        Query params: empresa_id, canal_venta y articulo_id (requeridos), sucursal_id
+        y fecha (opcionales). El último tramo no tiene `cantidad_hasta`.
+        """
+        # 1. Obtener y validar parámetros
+        parametros, error = leer_parametros_curva(request.query_params)
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+
+        # 2. Llamar al servicio
+        resultado = PrecioService.curva_precio(**parametros)
+
+        # 3. Enviar respuesta
+        if "error" in resultado:
+            return Response(resultado, status=status.HTTP_404_NOT_FOUND)
+        with metricas.tramo('serializacion'):
+            datos = ResultadoCurvaSerializer(resultado).data
+        return Response(datos, status=status.HTTP_200_OK)
+
+
+# --- Vistas asíncronas (servidas por ASGI: core/asgi.py) ---
+# DRF no tiene APIView asíncronas, así que se usan vistas de Django con los mismos
+# parámetros, validaciones y serializadores de resultado que las vistas síncronas.
+
+class ObtenerListaVigenteAsyncView(View):
+    """
+    Versión asíncrona de `ObtenerListaVigenteAPIView`.
+    """
+    async def get(self, request, *args, **kwargs):
+        parametros, error = leer_parametros_lista_vigente(request.GET)
+        if error:
+            return JsonResponse(error, status=status.HTTP_400_BAD_REQUEST)
+
+        # Mismo ETag que la vista síncrona; esta ruta solo responde JSON
+        etiqueta = await versiones.aetag_empresa(
+            'lista-vigente', parametros['empresa_id'], parametros['sucursal_id'], parametros['canal_venta'],
+            parametros['fecha'] or date.today(), 'json'
+        )
+        if versiones.coincide(request, etiqueta):
+            return versiones.no_modificado(etiqueta)
+
+        lista_vigente = await PrecioService.aobtener_lista_vigente(**parametros)
+        if not lista_vigente:
+            return JsonResponse(MENSAJE_SIN_LISTA, status=status.HTTP_404_NOT_FOUND)
+        respuesta = JsonResponse(ListaPrecioSerializer(lista_vigente).data)
+        if etiqueta is not None:
+            respuesta['ETag'] = etiqueta
+        return respuesta
+
+
+class CalcularPrecioFinalAsyncView(View):
+    """
+    Versión asíncrona de `CalcularPrecioFinalAPIView`.
+    """
+    async def get(self, request, *args, **kwargs):
+        parametros, error = leer_parametros_calculo(request.GET)
+        if error:
+            return JsonResponse(error, status=status.HTTP_400_BAD_REQUEST)
+
+        resultado, origen = await PrecioService.acalcular_precio_final_con_origen(**parametros)
+        if "error" in resultado:
+            return JsonResponse(resultado, status=status.HTTP_404_NOT_FOUND)
+        with metricas.tramo('serializacion'):
+            datos = ResultadoCalculoSerializer(resultado).data
+        metricas.contar_origen(origen)
+        return JsonResponse(datos, headers={CABECERA_ORIGEN: origen})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CalcularPrecioCarritoAsyncView(View):
+    """
+    Versión asíncrona de `CalcularPrecioCarritoAPIView`. Exenta de CSRF como las APIView de DRF.
+    """
+    async def post(self, request, *args, **kwargs):
+        try:
+            cuerpo = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({"error": "El cuerpo debe ser JSON válido."}, status=status.HTTP_400_BAD_REQUEST)
+
+        entrada = CalcularCarritoSerializer(data=cuerpo)
+        if not entrada.is_valid():
+            return JsonResponse(entrada.errors, status=status.HTTP_400_BAD_REQUEST)
+        datos = entrada.validated_data
+
+        resultado = await PrecioService.acalcular_carrito(
+            empresa_id=datos['empresa_id'],
+            canal_venta=datos['canal_venta'].upper(),
+            sucursal_id=datos.get('sucursal_id'),
+            items=datos['items'],
+            fecha=datos.get('fecha')
+        )
+        if "error" in resultado:
+            return JsonResponse(resultado, status=status.HTTP_404_NOT_FOUND)
+        with metricas.tramo('serializacion'):
+            datos_respuesta = ResultadoCarritoSerializer(resultado).data
+        return JsonResponse(datos_respuesta)
+
+
+class CambiosAPIView(APIView):
+    """
+    Feed de cambios para la sincronización incremental (ver `cambios.py`).
+    """
+    def get(self, request, *args, **kwargs):
+        """
+        Query params:
+        - desde (opcional): última secuencia recibida (`hasta` de la respuesta anterior); 0 por defecto
+        - limite (opcional): registros por lote, hasta 10000; 1000 por defecto
+        - lista_precio (opcional): solo los cambios de esa lista y los costos de artículos
+        """
+        # 1. Validar parámetros
+        try:
+            desde = int(request.query_params.get('desde', 0))
+            limite = int(request.query_params.get('limite', cambios.LIMITE_POR_DEFECTO))
+            lista_id = request.query_params.get('lista_precio')
+            lista_id = int(lista_id) if lista_id else None
+            if desde < 0 or not 1 <= limite <= cambios.LIMITE_MAXIMO:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": f"'desde' debe ser un entero no negativo, 'limite' un entero entre 1 y "
+                          f"{cambios.LIMITE_MAXIMO} y 'lista_precio' un ID válido."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # 2. Leer el lote, con los cambios repetidos de cada objeto plegados
+        return Response(cambios.leer(desde, limite, lista_id), status=status.HTTP_200_OK)
+
+
+class MetricasAPIView(APIView):
+    """
+    Métricas del proceso en formato de texto de Prometheus.
+    """
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            metricas.exportar_prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )